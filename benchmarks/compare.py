@@ -0,0 +1,57 @@
+"""
+Median timings of two benchmark runs side by side.
+
+    python -m benchmarks.compare results/<before>.json results/<after>.json
+
+Exits with 1 if a timing got slower than the threshold.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# differences below are timer noise, whatever the ratio
+MIN_DIFFERENCE_MS = 0.1
+
+
+def compare(before, after, threshold: float = 1.2) -> bool:
+    regressed = False
+    for size, result in after["sizes"].items():
+        if size not in before["sizes"]:
+            continue
+        print(f"\n{size}")
+        before_results = before["sizes"][size]["results"]
+        for name, timing in result["results"].items():
+            if name not in before_results:
+                continue
+            old = before_results[name]["median"]
+            new = timing["median"]
+            ratio = new / old if old else float("inf")
+            flag = ""
+            if abs(new - old) < MIN_DIFFERENCE_MS:
+                pass
+            elif ratio > threshold:
+                flag = "  slower"
+                regressed = True
+            elif ratio < 1 / threshold:
+                flag = "  faster"
+            print(
+                f"  {name:<60} {old:9.3f} ms -> {new:9.3f} ms"
+                f"  x{ratio:5.2f}{flag}"
+            )
+    return regressed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare benchmark runs.")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=1.2)
+    arguments = parser.parse_args()
+
+    before, after = [
+        json.loads(Path(file).read_text())
+        for file in [arguments.before, arguments.after]
+    ]
+    sys.exit(1 if compare(before, after, arguments.threshold) else 0)
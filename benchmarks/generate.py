@@ -0,0 +1,224 @@
+"""
+Deterministic synthetic players, matches and goals datasets following the
+schemas documented in gd_analysis.data and gd_analysis.ingest.
+
+Every league plays a double round robin per season. A side fields 11 starters
+and 3 substitutes who replace 3 of the starters, goal minutes are drawn per
+match and the goal difference of each appearance counts the goals with
+start < minute <= end, as in the scraped data. A goal is credited to one of
+the players of the side on the pitch at its minute. Squads keep their player
+urls across seasons, so players have careers.
+
+    python -m benchmarks.generate <path> <leagues> <seasons>
+"""
+
+import sys
+from typing import Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+
+TEAMS = 18
+SQUAD = 25
+STARTERS = 11
+SUBSTITUTES = 3
+MAX_GOALS = 10
+MATCH_END = 90
+
+
+def get_schedule(teams: int) -> np.ndarray:
+    """(matchday, home, away) of a double round robin, circle method."""
+    rounds = []
+    rotation = list(range(1, teams))
+    for _ in range(teams - 1):
+        order = [0] + rotation
+        pairs = [
+            (order[position], order[teams - 1 - position])
+            for position in range(teams // 2)
+        ]
+        rounds.append(pairs)
+        rotation = rotation[-1:] + rotation[:-1]
+    # alternate home and away in the first half, swap them in the second
+    first_half = [
+        [(a, b) if matchday % 2 else (b, a) for a, b in pairs]
+        for matchday, pairs in enumerate(rounds)
+    ]
+    second_half = [[(b, a) for a, b in pairs] for pairs in first_half]
+    return np.array(
+        [
+            (matchday, home, away)
+            for matchday, pairs in enumerate(first_half + second_half, 1)
+            for home, away in pairs
+        ]
+    )
+
+
+def generate_season(
+    rng: np.random.Generator,
+    competition: str,
+    year: str,
+    league: int,
+    teams: int = TEAMS,
+    squad: int = SQUAD,
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    schedule = get_schedule(teams)
+    matches = len(schedule)
+    appearances = STARTERS + SUBSTITUTES
+
+    scores = np.minimum(rng.poisson([1.5, 1.2], size=(matches, 2)), MAX_GOALS)
+    # minutes of the goals of each side, unused slots never count
+    minutes = rng.integers(1, MATCH_END + 1, size=(matches, 2, MAX_GOALS))
+    minutes[np.arange(MAX_GOALS) >= scores[..., None]] = MATCH_END + 1
+
+    # the first players of a random squad order play
+    order = np.argsort(rng.random((matches, 2, squad)), axis=-1)
+    players = order[..., :appearances]
+    substitution = rng.integers(46, MATCH_END, size=(matches, 2, SUBSTITUTES))
+    start = np.zeros((matches, 2, appearances), dtype=np.int64)
+    end = np.full((matches, 2, appearances), MATCH_END, dtype=np.int64)
+    end[..., STARTERS - SUBSTITUTES : STARTERS] = substitution
+    start[..., STARTERS:] = substitution
+
+    def goals_on_pitch(side_minutes):
+        return (
+            (side_minutes[:, None, None, :] > start[..., None])
+            & (side_minutes[:, None, None, :] <= end[..., None])
+        ).sum(axis=-1)
+
+    goals_home = goals_on_pitch(minutes[:, 0])
+    goals_away = goals_on_pitch(minutes[:, 1])
+    sign = np.array([1, -1])[None, :, None]
+    goal_difference = sign * (goals_home - goals_away)
+
+    team = schedule[:, 1:][..., None].repeat(appearances, axis=-1)
+    matchday = schedule[:, :1, None].repeat(2, axis=1)
+    matchday = matchday.repeat(appearances, axis=-1)
+    side = np.array(["home", "away"])[None, :, None]
+    side = np.broadcast_to(side, team.shape)
+
+    team_urls = np.array(
+        [f"/teams/l{league:02}-t{number:02}/" for number in range(teams)]
+    )
+    team_names = np.array(
+        [f"Team L{league:02} T{number:02}" for number in range(teams)]
+    )
+    player_ids = (team * squad + players).ravel()
+    player_urls = np.array(
+        [
+            f"/player_summary/l{league:02}-t{number // squad:02}-"
+            f"p{number % squad:02}/"
+            for number in range(teams * squad)
+        ]
+    )
+    player_names = np.array(
+        [
+            f"Player L{league:02} T{number // squad:02} P{number % squad:02}"
+            for number in range(teams * squad)
+        ]
+    )
+
+    df_players = pd.DataFrame(
+        {
+            "player_url": player_urls[player_ids],
+            "player_name": player_names[player_ids],
+            "side": side.ravel(),
+            "team_url": team_urls[team.ravel()],
+            "team_name": team_names[team.ravel()],
+            "start": start.ravel(),
+            "end": end.ravel(),
+            "duration": (end - start).ravel(),
+            "goal_difference": goal_difference.ravel(),
+            "matchday": matchday.ravel(),
+            "competition": competition,
+            "year": year,
+        }
+    )
+    df_matches = pd.DataFrame(
+        {
+            "competition": competition,
+            "year": year,
+            "matchday": schedule[:, 0],
+            "team_home_url": team_urls[schedule[:, 1]],
+            "team_away_url": team_urls[schedule[:, 2]],
+            "score_home": scores[:, 0],
+            "score_away": scores[:, 1],
+        }
+    )
+
+    # scorers without drawing from rng, so players and matches stay the same
+    match, goal_side, slot = np.nonzero(minutes <= MATCH_END)
+    goal_minutes = minutes[match, goal_side, slot]
+    on_pitch = (start[match, goal_side] < goal_minutes[:, None]) & (
+        goal_minutes[:, None] <= end[match, goal_side]
+    )
+    choice = goal_minutes % on_pitch.sum(axis=1)
+    scorer = np.argmax(np.cumsum(on_pitch, axis=1) > choice[:, None], axis=1)
+    scorer_ids = (
+        team[match, goal_side, scorer] * squad
+        + players[match, goal_side, scorer]
+    )
+    df_goals = pd.DataFrame(
+        {
+            "team_home_url": team_urls[schedule[match, 1]],
+            "team_away_url": team_urls[schedule[match, 2]],
+            "side": np.array(["home", "away"])[goal_side],
+            "minute": goal_minutes,
+            "player_url": player_urls[scorer_ids],
+            "matchday": schedule[match, 0],
+            "competition": competition,
+            "year": year,
+        }
+    )
+    return df_players, df_matches, df_goals
+
+
+def iter_seasons(
+    leagues: int = 1,
+    seasons: int = 1,
+    teams: int = TEAMS,
+    squad: int = SQUAD,
+    seed: int = 0,
+) -> Iterator[Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]]:
+    rng = np.random.default_rng(seed)
+    for league in range(leagues):
+        for season in range(seasons):
+            year = f"{2000 + season}-{2001 + season}"
+            yield generate_season(
+                rng, f"league-{league:02}", year, league, teams, squad
+            )
+
+
+def generate(
+    leagues: int = 1,
+    seasons: int = 1,
+    teams: int = TEAMS,
+    squad: int = SQUAD,
+    seed: int = 0,
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """players, matches and goals of `leagues` x `seasons`, the same for a
+    seed"""
+    frames = zip(*iter_seasons(leagues, seasons, teams, squad, seed))
+    return tuple(pd.concat(kind, ignore_index=True) for kind in frames)
+
+
+def write(path, leagues: int = 1, seasons: int = 1, seed: int = 0):
+    """Generated datasets as parquet partitions, the layout of the app."""
+    from gd_analysis import data
+
+    # a season at a time, 50 leagues x 30 seasons do not fit in memory as
+    # object columns
+    appearances = matches = 0
+    for df_players, df_matches, df_goals in iter_seasons(
+        leagues, seasons, seed=seed
+    ):
+        data.write_dataset(df_players, "players", path)
+        data.write_dataset(df_matches, "matches", path)
+        data.write_dataset(df_goals, "goals", path)
+        appearances += len(df_players)
+        matches += len(df_matches)
+    return appearances, matches
+
+
+if __name__ == "__main__":
+    path, leagues, seasons = sys.argv[1], *map(int, sys.argv[2:4])
+    print("%d appearances, %d matches" % write(path, leagues, seasons))
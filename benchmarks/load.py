@@ -0,0 +1,318 @@
+"""
+Concurrent users replaying dropdown selections against the Dash callbacks.
+
+Every simulated user loads the page and then selects a competition, a season,
+a team and a player, each from the options the app returned, as the browser
+would: a change fires every callback that has the component as an input,
+through POST /_dash-update-component. The users run in a thread pool, either
+in process through the Flask test client or against a running server.
+
+    python -m benchmarks.load --users 16 --sessions 5 [--size league]
+    python -m benchmarks.load --users 16 --url http://127.0.0.1:8050
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+PAGE_SIZE = 10
+
+
+class TestClient:
+    """app.server in this process, a Flask test client per user."""
+
+    def __init__(self):
+        # no warm-up competing with the simulated users
+        os.environ.setdefault("GD_ANALYSIS_WARMUP", "0")
+        from gd_analysis.app import app
+
+        self.server = app.server
+
+    def connect(self):
+        return self.server.test_client()
+
+    @staticmethod
+    def get(client, path: str) -> Tuple[int, Any]:
+        response = client.get(path)
+        return response.status_code, response.get_json()
+
+    @staticmethod
+    def post(client, path: str, payload: Dict) -> Tuple[int, Any]:
+        response = client.post(path, json=payload)
+        return response.status_code, response.get_json()
+
+
+class HttpClient:
+    """A running server, a requests session per user."""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+
+    def connect(self):
+        import requests
+
+        return requests.Session()
+
+    def get(self, session, path: str) -> Tuple[int, Any]:
+        response = session.get(self.url + path)
+        return response.status_code, response.json()
+
+    def post(self, session, path: str, payload: Dict) -> Tuple[int, Any]:
+        response = session.post(self.url + path, json=payload)
+        return response.status_code, response.json()
+
+
+def get_outputs(output: str) -> List[Dict[str, str]]:
+    # "id.property", or "..id.property...id.property.." for several outputs
+    outputs = (
+        output[2:-2].split("...") if output.startswith("..") else [output]
+    )
+    return [
+        dict(zip(["id", "property"], output.rsplit(".", 1)))
+        for output in outputs
+    ]
+
+
+def get_payload(
+    dependency: Dict, values: Dict[str, Any], changed: List[str]
+) -> Dict:
+    def get_values(dependencies):
+        return [
+            {
+                "id": item["id"],
+                "property": item["property"],
+                "value": values.get(f"{item['id']}.{item['property']}"),
+            }
+            for item in dependencies
+        ]
+
+    outputs = get_outputs(dependency["output"])
+    return {
+        "output": dependency["output"],
+        "outputs": outputs if len(outputs) > 1 else outputs[0],
+        "inputs": get_values(dependency["inputs"]),
+        "state": get_values(dependency.get("state", [])),
+        "changedPropIds": changed,
+    }
+
+
+def get_layout_options(layout: Dict) -> Dict[str, List]:
+    """Dropdown options of the served layout, by component id."""
+    options = {}
+
+    def walk(component):
+        if isinstance(component, list):
+            for child in component:
+                walk(child)
+        elif isinstance(component, dict):
+            props = component.get("props", {})
+            if "options" in props and "id" in props:
+                options[props["id"]] = props["options"]
+            walk(props.get("children"))
+
+    walk(layout)
+    return options
+
+
+class User:
+    def __init__(self, client, dependencies, seed: int, think_time: float):
+        self.client = client
+        self.dependencies = dependencies
+        self.random = random.Random(seed)
+        self.think_time = think_time
+        self.latencies: List[Tuple[str, float, bool]] = []
+
+    def request(self, name: str, call) -> Tuple[int, Any]:
+        started = time.perf_counter()
+        try:
+            status, body = call()
+        except Exception:
+            status, body = None, None
+        self.latencies.append(
+            (name, (time.perf_counter() - started) * 1000, status == 200)
+        )
+        return status, body
+
+    def change(self, session, values: Dict[str, Any], prop_id: str):
+        """Fire the callbacks of a changed component, return their outputs."""
+        outputs = {}
+        for dependency in self.dependencies:
+            inputs = [
+                f"{item['id']}.{item['property']}"
+                for item in dependency["inputs"]
+            ]
+            if prop_id not in inputs:
+                continue
+            payload = get_payload(dependency, values, [prop_id])
+            status, body = self.request(
+                dependency["output"],
+                lambda: self.client.post(
+                    session, "/_dash-update-component", payload
+                ),
+            )
+            if status == 200 and body:
+                for component, props in body.get("response", {}).items():
+                    for prop, value in props.items():
+                        outputs[f"{component}.{prop}"] = value
+        if self.think_time:
+            time.sleep(self.random.uniform(0, 2 * self.think_time))
+        return outputs
+
+    def choose(self, options: Optional[List[Dict]]) -> Optional[str]:
+        if not options:
+            return None
+        return self.random.choice(options)["value"]
+
+    def run_session(self, session):
+        _, layout = self.request(
+            "layout", lambda: self.client.get(session, "/_dash-layout")
+        )
+        options = get_layout_options(layout or {})
+        values = {
+            "datatable-raw.page_current": 0,
+            "datatable-raw.page_size": PAGE_SIZE,
+            "datatable-raw.filter_query": "",
+            "datatable-raw.sort_by": [],
+        }
+        # competition -> season -> team -> player, each from the options
+        # that are shown at that point
+        for component in [
+            "dropdown-competition",
+            "dropdown-season",
+            "dropdown-team",
+            "dropdown-player",
+        ]:
+            value = self.choose(options.get(component))
+            if value is None:
+                break
+            prop_id = f"{component}.value"
+            values[prop_id] = value
+            outputs = self.change(session, values, prop_id)
+            for output, output_value in outputs.items():
+                component_id, prop = output.rsplit(".", 1)
+                if prop == "options":
+                    options[component_id] = output_value
+
+    def run(self, sessions: int):
+        session = self.client.connect()
+        for _ in range(sessions):
+            self.run_session(session)
+        return self.latencies
+
+
+def run(
+    client,
+    users: int,
+    sessions: int,
+    think_time: float = 0.0,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    setup = client.connect()
+    _, dependencies = client.get(setup, "/_dash-dependencies")
+    # the first request loads the datasets, it is not part of the timings
+    client.get(setup, "/_dash-layout")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(users) as pool:
+        latencies = list(
+            pool.map(
+                lambda user: user.run(sessions),
+                [
+                    User(client, dependencies, seed + number, think_time)
+                    for number in range(users)
+                ],
+            )
+        )
+    seconds = time.perf_counter() - started
+    return get_report(
+        [latency for user in latencies for latency in user], seconds, users
+    )
+
+
+def get_report(
+    latencies: List[Tuple[str, float, bool]], seconds: float, users: int
+) -> Dict[str, Any]:
+    by_name = defaultdict(list)
+    errors = defaultdict(int)
+    for name, milliseconds, ok in latencies:
+        by_name[name].append(milliseconds)
+        by_name["all"].append(milliseconds)
+        if not ok:
+            errors[name] += 1
+            errors["all"] += 1
+
+    report = {"users": users, "seconds": seconds, "requests": {}}
+    for name, milliseconds in by_name.items():
+        p50, p95, p99 = np.percentile(milliseconds, [50, 95, 99])
+        report["requests"][name] = {
+            "count": len(milliseconds),
+            "errors": errors[name],
+            "per_second": len(milliseconds) / seconds,
+            "p50": p50,
+            "p95": p95,
+            "p99": p99,
+        }
+    return report
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"{report['users']} users, {report['seconds']:.2f} s")
+    print(
+        f"  {'request':<60} {'count':>6} {'errors':>6} {'req/s':>8}"
+        f" {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    )
+    requests = sorted(report["requests"].items())
+    # the totals last
+    requests.sort(key=lambda item: item[0] == "all")
+    for name, stats in requests:
+        print(
+            f"  {name.strip('.').replace('...', ','):<60}"
+            f" {stats['count']:>6} {stats['errors']:>6}"
+            f" {stats['per_second']:>8.1f} {stats['p50']:>8.1f}"
+            f" {stats['p95']:>8.1f} {stats['p99']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Concurrent users against the Dash callbacks."
+    )
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--sessions", type=int, default=5)
+    parser.add_argument("--think-time", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="running server, else in process")
+    parser.add_argument(
+        "--size", help="generated dataset of benchmarks.run, in process"
+    )
+    parser.add_argument("--output", help="json file for the report")
+    arguments = parser.parse_args()
+
+    if arguments.url:
+        client = HttpClient(arguments.url)
+    else:
+        if arguments.size:
+            from .run import get_data_path
+
+            # before gd_analysis is imported, it reads the path at import
+            os.environ["GD_ANALYSIS_DATA"] = str(get_data_path(arguments.size))
+        client = TestClient()
+
+    report = run(
+        client,
+        arguments.users,
+        arguments.sessions,
+        arguments.think_time,
+        arguments.seed,
+    )
+    print_report(report)
+    if arguments.output:
+        Path(arguments.output).write_text(json.dumps(report, indent=1))
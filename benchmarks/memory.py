@@ -0,0 +1,163 @@
+"""
+Memory of the gunicorn workers serving the Dash app, with and without the
+datasets preloaded before the fork (see gunicorn.conf.py).
+
+Every worker count is started with the generated dataset of a size, driven
+with the load harness until all workers have served callbacks, and then the
+RSS and PSS of the master and each worker are read from
+/proc/<pid>/smaps_rollup (Linux only). PSS splits shared pages between the
+processes sharing them, so the total PSS is the memory the server costs.
+
+    python -m benchmarks.memory --workers 1 4 16 --size league
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from . import load
+from .run import get_data_path
+
+ROOT = Path(__file__).parent.parent
+CONFIG = ROOT / "gunicorn.conf.py"
+SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Private_Clean", "Private_Dirty")
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get_memory(pid: int) -> Dict[str, float]:
+    """Fields of smaps_rollup in MB."""
+    memory = {}
+    with open(f"/proc/{pid}/smaps_rollup") as smaps:
+        for line in smaps:
+            field, _, value = line.partition(":")
+            if field in SMAPS_FIELDS:
+                memory[field] = int(value.split()[0]) / 1024
+    return memory
+
+
+def get_children(pid: int) -> List[int]:
+    children = []
+    for stat in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            fields = stat.read_text().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(stat.parent.name))
+    return children
+
+
+def wait_until_ready(client, session, timeout: float = 300):
+    started = time.time()
+    while time.time() - started < timeout:
+        try:
+            status, _ = client.get(session, "/_dash-layout")
+            if status == 200:
+                return
+        except Exception:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError("gunicorn did not serve the layout in time")
+
+
+def measure_workers(
+    workers: int, data_path: Path, preload: bool, sessions: int
+) -> Dict[str, Any]:
+    port = get_free_port()
+    env = dict(
+        os.environ,
+        GD_ANALYSIS_DATA=str(data_path),
+        GD_ANALYSIS_BIND=f"127.0.0.1:{port}",
+        GD_ANALYSIS_WORKERS=str(workers),
+        GD_ANALYSIS_PRELOAD="1" if preload else "0",
+        GD_ANALYSIS_WARMUP="0",
+    )
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "-c",
+            str(CONFIG),
+            "gd_analysis.app:server",
+        ],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        client = load.HttpClient(f"http://127.0.0.1:{port}")
+        wait_until_ready(client, client.connect())
+        # enough users that every worker serves (and loads) the datasets
+        load.run(client, users=2 * workers, sessions=sessions)
+
+        pids = get_children(server.pid)
+        master = get_memory(server.pid)
+        worker_memory = [get_memory(pid) for pid in pids]
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+    def mean(field):
+        return statistics.mean(memory[field] for memory in worker_memory)
+
+    return {
+        "workers": workers,
+        "preload": preload,
+        "master_rss": master["Rss"],
+        "worker_rss": mean("Rss"),
+        "worker_pss": mean("Pss"),
+        "worker_private": mean("Private_Clean") + mean("Private_Dirty"),
+        "total_pss": master["Pss"]
+        + sum(memory["Pss"] for memory in worker_memory),
+    }
+
+
+def print_result(result: Dict[str, Any]):
+    print(
+        f"  {result['workers']:>3} workers"
+        f"  preload {str(result['preload']):<5}"
+        f"  master rss {result['master_rss']:7.1f} MB"
+        f"  worker rss {result['worker_rss']:7.1f} MB"
+        f"  pss {result['worker_pss']:7.1f} MB"
+        f"  private {result['worker_private']:7.1f} MB"
+        f"  total pss {result['total_pss']:8.1f} MB"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Memory of gunicorn workers with a shared dataset."
+    )
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--size", default="league")
+    parser.add_argument("--sessions", type=int, default=2)
+    parser.add_argument("--output", help="json file for the results")
+    arguments = parser.parse_args()
+
+    data_path = get_data_path(arguments.size)
+    results = []
+    print(f"{arguments.size}: {data_path}")
+    for preload in [True, False]:
+        for workers in arguments.workers:
+            result = measure_workers(
+                workers, data_path, preload, arguments.sessions
+            )
+            print_result(result)
+            results.append(result)
+    if arguments.output:
+        Path(arguments.output).write_text(json.dumps(results, indent=1))
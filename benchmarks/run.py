@@ -0,0 +1,330 @@
+"""
+Timings of the data, analysis and visualization functions and of the Dash
+callbacks on generated datasets of several sizes.
+
+Every size runs in its own process with GD_ANALYSIS_DATA pointing at the
+generated data, so that the import time settings of gd_analysis apply. The
+results of a run are written to results/{commit}.json, compare two runs with
+`python -m benchmarks.compare`.
+
+    python -m benchmarks.run [--sizes season league medium full]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from . import generate
+
+# (leagues, seasons)
+SIZES = {
+    "season": (1, 1),
+    "league": (1, 30),
+    "medium": (5, 10),
+    "full": (50, 30),
+}
+DEFAULT_SIZES = ["season", "league", "medium"]
+RESULTS_PATH = Path(__file__).parent / "results"
+DATA_PATH = Path(tempfile.gettempdir(), "gd_analysis_benchmarks")
+PAGE_SIZE = 10
+# (players, appearances each, resamples) of the fixed size bootstrap case
+BOOTSTRAP_SIZE = (2400, 30, 10000)
+BOOTSTRAP_REPEAT = 3
+
+
+def measure(function: Callable, repeat: int, setup=None) -> Dict[str, float]:
+    """first, min and median of `repeat` calls in ms"""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - started) * 1000)
+    warm = times[1:] or times
+    return {
+        "first": times[0],
+        "min": min(warm),
+        "median": statistics.median(warm),
+        "repeat": repeat,
+    }
+
+
+def get_selection() -> Dict[str, Any]:
+    """Component values of a selection with data in every dropdown."""
+    from gd_analysis import loader
+
+    appearance_store = loader.get_datasets().appearance_store
+    competition = appearance_store.competitions()[0]
+    season = appearance_store.seasons(competition)[-1]
+    team = appearance_store.teams(competition, season)[0]
+    player, _ = appearance_store.players_for_team(competition, season, team)[0]
+    return {
+        "dropdown-competition.value": competition,
+        "dropdown-season.value": season,
+        "dropdown-team.value": team,
+        "dropdown-player.value": player,
+        "datatable-raw.page_current": 0,
+        "datatable-raw.page_size": PAGE_SIZE,
+        "datatable-raw.filter_query": "",
+        "datatable-raw.sort_by": [],
+    }
+
+
+def get_callback_args(callback: Dict, values: Dict[str, Any]) -> List[Any]:
+    """Arguments of a callback of app.callback_map, inputs then states."""
+    return [
+        values.get(f"{dependency['id']}.{dependency['property']}")
+        for dependency in callback["inputs"] + callback["state"]
+    ]
+
+
+def get_benchmarks() -> List[Tuple[str, Callable]]:
+    from gd_analysis import analysis, data, loader, visualization
+    from gd_analysis.app import app
+
+    datasets = loader.get_datasets()
+    df_players, df_matches = datasets.df_players, datasets.df_matches
+    values = get_selection()
+    competition = values["dropdown-competition.value"]
+    season = values["dropdown-season.value"]
+    team = values["dropdown-team.value"]
+    player = values["dropdown-player.value"]
+
+    df_competition = data.filter_competition(df_players, competition)
+    df_season = data.filter_season(df_competition, season)
+    df_team = data.filter_team_url(df_season, team)
+    df_matches_season = data.filter_season(
+        data.filter_competition(df_matches, competition), season
+    )
+    # not a loaded dataset, the filters fall back to boolean masks
+    df_players_unindexed = df_players.copy()
+
+    benchmarks = [
+        (
+            "data.filter_competition",
+            lambda: data.filter_competition(df_players, competition),
+        ),
+        (
+            "data.filter_season",
+            lambda: data.filter_season(df_competition, season),
+        ),
+        (
+            "data.filter_team_url",
+            lambda: data.filter_team_url(df_season, team),
+        ),
+        (
+            "data.filter_player_url",
+            lambda: data.filter_player_url(df_team, player),
+        ),
+        (
+            "data.filter_season[unindexed]",
+            lambda: data.filter_season(df_players_unindexed, season),
+        ),
+        (
+            "analysis.get_players_goal_differences",
+            lambda: analysis.get_players_goal_differences(df_season),
+        ),
+        (
+            "analysis.get_gd90_intervals",
+            lambda: analysis.get_gd90_intervals(df_season),
+        ),
+        (
+            "analysis.goal_difference_for_team",
+            lambda: analysis.goal_difference_for_team(df_matches_season, team),
+        ),
+        (
+            "visualization.scatter_players_for_season",
+            lambda: visualization.scatter_players_for_season(
+                df_players,
+                df_matches,
+                competition,
+                season,
+                "gd90",
+                "full_games",
+            ),
+        ),
+        (
+            "visualization.scatter_players_for_team",
+            lambda: visualization.scatter_players_for_team(
+                df_players, df_matches, competition, season, team
+            ),
+        ),
+        (
+            "visualization.bar_players_for_team",
+            lambda: visualization.bar_players_for_team(
+                df_players, df_matches, competition, season, team
+            ),
+        ),
+    ]
+    # the figure callbacks read the figure cache after their first call
+    for output, callback in app.callback_map.items():
+        # the undecorated function, without the dash request handling
+        function = getattr(callback["callback"], "__wrapped__")
+        args = get_callback_args(callback, values)
+        benchmarks.append(
+            (
+                f"callback[{output.strip('.').replace('...', ',')}]",
+                lambda function=function, args=args: function(*args),
+            )
+        )
+    return benchmarks
+
+
+def get_bootstrap_appearances(players: int, appearances: int):
+    """`appearances` random appearances of each of `players` players."""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    player = np.repeat(np.arange(players), appearances)
+    return pd.DataFrame(
+        {
+            "team_url": (player // 25).astype(str),
+            "player_url": player.astype(str),
+            "player_name": player.astype(str),
+            "duration": rng.integers(1, 91, len(player)),
+            "goal_difference": rng.integers(-3, 4, len(player)),
+        }
+    )
+
+
+def run_size(path: Path, repeat: int) -> Dict[str, Any]:
+    """Benchmarks of the datasets in `path`, run in the child process."""
+    from gd_analysis import analysis, loader
+
+    for kind in loader.KINDS:
+        loader.get_arrow_path(kind, path).unlink(missing_ok=True)
+    results = {
+        # from parquet, with the conversion and the arrow files written
+        "loader.load[parquet]": measure(lambda: loader.load(path), 1),
+        "loader.load[arrow]": measure(lambda: loader.load(path), repeat),
+    }
+    datasets = loader.get_datasets()
+    for name, function in get_benchmarks():
+        # the results cache would turn every call after the first into a hit
+        results[name] = measure(
+            function, repeat, analysis.goal_differences_cache.invalidate
+        )
+    # independent of the datasets, the size of a large league's season
+    players, appearances, resamples = BOOTSTRAP_SIZE
+    df_appearances = get_bootstrap_appearances(players, appearances)
+    results[
+        f"analysis.get_gd90_intervals[{players}x{appearances},{resamples}]"
+    ] = measure(
+        lambda: analysis.get_gd90_intervals(df_appearances, resamples),
+        BOOTSTRAP_REPEAT,
+    )
+    return {
+        "appearances": len(datasets.df_players),
+        "matches": len(datasets.df_matches),
+        "results": results,
+    }
+
+
+def get_data_path(size: str) -> Path:
+    path = DATA_PATH / size
+    if not path.is_dir():
+        leagues, seasons = SIZES[size]
+        generate.write(path, leagues, seasons)
+    return path
+
+
+def get_commit() -> str:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if dirty else commit
+
+
+def run(sizes: List[str], repeat: int) -> Dict[str, Any]:
+    report = {
+        "commit": get_commit(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "sizes": {},
+    }
+    for size in sizes:
+        path = get_data_path(size)
+        with tempfile.TemporaryDirectory() as figures:
+            env = dict(
+                os.environ,
+                GD_ANALYSIS_DATA=str(path),
+                GD_ANALYSIS_FIGURE_CACHE=figures,
+                GD_ANALYSIS_PERSIST_AGGREGATES="0",
+                # no warm-up filling the caches behind the measurements
+                GD_ANALYSIS_WARMUP="0",
+            )
+            process = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.run",
+                    "--child",
+                    str(path),
+                    "--repeat",
+                    str(repeat),
+                ],
+                env=env,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+        report["sizes"][size] = json.loads(process.stdout.splitlines()[-1])
+        print_size(size, report["sizes"][size])
+    return report
+
+
+def print_size(size: str, result: Dict[str, Any]):
+    print(
+        f"\n{size}: {result['appearances']} appearances, "
+        f"{result['matches']} matches"
+    )
+    for name, timing in result["results"].items():
+        print(
+            f"  {name:<60} first {timing['first']:9.2f} ms"
+            f"  median {timing['median']:9.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark gd_analysis on generated datasets."
+    )
+    parser.add_argument(
+        "--sizes", nargs="+", choices=list(SIZES), default=DEFAULT_SIZES
+    )
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--output", help="json file for the results")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.child:
+        print(json.dumps(run_size(Path(arguments.child), arguments.repeat)))
+    else:
+        report = run(arguments.sizes, arguments.repeat)
+        output = Path(
+            arguments.output or RESULTS_PATH / f"{report['commit']}.json"
+        )
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=1))
+        print(f"\nwritten to {output}")
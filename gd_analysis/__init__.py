@@ -1,10 +1,17 @@
-from pkg_resources import resource_stream
-import pandas as pd
+import time
 
-print(__name__)
-stream = resource_stream(__name__, "data/df_players.pkl")
-df_players = pd.read_pickle(stream, compression=None)
-df_players = df_players.dropna(subset=["goal_difference"])
+_import_started = time.perf_counter()
 
-stream = resource_stream(__name__, "data/df_matches.pkl")
-df_matches = pd.read_pickle(stream, compression=None)
+from . import loader  # noqa: E402
+
+DATASET_ATTRIBUTES = loader.Datasets._fields
+
+
+def __getattr__(name):
+    # df_players, df_matches, ... are loaded on first access, not at import
+    if name in DATASET_ATTRIBUTES:
+        return getattr(loader.get_datasets(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+loader.timings["import"] = time.perf_counter() - _import_started
@@ -0,0 +1,320 @@
+import json
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .data import write_atomically
+
+"""
+Materialized goal difference aggregates for all competitions and seasons.
+
+The table is indexed by (competition, year, team_url, player_url,
+player_name) and holds the columns of analysis.get_players_goal_differences:
+    'duration', 'goal_difference', 'appearances', 'gd_total', 'gd90',
+    'full_games', 'relative_gd90'
+and the split against the rest of the team's minutes in the season
+    'off_duration', 'off_goal_difference', 'off_gd90', 'on_minus_off_gd90'
+so that a season or team is a sorted index slice instead of a groupby.
+
+The team table is indexed by (competition, year, team_url) and holds
+    'matches', 'goal_difference', 'gd_per_match'
+for every team in every season.
+
+RunningAggregates keeps the sums of both tables and updates them from
+appended appearances and matches (e.g. a new matchday) in time proportional
+to the batch. The loader starts one from the persisted table and appends the
+players files added since, instead of aggregating all appearances again.
+"""
+
+AGGREGATE_KEYS = [
+    "competition",
+    "year",
+    "team_url",
+    "player_url",
+    "player_name",
+]
+TEAM_KEYS = ["competition", "year", "team_url"]
+AGGREGATE_SUMS = ["duration", "goal_difference", "appearances"]
+TEAM_SUMS = ["matches", "goal_difference"]
+MATCH_MINUTES = 90
+
+
+def add_rates(df_grouped: pd.DataFrame) -> pd.DataFrame:
+    # gd90 = sum(goal_difference) / sum(duration) * 90
+    df_grouped["gd_total"] = (
+        df_grouped["goal_difference"] / df_grouped["duration"]
+    )
+    df_grouped["gd90"] = df_grouped["gd_total"] * 90
+    df_grouped["full_games"] = df_grouped["duration"] / 90
+    return df_grouped
+
+
+def get_aggregates(df_players: pd.DataFrame) -> pd.DataFrame:
+    # one grouped pass for the sums and the count
+    df_grouped = (
+        df_players.astype({"duration": "int64", "goal_difference": "int64"})
+        .groupby(AGGREGATE_KEYS, observed=True)
+        .agg(
+            duration=("duration", "sum"),
+            goal_difference=("goal_difference", "sum"),
+            appearances=("duration", "size"),
+        )
+    )
+    return add_rates(df_grouped).sort_index()
+
+
+def get_team_goal_differences(df_matches: pd.DataFrame) -> pd.DataFrame:
+    df_matches = df_matches.assign(
+        goal_difference_home=(
+            df_matches["score_home"].astype("int64")
+            - df_matches["score_away"].astype("int64")
+        )
+    )
+    # one row per team and match, home and away stacked
+    df_long = df_matches.melt(
+        id_vars=["competition", "year", "goal_difference_home"],
+        value_vars=["team_home_url", "team_away_url"],
+        var_name="side",
+        value_name="team_url",
+    )
+    df_long["goal_difference"] = (
+        np.where(df_long["side"] == "team_home_url", 1, -1)
+        * df_long["goal_difference_home"]
+    )
+
+    df_teams = df_long.groupby(TEAM_KEYS, observed=True).agg(
+        matches=("goal_difference", "size"),
+        goal_difference=("goal_difference", "sum"),
+    )
+    df_teams["gd_per_match"] = (
+        df_teams["goal_difference"] / df_teams["matches"]
+    )
+    return df_teams.sort_index()
+
+
+def add_team_columns(
+    df_aggregates: pd.DataFrame, df_teams: pd.DataFrame
+) -> pd.DataFrame:
+    """relative_gd90 and the on/off pitch split, from one join on the team."""
+    team_index = df_aggregates.index.droplevel(["player_url", "player_name"])
+    df_team = df_teams[["matches", "goal_difference", "gd_per_match"]]
+    df_team = df_team.reindex(team_index)
+
+    # player gd90 minus the goal difference per match of the team
+    df_aggregates["relative_gd90"] = (
+        df_aggregates["gd90"] - df_team["gd_per_match"].values
+    )
+
+    # the rest of the team's minutes, including the matches the player missed
+    off_duration = (
+        df_team["matches"].values * MATCH_MINUTES - df_aggregates["duration"]
+    ).clip(lower=0)
+    off_goal_difference = (
+        df_team["goal_difference"].values - df_aggregates["goal_difference"]
+    )
+    df_aggregates["off_duration"] = off_duration
+    df_aggregates["off_goal_difference"] = off_goal_difference
+    df_aggregates["off_gd90"] = (
+        off_goal_difference / off_duration.where(off_duration > 0) * 90
+    )
+    df_aggregates["on_minus_off_gd90"] = (
+        df_aggregates["gd90"] - df_aggregates["off_gd90"]
+    )
+    return df_aggregates
+
+
+def select_aggregates(
+    df_aggregates: pd.DataFrame,
+    competition: str,
+    season: str,
+    team: Optional[str] = None,
+) -> pd.DataFrame:
+    """Rows of a season (or team), indexed like get_players_goal_differences."""
+    key = (
+        (competition, season) if team is None else (competition, season, team)
+    )
+    index = df_aggregates.index
+    # positions of the key in the sorted index, without a boolean scan
+    try:
+        start, stop = index.slice_locs(key, key)
+    except (KeyError, TypeError):
+        start, stop = 0, 0
+    df_selected = df_aggregates.iloc[start:stop]
+    return df_selected.droplevel(["competition", "year"])
+
+
+def select_team_goal_difference(
+    df_teams: pd.DataFrame, competition: str, season: str, team: str
+) -> float:
+    try:
+        return df_teams.loc[(competition, season, team), "gd_per_match"]
+    except KeyError:
+        return np.nan
+
+
+class _RunningSums:
+    # one row of sums per key, the arrays grow by doubling
+    def __init__(self, keys, columns):
+        self.keys = keys
+        self.columns = columns
+        self.rows: Dict[Tuple, int] = {}
+        self.sums = np.zeros((64, len(columns)), dtype="int64")
+
+    def add(self, df_grouped: pd.DataFrame):
+        rows = np.empty(len(df_grouped), dtype="int64")
+        for position, key in enumerate(df_grouped.index):
+            row = self.rows.get(key)
+            if row is None:
+                row = self.rows[key] = len(self.rows)
+            rows[position] = row
+        if len(self.rows) > len(self.sums):
+            sums = np.zeros(
+                (max(len(self.rows), 2 * len(self.sums)), len(self.columns)),
+                dtype="int64",
+            )
+            sums[: len(self.sums)] = self.sums
+            self.sums = sums
+        np.add.at(self.sums, rows, df_grouped[self.columns].values)
+
+    def to_frame(self) -> pd.DataFrame:
+        index = pd.MultiIndex.from_tuples(list(self.rows), names=self.keys)
+        return pd.DataFrame(
+            self.sums[: len(self.rows)], index=index, columns=self.columns
+        )
+
+
+class RunningAggregates:
+    """Aggregate and team tables kept up to date from appended rows.
+
+    Only for rows that are new, a matchday that changed has to be rebuilt
+    with get_aggregates and get_team_goal_differences.
+    """
+
+    def __init__(self):
+        self._players = _RunningSums(AGGREGATE_KEYS, AGGREGATE_SUMS)
+        self._teams = _RunningSums(TEAM_KEYS, TEAM_SUMS)
+        self._lock = threading.Lock()
+
+    def add_aggregates(
+        self,
+        df_aggregates: pd.DataFrame,
+        df_teams: Optional[pd.DataFrame] = None,
+    ):
+        """Start from the sums of earlier tables, e.g. persisted ones."""
+        with self._lock:
+            self._players.add(df_aggregates)
+            if df_teams is not None:
+                self._teams.add(df_teams)
+
+    def append(
+        self,
+        df_players: pd.DataFrame,
+        df_matches: Optional[pd.DataFrame] = None,
+    ):
+        # both groupbys only see the batch
+        df_grouped = get_aggregates(df_players)
+        df_teams = (
+            get_team_goal_differences(df_matches)
+            if df_matches is not None
+            else None
+        )
+        self.add_aggregates(df_grouped, df_teams)
+
+    def get_teams(self) -> pd.DataFrame:
+        with self._lock:
+            df_teams = self._teams.to_frame()
+        df_teams["gd_per_match"] = (
+            df_teams["goal_difference"] / df_teams["matches"]
+        )
+        return df_teams.sort_index()
+
+    def get_players(self) -> pd.DataFrame:
+        """Same table as get_aggregates on all rows."""
+        with self._lock:
+            df_aggregates = self._players.to_frame()
+        return add_rates(df_aggregates).sort_index()
+
+    def get_aggregates(self) -> pd.DataFrame:
+        """Same table as get_aggregates and add_team_columns on all rows."""
+        return add_team_columns(self.get_players(), self.get_teams())
+
+
+def set_player_names(
+    df_aggregates: pd.DataFrame, player_names: pd.Series
+) -> pd.DataFrame:
+    """Aggregates with the player_name of player_names for every url.
+
+    Rows of a player that were aggregated under another spelling of the name
+    are summed into one.
+    """
+    index = df_aggregates.index.to_frame(index=False)
+    names = player_names.reindex(index["player_url"].astype(str)).values
+    names = np.where(pd.isna(names), index["player_name"].values, names)
+    if (names == index["player_name"].values).all():
+        return df_aggregates
+    df_sums = df_aggregates[AGGREGATE_SUMS].set_axis(
+        pd.MultiIndex.from_frame(index.assign(player_name=names)), axis=0
+    )
+    df_sums = df_sums.groupby(level=AGGREGATE_KEYS).sum()
+    return add_rates(df_sums).sort_index()
+
+
+def get_aggregates_path(path, version: str) -> Path:
+    return Path(path, f"df_aggregates_{version}.parquet")
+
+
+def read_aggregates(path, version: str) -> Optional[pd.DataFrame]:
+    try:
+        df_aggregates = pd.read_parquet(get_aggregates_path(path, version))
+    except FileNotFoundError:
+        # none yet, or replaced by another process meanwhile
+        return None
+    return df_aggregates.set_index(AGGREGATE_KEYS).sort_index()
+
+
+def get_sources_path(path, version: str) -> Path:
+    return Path(path, f"df_aggregates_{version}.json")
+
+
+def read_latest_aggregates(
+    path,
+) -> Optional[Tuple[pd.DataFrame, Dict[str, List]]]:
+    """The persisted aggregates of any version and the files they sum."""
+    for file in Path(path).glob("df_aggregates_*.json"):
+        version = file.stem[len("df_aggregates_") :]
+        df_aggregates = read_aggregates(path, version)
+        if df_aggregates is None:
+            continue
+        try:
+            return df_aggregates, json.loads(file.read_text())
+        except FileNotFoundError:
+            # replaced by another process since the directory was listed
+            continue
+    return None
+
+
+def write_aggregates(
+    df_aggregates: pd.DataFrame,
+    path,
+    version: str,
+    sources: Optional[Dict[str, List]] = None,
+):
+    """Persist the table, with the players files it sums if known.
+
+    Other processes may read the files meanwhile, so the new ones are
+    written atomically before the files of other versions are removed.
+    """
+    files = [get_aggregates_path(path, version)]
+    with write_atomically(files[0]) as temporary:
+        df_aggregates.reset_index().to_parquet(temporary, index=False)
+    if sources is not None:
+        files.append(get_sources_path(path, version))
+        with write_atomically(files[1]) as temporary:
+            Path(temporary).write_text(json.dumps(sources))
+    for pattern in ["df_aggregates_*.parquet", "df_aggregates_*.json"]:
+        for file in Path(path).glob(pattern):
+            if file not in files:
+                file.unlink(missing_ok=True)
@@ -1,12 +1,34 @@
+import os
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
+
+from . import aggregates, loader, metrics
+from .aggregates import add_rates, select_aggregates
+from .cache import LRUCache
 from .data import (
     filter_competition,
     filter_season,
     filter_team_url,
     filter_player_url,
+    filter_appearances,
 )
 
+# results for the loaded datasets are cached per data version
+CACHE_MAX_BYTES = int(os.environ.get("GD_ANALYSIS_CACHE_MB", 256)) * 2**20
+goal_differences_cache = LRUCache(CACHE_MAX_BYTES)
+
+PLAYER_KEYS = ["team_url", "player_url", "player_name"]
+BOOTSTRAP_RESAMPLES = 1000
+BOOTSTRAP_CONFIDENCE = 0.9
+# resampled appearances per batch, small enough for the intermediate arrays
+# of a batch to stay in the CPU caches
+BOOTSTRAP_BATCH_SIZE = 2**18
 
+
+@metrics.instrument
 def goal_difference_for_team(df_matches, team_url: str) -> float:
     team_home_matches = df_matches[df_matches["team_home_url"] == team_url]
     goal_differences_home = (
@@ -25,32 +47,263 @@ def goal_difference_for_team(df_matches, team_url: str) -> float:
     return goal_difference_sum / count_matches
 
 
+@metrics.instrument
 def get_players_goal_differences(df_player_appearances):
+    # sums of the compact int8/int16 columns would overflow
+    df_player_appearances = df_player_appearances.astype(
+        {"duration": "int64", "goal_difference": "int64"}
+    )
+    # observed=True keeps categorical keys from expanding to all combinations
     df_grouped = df_player_appearances.groupby(
-        ["team_url", "player_url", "player_name"]
-    )["duration", "goal_difference"].sum()
+        ["team_url", "player_url", "player_name"], observed=True
+    )[["duration", "goal_difference"]].sum()
     df_grouped["appearances"] = df_player_appearances.groupby(
-        ["team_url", "player_url", "player_name"]
+        ["team_url", "player_url", "player_name"], observed=True
     )["duration"].count()
+    return add_rates(df_grouped)
+
+
+@metrics.instrument
+def select_players_goal_differences(
+    df_players: pd.DataFrame,
+    competition: str,
+    season: str,
+    team: Optional[str] = None,
+    min_appearances: int = 0,
+) -> pd.DataFrame:
+    def compute():
+        df = filter_competition(df_players, competition)
+        df = filter_season(df, season)
+        if team is not None:
+            df = filter_team_url(df, team)
+        df_grouped = get_players_goal_differences(df)
+        return filter_appearances(df_grouped, min_appearances)
+
+    version = loader.get_version(df_players)
+    if version is None:
+        return compute()
+
+    def compute_from_aggregates():
+        df_aggregates = loader.get_datasets().df_aggregates
+        df_grouped = select_aggregates(
+            df_aggregates, competition, season, team
+        )
+        return filter_appearances(df_grouped, min_appearances)
+
+    key = ("players", competition, season, team, min_appearances)
+    return goal_differences_cache.get(key, compute_from_aggregates, version)
+
+
+@metrics.instrument
+def get_gd90_intervals(
+    df_player_appearances: pd.DataFrame,
+    resamples: int = BOOTSTRAP_RESAMPLES,
+    confidence: float = BOOTSTRAP_CONFIDENCE,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """Bootstrap interval of gd90 per player, resampling the appearances.
+
+    Indexed like get_players_goal_differences, with the columns gd90_low and
+    gd90_high. All players are resampled at once, in batches of resamples.
+    """
+    groups = df_player_appearances.groupby(PLAYER_KEYS, observed=True)
+    index = groups.size().index
+    group = groups.ngroup().values
+    order = np.argsort(group, kind="stable")
+    counts = np.bincount(group, minlength=len(index))
+    starts = np.cumsum(counts) - counts
+
+    # duration << 32 + goal difference in one int64, so that a resample
+    # gathers and sums a single array
+    duration = df_player_appearances["duration"].values[order]
+    goal_difference = df_player_appearances["goal_difference"].values[order]
+    values = (duration.astype("int64") << 32) + goal_difference.astype("int64")
+
+    # a resample draws, for every appearance, one of the same player
+    column_starts = np.repeat(starts, counts).astype("uint32")
+    column_counts = np.repeat(counts, counts).astype("uint32")
+    rng = np.random.default_rng(seed)
+    # a row per player, so that the quantiles read contiguous rows
+    samples = np.empty((len(index), resamples), dtype="float32")
+    batch = max(1, BOOTSTRAP_BATCH_SIZE // max(len(order), 1))
+    for first in range(0, resamples, batch if len(order) else resamples):
+        size = min(batch, resamples - first)
+        # 16 random bits per draw, scaled to the player's appearances with
+        # (bits * count) >> 16, off uniform by at most count / 2**16
+        bits = rng.bit_generator.random_raw(-(-size * len(order) // 4))
+        bits = bits.view("uint16")[: size * len(order)]
+        drawn = np.multiply(
+            bits.reshape(size, len(order)), column_counts, dtype="uint32"
+        )
+        drawn >>= 16
+        drawn += column_starts
+        sums = np.add.reduceat(values[drawn], starts, axis=1)
+        duration_sum = (sums + 2**31) >> 32
+        goal_difference_sum = sums - (duration_sum << 32)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            samples[:, first : first + size] = (
+                goal_difference_sum / duration_sum * 90
+            ).T
+
+    tail = (1 - confidence) / 2
+    quantile = np.nanquantile if np.isnan(samples).any() else np.quantile
+    low, high = quantile(samples, [tail, 1 - tail], axis=1).astype("float64")
+    return pd.DataFrame({"gd90_low": low, "gd90_high": high}, index=index)
+
+
+@metrics.instrument
+def select_gd90_intervals(
+    df_players: pd.DataFrame,
+    competition: str,
+    season: str,
+    team: Optional[str] = None,
+    resamples: int = BOOTSTRAP_RESAMPLES,
+    confidence: float = BOOTSTRAP_CONFIDENCE,
+) -> pd.DataFrame:
+    def compute():
+        df = filter_competition(df_players, competition)
+        df = filter_season(df, season)
+        if team is not None:
+            df = filter_team_url(df, team)
+        return get_gd90_intervals(df, resamples, confidence)
+
+    version = loader.get_version(df_players)
+    if version is None:
+        return compute()
+    key = ("gd90_intervals", competition, season, team, resamples, confidence)
+    return goal_differences_cache.get(key, compute, version)
 
-    # gd90 = sum(goal_difference) / sum(duration) * 90
-    df_grouped["gd_total"] = (
-        df_grouped["goal_difference"] / df_grouped["duration"]
+
+@metrics.instrument
+def select_team_goal_difference(
+    df_matches: pd.DataFrame, competition: str, season: str, team: str
+) -> float:
+    def compute():
+        df = filter_competition(df_matches, competition)
+        df = filter_season(df, season)
+        return goal_difference_for_team(df, team)
+
+    version = loader.get_version(df_matches)
+    if version is None:
+        return compute()
+    df_teams = loader.get_datasets().df_teams
+    return aggregates.select_team_goal_difference(
+        df_teams, competition, season, team
     )
-    df_grouped["gd90"] = df_grouped["gd_total"] * 90
-    df_grouped["full_games"] = df_grouped["duration"] / 90
-    return df_grouped
 
 
-def get_player_performance_for_matchdays(df, player_url: str):
-    df_player = df[df["player_url"] == player_url].sort_values(
-        ["year", "matchday"]
+@metrics.instrument
+def rank_players(
+    df_aggregates: pd.DataFrame,
+    competition: str,
+    season: str,
+    column: str = "relative_gd90",
+    min_appearances: int = 5,
+    ascending: bool = False,
+) -> pd.DataFrame:
+    df_season = select_aggregates(df_aggregates, competition, season)
+    df_season = filter_appearances(df_season, min_appearances)
+    return df_season.sort_values(column, ascending=ascending).reset_index()
+
+
+def _get_window_sums(cumulative: np.ndarray, lower: np.ndarray) -> np.ndarray:
+    """Sums over (lower, i] from a cumulative sum, lower=-1 is the start."""
+    prefix = np.where(lower >= 0, cumulative[np.maximum(lower, 0)], 0)
+    return cumulative - prefix
+
+
+def _get_gd90(goal_difference: np.ndarray, duration: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(duration > 0, goal_difference / duration * 90, np.nan)
+
+
+@metrics.instrument
+def get_player_timelines(
+    df: pd.DataFrame,
+    player_urls: Iterable[str],
+    window: Optional[int] = None,
+    window_minutes: Optional[int] = None,
+) -> pd.DataFrame:
+    """Career appearances of the players in (year, matchday) order.
+
+    Adds cumulative sums, the expanding gd90 and, if a window is given, the
+    rolling gd90 over the last `window` appearances or the last
+    `window_minutes` minutes (NaN until a player has a full window).
+    """
+    player_urls = list(player_urls)
+    if loader.get_version(df) is not None:
+        appearance_store = loader.get_datasets().appearance_store
+        df_timeline = appearance_store.careers.get(player_urls)
+    else:
+        df_timeline = df[df["player_url"].isin(player_urls)].sort_values(
+            ["player_url", "year", "matchday"], kind="mergesort"
+        )
+    df_timeline = df_timeline.reset_index(drop=True)
+
+    duration = df_timeline["duration"].values.astype("int64")
+    goal_difference = df_timeline["goal_difference"].values.astype("int64")
+    cum_duration = np.cumsum(duration)
+    cum_goal_difference = np.cumsum(goal_difference)
+
+    # position of the row before the first appearance of each player
+    urls = np.asarray(df_timeline["player_url"])
+    positions = np.arange(len(df_timeline))
+    is_start = np.r_[True, urls[1:] != urls[:-1]] if len(urls) else []
+    before_start = np.maximum.accumulate(np.where(is_start, positions, 0)) - 1
+
+    duration_sum = _get_window_sums(cum_duration, before_start)
+    goal_difference_sum = _get_window_sums(cum_goal_difference, before_start)
+    df_timeline["cum_duration"] = duration_sum
+    df_timeline["cum_goal_difference"] = goal_difference_sum
+    df_timeline["expanding_gd90"] = _get_gd90(
+        goal_difference_sum, duration_sum
     )
-    goal_differences = df_player["goal_difference"].values
-    matchdays = sorted(
-        [
-            f"{year[:4]}\n{matchday:02}"
-            for year, matchday in df_player[["year", "matchday"]].values
-        ]
+
+    if window is not None:
+        lower = positions - window
+        complete = lower >= before_start
+        lower = np.maximum(lower, before_start)
+        df_timeline["rolling_gd90"] = np.where(
+            complete,
+            _get_gd90(
+                _get_window_sums(cum_goal_difference, lower),
+                _get_window_sums(cum_duration, lower),
+            ),
+            np.nan,
+        )
+
+    if window_minutes is not None:
+        # last row whose cumulative duration leaves at least the window,
+        # the leading zero stands for the row before the first one
+        lower = (
+            np.searchsorted(
+                np.r_[0, cum_duration],
+                cum_duration - window_minutes,
+                side="right",
+            )
+            - 2
+        )
+        complete = lower >= before_start
+        lower = np.maximum(lower, before_start)
+        df_timeline["rolling_minutes_gd90"] = np.where(
+            complete,
+            _get_gd90(
+                _get_window_sums(cum_goal_difference, lower),
+                _get_window_sums(cum_duration, lower),
+            ),
+            np.nan,
+        )
+
+    df_timeline["label"] = (
+        df_timeline["year"].astype(str).str[:4]
+        + "\n"
+        + df_timeline["matchday"].astype(int).astype(str).str.zfill(2)
     )
-    return matchdays, goal_differences
+    return df_timeline
+
+
+@metrics.instrument
+def get_player_performance_for_matchdays(df, player_url: str):
+    # labels and values come from the same sorted rows
+    df_player = get_player_timelines(df, [player_url])
+    return df_player["label"].tolist(), df_player["goal_difference"].values
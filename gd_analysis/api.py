@@ -0,0 +1,172 @@
+import gzip
+import hashlib
+from typing import List, Optional
+
+import flask
+import pandas as pd
+
+from . import loader, metrics
+from .aggregates import select_aggregates
+from .analysis import select_players_goal_differences
+
+"""
+Read-only JSON API on the flask server of the Dash app, for other tools.
+
+    GET /api/seasons/<competition>/<season>/players
+    GET /api/seasons/<competition>/<season>/teams
+    GET /api/teams/<competition>/<season>/<team_url>/players
+
+The players endpoints return the rows of get_players_goal_differences and take
+?min_appearances=N (players with more appearances, default 0). All endpoints
+take ?columns=a,b to return only these columns besides the keys, which are
+always returned and may be named too. Responses are a JSON list of rows.
+
+The ETag of a response is derived from the data version, API_VERSION and the
+request, so a poll with If-None-Match gets a 304 before anything is selected
+or serialized.
+Bodies are gzip compressed for clients that accept it.
+"""
+
+# format of the rows, bump it when they change for the same data
+API_VERSION = 1
+# bodies below are sent as they are, gzip would hardly shrink them
+MIN_COMPRESS_BYTES = 500
+COMPRESS_LEVEL = 6
+
+blueprint = flask.Blueprint("api", __name__, url_prefix="/api")
+
+
+class ApiError(Exception):
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+@blueprint.errorhandler(ApiError)
+def handle_api_error(error: ApiError):
+    return flask.jsonify({"error": error.message}), error.status
+
+
+def get_etag(data_version: str) -> str:
+    request = flask.request
+    key = f"{request.path}?{sorted(request.args.items(multi=True))}"
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return f"{data_version}-v{API_VERSION}-{digest}"
+
+
+def get_columns() -> Optional[List[str]]:
+    columns = flask.request.args.get("columns")
+    if not columns:
+        return None
+    return [column.strip() for column in columns.split(",") if column.strip()]
+
+
+def get_min_appearances() -> int:
+    try:
+        return int(flask.request.args.get("min_appearances", 0))
+    except ValueError:
+        raise ApiError("min_appearances must be an integer")
+
+
+def check_season(competition: str, season: str):
+    appearance_store = loader.get_datasets().appearance_store
+    if season not in appearance_store.seasons(competition):
+        raise ApiError(f"no season {competition} {season}", 404)
+
+
+def project(df: pd.DataFrame, columns: Optional[List[str]]) -> pd.DataFrame:
+    if columns is None:
+        return df
+    # the keys are the index, they are returned anyway
+    keys = [column for column in columns if column in df.index.names]
+    unknown = [
+        column
+        for column in columns
+        if column not in df.columns and column not in keys
+    ]
+    if unknown:
+        raise ApiError(f"unknown columns: {', '.join(unknown)}")
+    return df[[column for column in columns if column not in keys]]
+
+
+def respond(compute) -> flask.Response:
+    """The rows of compute() as JSON, or 304 if the client has them."""
+    request = flask.request
+    etag = get_etag(loader.get_datasets().data_version)
+    if request.if_none_match.contains_weak(etag):
+        response = flask.Response(status=304)
+    else:
+        df = compute()
+        with metrics.timer("api.to_json"):
+            body = df.reset_index().to_json(orient="records").encode()
+        response = flask.Response(body, content_type="application/json")
+        if (
+            len(body) >= MIN_COMPRESS_BYTES
+            and request.accept_encodings["gzip"]
+        ):
+            response.set_data(gzip.compress(body, COMPRESS_LEVEL))
+            response.headers["Content-Encoding"] = "gzip"
+    # weak, the gzip and the plain body are the same representation
+    response.set_etag(etag, weak=True)
+    response.headers["Vary"] = "Accept-Encoding"
+    # cached, but revalidated with the ETag on every use
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+@blueprint.route("/seasons/<competition>/<season>/players")
+@metrics.instrument
+def season_players(competition: str, season: str):
+    def compute():
+        check_season(competition, season)
+        df = select_players_goal_differences(
+            loader.get_datasets().df_players,
+            competition,
+            season,
+            min_appearances=get_min_appearances(),
+        )
+        return project(df, get_columns())
+
+    return respond(compute)
+
+
+@blueprint.route("/seasons/<competition>/<season>/teams")
+@metrics.instrument
+def season_teams(competition: str, season: str):
+    def compute():
+        check_season(competition, season)
+        df_teams = select_aggregates(
+            loader.get_datasets().df_teams, competition, season
+        )
+        return project(df_teams, get_columns())
+
+    return respond(compute)
+
+
+@blueprint.route("/teams/<competition>/<season>/<path:team>/players")
+@metrics.instrument
+def team_players(competition: str, season: str, team: str):
+    # team urls are paths themselves, e.g. /api/teams/.../teams/42/players
+    team = team if team.startswith("/") else f"/{team}"
+    team = team if team.endswith("/") else f"{team}/"
+
+    def compute():
+        check_season(competition, season)
+        appearance_store = loader.get_datasets().appearance_store
+        if team not in appearance_store.teams(competition, season):
+            raise ApiError(f"no team {team} in {competition} {season}", 404)
+        df = select_players_goal_differences(
+            loader.get_datasets().df_players,
+            competition,
+            season,
+            team,
+            get_min_appearances(),
+        )
+        return project(df, get_columns())
+
+    return respond(compute)
+
+
+def register(server):
+    server.register_blueprint(blueprint)
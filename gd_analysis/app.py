@@ -1,29 +1,21 @@
 # basic python imports
+import os
+
 import pandas as pd
 
 # dash and plotly imports
 import dash
+import flask
 import dash_table
 import dash_html_components as html
 import dash_core_components as dcc
-import plotly.graph_objects as go
-from dash.dependencies import Input, Output, State
+from dash.dependencies import Input, Output
 
 # gd_analysis module imports
-from gd_analysis import df_players, df_matches
+from gd_analysis import api, loader, metrics, warmup
 
-from gd_analysis.data import (
-    filter_competition,
-    filter_season,
-    filter_team_url,
-    filter_player_url,
-)
-from gd_analysis.visualization import (
-    scatter_players_for_season,
-    scatter_players_for_team,
-    bar_players_for_team,
-    EMPTY_LAYOUT,
-)
+from gd_analysis.datatable import filter_table, get_page, sort_table
+from gd_analysis.visualization import build_selection_context
 from gd_analysis.helpers import get_dash_dropdown_options
 
 PAGE_SIZE = 10
@@ -36,11 +28,7 @@ VISIBLE_COLUMNS = [
     "goal_difference",
     "duration",
 ]
-
-competitions = df_players["competition"].unique()
-competition_options = get_dash_dropdown_options(competitions, competitions)
-seasons = df_players["year"].unique()
-season_options = get_dash_dropdown_options(seasons, seasons)
+NUMERIC_COLUMNS = ["matchday", "goal_difference", "duration"]
 
 external_stylesheets = [
     "https://codepen.io/chriddyp/pen/bWLwgP.css",
@@ -48,297 +36,354 @@ external_stylesheets = [
 ]
 app = dash.Dash(external_stylesheets=external_stylesheets)
 server = app.server
+# /metrics, if GD_ANALYSIS_METRICS is set
+metrics.register(server)
+# read-only JSON at /api/...
+api.register(server)
+# aggregates and figures in the background, unless GD_ANALYSIS_WARMUP=0;
+# the reloader of the debug server runs this module in a watching process
+# and a serving one, only the serving one warms up
+if __name__ != "__main__" or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+    warmup.start()
 
 GRAPH_STYLE = {"width": "100%", "marginTop": "50px"}
 DROPDOWN_STYLE = {"marginBottom": "20px"}
 COLUMN_STYLE = {"marginLeft": "0px", "marginRight": "0px"}
 
-app.layout = html.Div(
-    children=[
-        html.Section(
-            className="hero has-background-black",
-            style=dict(margin=0, padding=0),
-            children=[
-                html.Div(
-                    className="hero-body",
-                    children=[
-                        html.Div(
-                            className="container has-text-white",
-                            children=[
-                                html.H1(
-                                    "Goal Difference Project",
-                                    className="title has-text-white",
-                                ),
-                                html.H1(
-                                    "Explore datasets from big 5 leagues.",
-                                    className="subtitle has-text-white",
-                                ),
-                            ],
-                        ),
-                    ],
-                )
-            ],
-        ),
-        html.Section(
-            className="section",
-            children=[
-                html.Div(
-                    className="container",
-                    children=[
-                        html.H1(
-                            "Raw data table",
-                            className="title is-2 has-text-black",
-                        ),
-                        dcc.Markdown(
-                            """
-                            **Filter table examples**
 
-                            * To find *Borussia Dortmund* in team column type either `Dort` or `="Borussia Dortmund"`.
-                            * To find *Weigl* in player column type `=Weigl`.
-                            * To get the second half of the Bundesligaa season type `>17` in matchdays column.
-                            * To find players with negative goal differences type `<0` in goal_difference column.
+def get_catalog_options():
+    # outside of a request dash only validates the layout, so the datasets
+    # are not loaded until the first page is served
+    if not flask.has_request_context():
+        return [], []
+
+    appearance_store = loader.get_datasets().appearance_store
+    competitions = appearance_store.competitions()
+    seasons = sorted(
+        {
+            season
+            for competition in competitions
+            for season in appearance_store.seasons(competition)
+        }
+    )
+    return (
+        get_dash_dropdown_options(competitions, competitions),
+        get_dash_dropdown_options(seasons, seasons),
+    )
 
-                            ---
-                            """,
-                            style={"marginBottom": "20px"},
-                        ),
-                        html.Div(
-                            dash_table.DataTable(
-                                id="datatable-raw",
-                                columns=[
-                                    {"name": column, "id": column}
-                                    for column in VISIBLE_COLUMNS
+
+def serve_layout():
+    competition_options, season_options = get_catalog_options()
+    return html.Div(
+        children=[
+            html.Section(
+                className="hero has-background-black",
+                style=dict(margin=0, padding=0),
+                children=[
+                    html.Div(
+                        className="hero-body",
+                        children=[
+                            html.Div(
+                                className="container has-text-white",
+                                children=[
+                                    html.H1(
+                                        "Goal Difference Project",
+                                        className="title has-text-white",
+                                    ),
+                                    html.H1(
+                                        "Explore datasets from big 5 leagues.",
+                                        className="subtitle has-text-white",
+                                    ),
                                 ],
-                                page_current=0,
-                                page_size=PAGE_SIZE,
-                                page_action="native",
-                                filter_action="native",
-                                sort_action="native",
-                                sort_mode="multi",
-                                style_header={
-                                    "backgroundColor": "rgb(30, 30, 30)"
-                                },
-                                style_cell={
-                                    "backgroundColor": "rgb(50, 50, 50)",
-                                    "color": "white",
-                                },
-                                style_filter={
-                                    "backgroundColor": "rgb(200, 200, 200)",
-                                },
                             ),
-                        ),
-                        # dropdown elements
-                        html.Div(
-                            className="container",
-                            style={"marginTop": "20px"},
-                            children=[
-                                html.Div(
-                                    className="columns",
-                                    children=[
-                                        # competition
-                                        html.Div(
-                                            className="column is-3",
-                                            style=COLUMN_STYLE,
-                                            children=[
-                                                html.Label(
-                                                    "Competition",
-                                                    className="has-text-weight-bold",
-                                                ),
-                                                dcc.Dropdown(
-                                                    id="dropdown-competition",
-                                                    options=competition_options,
-                                                    value="Bundesliga",
-                                                ),
-                                            ],
-                                        ),
-                                        # season
-                                        html.Div(
-                                            className="column is-3",
-                                            style=COLUMN_STYLE,
-                                            children=[
-                                                html.Label(
-                                                    "Season",
-                                                    className="has-text-weight-bold",
-                                                ),
-                                                dcc.Dropdown(
-                                                    id="dropdown-season",
-                                                    options=season_options,
-                                                    value="2018-19",
-                                                ),
-                                            ],
-                                        ),
-                                        # team
-                                        html.Div(
-                                            className="column is-3",
-                                            style=COLUMN_STYLE,
-                                            children=[
-                                                html.Label(
-                                                    "Team",
-                                                    className="has-text-weight-bold",
-                                                ),
-                                                dcc.Dropdown(
-                                                    id="dropdown-team"
-                                                ),
-                                            ],
-                                        ),
-                                        # player
-                                        html.Div(
-                                            className="column is-3",
-                                            style=COLUMN_STYLE,
-                                            children=[
-                                                html.Label(
-                                                    "Player",
-                                                    className="has-text-weight-bold",
-                                                ),
-                                                dcc.Dropdown(
-                                                    id="dropdown-player"
-                                                ),
-                                            ],
-                                        ),
+                        ],
+                    )
+                ],
+            ),
+            html.Section(
+                className="section",
+                children=[
+                    html.Div(
+                        className="container",
+                        children=[
+                            html.H1(
+                                "Raw data table",
+                                className="title is-2 has-text-black",
+                            ),
+                            dcc.Markdown(
+                                """
+                                **Filter table examples**
+
+                                * To find *Borussia Dortmund* in team column type either `Dort` or `="Borussia Dortmund"`.
+                                * To find *Weigl* in player column type `=Weigl`.
+                                * To get the second half of the Bundesligaa season type `>17` in matchdays column.
+                                * To find players with negative goal differences type `<0` in goal_difference column.
+
+                                ---
+                                """,
+                                style={"marginBottom": "20px"},
+                            ),
+                            html.Div(
+                                dash_table.DataTable(
+                                    id="datatable-raw",
+                                    columns=[
+                                        {
+                                            "name": column,
+                                            "id": column,
+                                            "type": (
+                                                "numeric"
+                                                if column in NUMERIC_COLUMNS
+                                                else "text"
+                                            ),
+                                        }
+                                        for column in VISIBLE_COLUMNS
                                     ],
+                                    page_current=0,
+                                    page_size=PAGE_SIZE,
+                                    page_action="custom",
+                                    filter_action="custom",
+                                    filter_query="",
+                                    sort_action="custom",
+                                    sort_mode="multi",
+                                    sort_by=[],
+                                    style_header={
+                                        "backgroundColor": "rgb(30, 30, 30)"
+                                    },
+                                    style_cell={
+                                        "backgroundColor": "rgb(50, 50, 50)",
+                                        "color": "white",
+                                    },
+                                    style_filter={
+                                        "backgroundColor": "rgb(200, 200, 200)",
+                                    },
                                 ),
-                            ],
-                        ),
-                        dcc.Markdown(
-                            """
-                            ---
+                            ),
+                            html.P(
+                                id="datatable-raw-count",
+                                style={"marginTop": "10px"},
+                            ),
+                            # dropdown elements
+                            html.Div(
+                                className="container",
+                                style={"marginTop": "20px"},
+                                children=[
+                                    html.Div(
+                                        className="columns",
+                                        children=[
+                                            # competition
+                                            html.Div(
+                                                className="column is-3",
+                                                style=COLUMN_STYLE,
+                                                children=[
+                                                    html.Label(
+                                                        "Competition",
+                                                        className="has-text-weight-bold",
+                                                    ),
+                                                    dcc.Dropdown(
+                                                        id="dropdown-competition",
+                                                        options=competition_options,
+                                                        value="Bundesliga",
+                                                    ),
+                                                ],
+                                            ),
+                                            # season
+                                            html.Div(
+                                                className="column is-3",
+                                                style=COLUMN_STYLE,
+                                                children=[
+                                                    html.Label(
+                                                        "Season",
+                                                        className="has-text-weight-bold",
+                                                    ),
+                                                    dcc.Dropdown(
+                                                        id="dropdown-season",
+                                                        options=season_options,
+                                                        value="2018-19",
+                                                    ),
+                                                ],
+                                            ),
+                                            # team
+                                            html.Div(
+                                                className="column is-3",
+                                                style=COLUMN_STYLE,
+                                                children=[
+                                                    html.Label(
+                                                        "Team",
+                                                        className="has-text-weight-bold",
+                                                    ),
+                                                    dcc.Dropdown(
+                                                        id="dropdown-team"
+                                                    ),
+                                                ],
+                                            ),
+                                            # player
+                                            html.Div(
+                                                className="column is-3",
+                                                style=COLUMN_STYLE,
+                                                children=[
+                                                    html.Label(
+                                                        "Player",
+                                                        className="has-text-weight-bold",
+                                                    ),
+                                                    dcc.Dropdown(
+                                                        id="dropdown-player"
+                                                    ),
+                                                ],
+                                            ),
+                                        ],
+                                    ),
+                                    dcc.Checklist(
+                                        id="checklist-error-bars",
+                                        options=[
+                                            {
+                                                "label": " Show 90% bootstrap intervals of gd90",
+                                                "value": "error_bars",
+                                            }
+                                        ],
+                                        value=[],
+                                    ),
+                                ],
+                            ),
+                            dcc.Markdown(
+                                """
+                                ---
                                                        
-                            **GD90**
+                                **GD90**
                             
-                            The `gd90` value in plots below is calculated for each player as 90 * SUM(goal difference while player is on field) / SUM(minutes played)
+                                The `gd90` value in plots below is calculated for each player as 90 * SUM(goal difference while player is on field) / SUM(minutes played)
                             
-                            """,
-                            style={"marginBottom": "20px"},
-                        ),
-                        dcc.Graph(
-                            id="graph-season-overview", style=GRAPH_STYLE
-                        ),
-                        dcc.Graph(id="graph-team-overview", style=GRAPH_STYLE),
-                        dcc.Graph(id="graph-team-bars", style=GRAPH_STYLE),
-                    ],
-                ),
-            ],
-        ),
-    ]
-)
+                                """,
+                                style={"marginBottom": "20px"},
+                            ),
+                            dcc.Graph(
+                                id="graph-season-overview", style=GRAPH_STYLE
+                            ),
+                            dcc.Graph(id="graph-team-overview", style=GRAPH_STYLE),
+                            dcc.Graph(id="graph-team-bars", style=GRAPH_STYLE),
+                        ],
+                    ),
+                ],
+            ),
+        ]
+    )
 
 
-@app.callback(
-    Output("datatable-raw", "data"),
-    [
-        Input("dropdown-competition", "value"),
-        Input("dropdown-season", "value"),
-        Input("dropdown-team", "value"),
-        Input("dropdown-player", "value"),
-    ],
-)
-def update_datatable_raw(competition, season, team, player_url):
-    df = df_players
-    if competition:
-        df = filter_competition(df, competition)
-    if season:
-        df = filter_season(df, season)
-    if team:
-        df = filter_team_url(df, team)
-    if player_url:
-        df = filter_player_url(df, player_url)
-    return df[VISIBLE_COLUMNS].to_dict("records")
+app.layout = serve_layout
+
+
+# the inputs each output depends on, the others leave it unchanged
+TABLE_INPUTS = {
+    "dropdown-competition.value",
+    "dropdown-season.value",
+    "dropdown-team.value",
+    "dropdown-player.value",
+    "datatable-raw.page_current",
+    "datatable-raw.page_size",
+    "datatable-raw.filter_query",
+    "datatable-raw.sort_by",
+}
+FIGURE_INPUTS = {
+    "dropdown-competition.value",
+    "dropdown-season.value",
+    "dropdown-team.value",
+    "checklist-error-bars.value",
+}
+# a new selection, filter or sort starts again at the first page
+PAGE_RESET_INPUTS = TABLE_INPUTS - {
+    "datatable-raw.page_current",
+    "datatable-raw.page_size",
+}
+TEAM_OPTION_INPUTS = {"dropdown-competition.value", "dropdown-season.value"}
+PLAYER_OPTION_INPUTS = TEAM_OPTION_INPUTS | {"dropdown-team.value"}
+
+
+def get_triggered():
+    """Changed inputs of the callback, None for the first call or no request."""
+    if not flask.has_request_context():
+        return None
+    triggered = {item["prop_id"] for item in dash.callback_context.triggered}
+    return None if triggered <= {"."} else triggered
 
 
 @app.callback(
-    Output("graph-season-overview", "figure"),
+    [
+        Output("datatable-raw", "data"),
+        Output("datatable-raw", "page_current"),
+        Output("datatable-raw", "page_count"),
+        Output("datatable-raw-count", "children"),
+        Output("graph-season-overview", "figure"),
+        Output("graph-team-overview", "figure"),
+        Output("graph-team-bars", "figure"),
+        Output("dropdown-team", "options"),
+        Output("dropdown-player", "options"),
+    ],
     [
         Input("dropdown-competition", "value"),
         Input("dropdown-season", "value"),
         Input("dropdown-team", "value"),
+        Input("dropdown-player", "value"),
+        Input("checklist-error-bars", "value"),
+        Input("datatable-raw", "page_current"),
+        Input("datatable-raw", "page_size"),
+        Input("datatable-raw", "filter_query"),
+        Input("datatable-raw", "sort_by"),
     ],
 )
-def show_season_scatter(competition, season, team):
-    if competition and season:
-        return scatter_players_for_season(
-            df_players,
-            df_matches,
-            competition,
-            season,
-            x_column="gd90",
-            y_column="appearances",
-            team=team,
-        )
-    else:
-        return go.Figure([], layout=EMPTY_LAYOUT)
-
-
-@app.callback(
-    Output("graph-team-overview", "figure"),
-    [Input("dropdown-team", "value")],
-    [State("dropdown-competition", "value"), State("dropdown-season", "value")],
-)
-def show_team_scatter(team, competition, season):
-    if team and competition and season:
-        return scatter_players_for_team(
-            df_players=df_players,
-            df_matches=df_matches,
-            team=team,
-            competition=competition,
-            season=season,
-        )
-    else:
-        return go.Figure([], layout=EMPTY_LAYOUT)
+@metrics.instrument
+def update_selection(
+    competition,
+    season,
+    team,
+    player_url,
+    options=None,
+    page_current=0,
+    page_size=PAGE_SIZE,
+    filter_query="",
+    sort_by=None,
+):
+    # one context per interaction, its frames are shared by all the outputs
+    context = build_selection_context(
+        competition,
+        season,
+        team,
+        player_url,
+        y_column="appearances",
+        error_bars="error_bars" in (options or []),
+    )
+    triggered = get_triggered()
 
+    def changed(inputs):
+        return triggered is None or bool(triggered & inputs)
 
-@app.callback(
-    Output("graph-team-bars", "figure"),
-    [Input("dropdown-team", "value")],
-    [State("dropdown-competition", "value"), State("dropdown-season", "value")],
-)
-def show_team_bars(team, competition, season):
-    if team and competition and season:
-        return bar_players_for_team(
-            df_players=df_players,
-            df_matches=df_matches,
-            team=team,
-            competition=competition,
-            season=season,
+    outputs = [dash.no_update] * 9
+    if changed(TABLE_INPUTS):
+        # only the current page is sent to the browser
+        df = filter_table(
+            context.df_appearances[VISIBLE_COLUMNS], filter_query
         )
-    else:
-        return go.Figure([], layout=EMPTY_LAYOUT)
-
-
-@app.callback(
-    Output("dropdown-team", "options"),
-    [Input("dropdown-season", "value"), Input("dropdown-competition", "value")],
-)
-def update_dropdown_team_options(season, competition):
-    if season and competition:
-        df = filter_competition(df_players, competition)
-        df = filter_season(df, season)
-        teams = sorted(df["team_url"].unique())
-        return get_dash_dropdown_options(teams, teams)
-
-    else:
-        return []
-
-
-@app.callback(
-    Output("dropdown-player", "options"),
-    [Input("dropdown-team", "value")],
-    [State("dropdown-competition", "value"), State("dropdown-season", "value")],
-)
-def update_dropdown_team_options(team, competition, season):
-    if season and competition and team:
-        df = filter_competition(df_players, competition)
-        df = filter_season(df, season)
-        df = filter_team_url(df, team)
-        player_urls, player_names = (
-            df[["player_url", "player_name"]]
-            .drop_duplicates()
-            .sort_values("player_name")
-            .values.transpose()
+        df = sort_table(df, sort_by)
+        if triggered is not None and triggered & PAGE_RESET_INPUTS:
+            page_current = 0
+        df_page, page_current, page_count = get_page(
+            df, page_current or 0, page_size
         )
-        return get_dash_dropdown_options(player_urls, player_names)
-
-    else:
-        return []
+        outputs[:4] = [
+            df_page.to_dict("records"),
+            page_current,
+            page_count,
+            f"{len(df)} appearances",
+        ]
+    if changed(FIGURE_INPUTS):
+        outputs[4:7] = [
+            context.figures["season"],
+            context.figures["team"],
+            context.figures["team_bars"],
+        ]
+    if changed(TEAM_OPTION_INPUTS):
+        outputs[7] = context.team_options
+    if changed(PLAYER_OPTION_INPUTS):
+        outputs[8] = context.player_options
+    return outputs
 
 
 if __name__ == "__main__":
@@ -0,0 +1,91 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import pandas as pd
+
+
+def get_size(value: Any) -> int:
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(deep=True).sum())
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """Thread safe least-recently-used cache with a memory budget in bytes.
+
+    Entries belong to a data version, a lookup with a different version
+    drops all entries before computing the value again.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.version: Optional[str] = None
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._entries:
+            key, _ = self._entries.popitem(last=False)
+            self.current_bytes -= self._sizes.pop(key)
+            self.evictions += 1
+
+    def _clear(self):
+        self._entries.clear()
+        self._sizes.clear()
+        self.current_bytes = 0
+
+    def invalidate(self, version: Optional[str] = None):
+        with self._lock:
+            self._clear()
+            self.version = version
+
+    def get(
+        self,
+        key: Hashable,
+        compute: Callable[[], Any],
+        version: Optional[str] = None,
+    ) -> Any:
+        with self._lock:
+            if version != self.version:
+                self._clear()
+                self.version = version
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+
+        # computed outside of the lock, so that other keys are not blocked
+        value = compute()
+        size = get_size(value)
+
+        with self._lock:
+            if version == self.version and size <= self.max_bytes:
+                if key in self._entries:
+                    self.current_bytes -= self._sizes[key]
+                self._entries[key] = value
+                self._sizes[key] = size
+                self.current_bytes += size
+                self._evict()
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -1,6 +1,14 @@
+import os
+import tempfile
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+import sys
+
 import pandas as pd
 
+from . import metrics, store
+
 #DATAPATH = "../gd_analysis/data"
 DATAPATH = "./data"
 
@@ -18,39 +26,161 @@ players data format consists of following columns:
     'matchday': string identifying the matchday
     'competition': string identifying the competition
     'year': string identifying the year
+
+matches data format consists of following columns:
+    'team_home_url': url identifying the home team
+    'team_away_url': url identifying the away team
+    'score_home': goals scored by the home team
+    'score_away': goals scored by the away team
+    'matchday': string identifying the matchday
+    'competition': string identifying the competition
+    'year': string identifying the year
+
+datasets are stored as parquet files partitioned by competition and season:
+    {path}/{kind}/competition={competition}/year={season}/part-*.parquet
+so that reading a single season only touches the files of that partition.
 """
 
+PARTITION_FILE = "part-0.parquet"
+
 
 def file_exists(file: str):
     file_to_exist = Path(file)
     return file_to_exist.is_file()
 
 
-def get_dataset_path(competition: str, season: str, kind: str, path=DATAPATH) -> str:
-    return f"{DATAPATH}/df_{kind}_{competition}_{season}.pkl"
-
+@contextmanager
+def write_atomically(file) -> Iterator[str]:
+    """Path of a temporary file next to file, renamed over it at the end.
 
-def read_dataset(competition: str, season: str, kind: str, path=DATAPATH) -> pd.DataFrame:
-    file = get_dataset_path(competition, season, kind, path)
-    dataset = pd.read_pickle(file)
-    return dataset
+    Other processes see either the old or the new file, never a partly
+    written one. The temporary file is removed when the block fails.
+    """
+    file = Path(file)
+    with tempfile.NamedTemporaryFile(
+        dir=file.parent, prefix=f"{file.name}.", suffix=".tmp", delete=False
+    ) as temporary:
+        pass
+    try:
+        yield temporary.name
+        os.replace(temporary.name, file)
+    except BaseException:
+        os.unlink(temporary.name)
+        raise
 
 
+def get_dataset_path(competition: str, season: str, kind: str, path=DATAPATH) -> str:
+    return f"{path}/{kind}/competition={competition}/year={season}"
+
+
+def read_partition(directory: Path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    files = sorted(directory.glob("part-*.parquet"))
+    if not files:
+        raise FileNotFoundError(f"no parquet files in {directory}")
+    return pd.concat(
+        [pd.read_parquet(file, columns=columns) for file in files],
+        ignore_index=True,
+    )
+
+
+def read_dataset(
+    competition: str,
+    season: str,
+    kind: str,
+    path=DATAPATH,
+    columns: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    directory = Path(get_dataset_path(competition, season, kind, path))
+    return read_partition(directory, columns)
+
+
+def read_datasets(
+    kind: str,
+    path=DATAPATH,
+    competitions: Optional[Iterable[str]] = None,
+    seasons: Optional[Iterable[str]] = None,
+    columns: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    # partitions are pruned by directory name before any file is opened
+    competitions = set(competitions) if competitions is not None else None
+    seasons = set(seasons) if seasons is not None else None
+    datasets = []
+    for directory in sorted(Path(path, kind).glob("competition=*/year=*")):
+        competition = directory.parent.name[len("competition="):]
+        season = directory.name[len("year="):]
+        if competitions is not None and competition not in competitions:
+            continue
+        if seasons is not None and season not in seasons:
+            continue
+        try:
+            datasets.append(read_partition(directory, columns))
+        except FileNotFoundError:
+            # e.g. created by an ingest that has not written a file yet
+            continue
+    if not datasets:
+        raise FileNotFoundError(f"no {kind} partitions found in {path}")
+    return pd.concat(datasets, ignore_index=True)
+
+
+def write_dataset(df: pd.DataFrame, kind: str, path=DATAPATH):
+    for (competition, season), df_partition in df.groupby(
+        ["competition", "year"], observed=True, sort=False
+    ):
+        directory = Path(get_dataset_path(competition, season, kind, path))
+        directory.mkdir(parents=True, exist_ok=True)
+        df_partition.to_parquet(directory / PARTITION_FILE, index=False)
+
+
+def convert_pickles(path=DATAPATH):
+    """One-shot conversion of the pickled datasets to parquet partitions."""
+    for kind in ["players", "matches"]:
+        file = Path(path, f"df_{kind}.pkl")
+        if file.is_file():
+            files = [file]
+        else:
+            files = sorted(Path(path).glob(f"df_{kind}_*_*.pkl"))
+        for file in files:
+            write_dataset(pd.read_pickle(file), kind, path)
+            print(f"converted {file}")
+
+
+@metrics.instrument
 def filter_competition(df: pd.DataFrame, competition: str):
+    df_partition = store.lookup(df, "competition", competition)
+    if df_partition is not None:
+        return df_partition
     return df.loc[df["competition"] == competition]
 
 
+@metrics.instrument
 def filter_season(df: pd.DataFrame, season: str):
+    df_partition = store.lookup(df, "year", season)
+    if df_partition is not None:
+        return df_partition
     return df.loc[df["year"] == season]
 
 
+@metrics.instrument
 def filter_team_url(df: pd.DataFrame, team: str):
+    df_partition = store.lookup(df, "team_url", team)
+    if df_partition is not None:
+        return df_partition
     return df.loc[df["team_url"] == team]
 
 
+@metrics.instrument
 def filter_player_url(df: pd.DataFrame, player_url: str):
+    df_partition = store.lookup(df, "player_url", player_url)
+    if df_partition is not None:
+        return df_partition
     return df.loc[df["player_url"] == player_url]
 
 
+@metrics.instrument
 def filter_appearances(df: pd.DataFrame, min_appearances: int):
     return df[df["appearances"] > min_appearances]
+
+
+if __name__ == "__main__":
+    # python -m gd_analysis.data [path]
+    convert_pickles(*sys.argv[1:2])
@@ -0,0 +1,144 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import metrics
+
+"""
+Server side filtering, sorting and paging for dash DataTables with
+filter_action, sort_action and page_action set to "custom".
+
+filter_query is the string built by the table, e.g.
+    {team_name} contains "Dort" && {matchday} > 17
+and is translated into vectorized pandas operations.
+"""
+
+# the first spelling of each operator is the canonical one
+OPERATORS = [
+    ["ge", ">="],
+    ["le", "<="],
+    ["lt", "<"],
+    ["gt", ">"],
+    ["ne", "!="],
+    ["eq", "="],
+    ["contains"],
+    ["datestartswith"],
+]
+OPERATOR_NAMES = {
+    operator: operator_type[0]
+    for operator_type in OPERATORS
+    for operator in operator_type
+}
+# {column} operator value, the operator is only looked for after the column,
+# so a value like "Lille OSC" is not read as the operator le
+FILTER_PART = re.compile(
+    r"^\s*\{(.+?)\}\s*(>=|<=|!=|<|>|=|[a-z]+)\s*(.*?)\s*$"
+)
+
+COMPARISONS = {
+    "eq": lambda series, value: series == value,
+    "ne": lambda series, value: series != value,
+    "lt": lambda series, value: series < value,
+    "le": lambda series, value: series <= value,
+    "gt": lambda series, value: series > value,
+    "ge": lambda series, value: series >= value,
+}
+
+
+def split_filter_part(
+    filter_part: str,
+) -> Tuple[Optional[str], Optional[str], Any]:
+    match = FILTER_PART.match(filter_part)
+    if match is None or match.group(2) not in OPERATOR_NAMES:
+        return None, None, None
+    name, operator, value_part = match.groups()
+
+    first = value_part[:1]
+    if first and first == value_part[-1] and first in "'\"`":
+        value = value_part[1:-1].replace("\\" + first, first)
+    else:
+        try:
+            value = float(value_part)
+        except ValueError:
+            value = value_part
+
+    return name, OPERATOR_NAMES[operator], value
+
+
+def _string_mask(series: pd.Series, operator: str, value: str) -> np.ndarray:
+    if hasattr(series, "cat"):
+        # match the categories once, then select the rows by their codes
+        categories = series.cat.categories.astype(str)
+        if operator == "contains":
+            matches = categories.str.contains(value, case=False, regex=False)
+        else:
+            matches = categories.str.startswith(value)
+        return np.asarray(matches)[series.cat.codes.values] & (
+            series.cat.codes.values >= 0
+        )
+    strings = series.astype(str)
+    if operator == "contains":
+        return strings.str.contains(value, case=False, regex=False).values
+    return strings.str.startswith(value).values
+
+
+@metrics.instrument
+def filter_table(
+    df: pd.DataFrame, filter_query: Optional[str]
+) -> pd.DataFrame:
+    if not filter_query:
+        return df
+
+    mask = np.ones(len(df), dtype=bool)
+    for filter_part in filter_query.split(" && "):
+        column, operator, value = split_filter_part(filter_part)
+        if column not in df.columns:
+            continue
+        series = df[column]
+        if operator in COMPARISONS:
+            if hasattr(series, "cat"):
+                if isinstance(value, float) and value.is_integer():
+                    value = int(value)
+                value = str(value)
+                if operator not in ("eq", "ne"):
+                    # categories are unordered, compare the strings
+                    series = series.astype(str)
+            try:
+                mask &= np.asarray(COMPARISONS[operator](series, value))
+            except TypeError:
+                # e.g. text compared with a numeric column, ignore the part
+                continue
+        elif operator in ("contains", "datestartswith"):
+            mask &= _string_mask(series, operator, str(value))
+    return df[mask]
+
+
+@metrics.instrument
+def sort_table(
+    df: pd.DataFrame, sort_by: Optional[List[Dict[str, str]]]
+) -> pd.DataFrame:
+    sort_by = [column for column in sort_by or [] if column["column_id"] in df]
+    if not sort_by:
+        return df
+    return df.sort_values(
+        [column["column_id"] for column in sort_by],
+        ascending=[column["direction"] == "asc" for column in sort_by],
+        kind="mergesort",
+    )
+
+
+def get_page(
+    df: pd.DataFrame, page_current: int, page_size: int
+) -> Tuple[pd.DataFrame, int, int]:
+    """Rows of the current page, the current page and the number of pages.
+
+    A page beyond the last one, e.g. after a filter, becomes the last page.
+    """
+    # the page size comes from the client
+    page_size = max(1, page_size)
+    page_count = max(1, int(np.ceil(len(df) / page_size)))
+    page_current = max(0, min(page_current, page_count - 1))
+    start = page_current * page_size
+    return df.iloc[start : start + page_size], page_current, page_count
@@ -1,6 +1,7 @@
 from typing import Dict, List
 
 
+import numpy as np
 import pandas as pd
 
 
@@ -11,6 +12,29 @@ def get_dash_dropdown_options(values: List[str], labels: List[str]) -> List[Dict
 
 
 def get_map_from_url_to_name(df: pd.DataFrame, column: str) -> Dict[str, str]:
+    urls = df[f"{column}_url"]
+    names = df[f"{column}_name"]
+    if hasattr(urls, "cat") and hasattr(names, "cat"):
+        # compact frames: deduplicate the integer keys, then look them up in
+        # the entity categories
+        df_unique = pd.DataFrame(
+            {"url": urls.cat.codes.values, "name": names.cat.codes.values}
+        ).drop_duplicates()
+        # code -1 is a missing value: rows without a url are left out, a url
+        # gets its first name and NaN only if it has none
+        df_unique = df_unique[df_unique["url"] >= 0]
+        missing = df_unique["name"].values < 0
+        df_unique = df_unique.iloc[np.argsort(missing, kind="stable")]
+        df_unique = df_unique.drop_duplicates("url")
+        return dict(
+            zip(
+                urls.cat.categories[df_unique["url"]],
+                pd.Categorical.from_codes(
+                    df_unique["name"], names.cat.categories
+                ),
+            )
+        )
+
     df_unique = (
         df[[f"{column}_url", f"{column}_name"]]
         .drop_duplicates()
@@ -0,0 +1,462 @@
+import argparse
+import hashlib
+import json
+import logging
+import time
+from concurrent.futures import (
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+from . import data
+from .loader import DATAPATH
+
+"""
+Ingestion of match report pages into the players, matches and goals datasets.
+
+Pages come from a fetcher, either HttpFetcher (the live site) or
+FixtureFetcher (a directory of saved pages, for offline runs):
+    fetcher.list_matches(competition, season, matchday) -> page ids
+    fetcher.fetch(page_id) -> html bytes
+Pages are fetched in a thread pool and parsed with lxml in a thread or
+process pool. Each matchday is hashed over its pages and only matchdays whose
+hash differs from the manifest are parsed and written, as one file per
+matchday and kind:
+    {path}/{kind}/competition={competition}/year={season}/part-md{NN}.parquet
+A partition converted from the pickles (part-0.parquet) already holds all of
+its matchdays, remove that file before ingesting the season.
+
+A match report page is expected to contain (see XPATHS):
+    .team-home a / .team-away a          team url (href) and name
+    .score                               final score, e.g. "2:1"
+    table.lineup-home / .lineup-away     a row per player who played, with
+                                         the player link and the minutes in
+                                         td.in and td.out (empty for a
+                                         starter / a player who finished)
+    table.goals                          a row per goal with td.minute,
+                                         td.side (home, away) and the scorer
+
+goals data format consists of following columns:
+    'team_home_url', 'team_away_url': the match
+    'side': side credited with the goal (home, away)
+    'minute': minute of the goal
+    'player_url': url identifying the scorer
+    'matchday', 'competition', 'year'
+"""
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("players", "matches", "goals")
+MANIFEST_FILE = "ingest_manifest.json"
+MATCH_END = 90
+
+
+def has_class(name: str) -> str:
+    """XPath predicate for an element with the class token `name`.
+
+    contains(@class, 'in') would also match "inline" or "injury".
+    """
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+XPATHS = {
+    "match_links": f"//a[{has_class('match-report')}]/@href",
+    "team_home": f"//*[{has_class('team-home')}]//a",
+    "team_away": f"//*[{has_class('team-away')}]//a",
+    "score": f"string(//*[{has_class('score')}])",
+    "lineup_home": f"//table[{has_class('lineup-home')}]//tr[.//a]",
+    "lineup_away": f"//table[{has_class('lineup-away')}]//tr[.//a]",
+    "goals": f"//table[{has_class('goals')}]//tr[.//a]",
+}
+
+
+class IngestReport(NamedTuple):
+    matchdays: int
+    written: int
+    skipped: int
+    matches: int
+    seconds: float
+
+    @property
+    def matches_per_second(self) -> float:
+        return self.matches / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (
+            f"{self.matches} matches in {self.seconds:.2f} s "
+            f"({self.matches_per_second:.1f} matches/s), "
+            f"{self.written} matchdays written, {self.skipped} unchanged"
+        )
+
+
+class FixtureFetcher:
+    """Saved pages in {root}/{competition}/{season}/{matchday:02}/*.html"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def list_matches(
+        self, competition: str, season: str, matchday: int
+    ) -> List[str]:
+        directory = self.root / competition / season / f"{matchday:02}"
+        return [str(file) for file in sorted(directory.glob("*.html"))]
+
+    def fetch(self, page_id: str) -> bytes:
+        return Path(page_id).read_bytes()
+
+
+class HttpFetcher:
+    """Pages of the live site, matchday_url links to the match reports."""
+
+    def __init__(
+        self,
+        base_url: str,
+        matchday_url: str = "{base_url}/{competition}/{season}/{matchday}/",
+        timeout: float = 30,
+        pool_size: int = 16,
+    ):
+        import requests
+
+        self.base_url = base_url.rstrip("/")
+        self.matchday_url = matchday_url
+        self.timeout = timeout
+        # one session, so that connections are reused across the threads
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def list_matches(
+        self, competition: str, season: str, matchday: int
+    ) -> List[str]:
+        from lxml import html
+
+        url = self.matchday_url.format(
+            base_url=self.base_url,
+            competition=competition,
+            season=season,
+            matchday=matchday,
+        )
+        tree = html.fromstring(self.fetch(url))
+        links = tree.xpath(XPATHS["match_links"])
+        return [
+            link if link.startswith("http") else self.base_url + link
+            for link in dict.fromkeys(links)
+        ]
+
+    def fetch(self, page_id: str) -> bytes:
+        response = self.session.get(page_id, timeout=self.timeout)
+        response.raise_for_status()
+        return response.content
+
+
+def _get_minute(row, name: str) -> Optional[int]:
+    text = row.xpath(f"string(.//td[{has_class(name)}])").strip()
+    # e.g. "45+2'" counts as 45
+    digits = text.split("+")[0].strip("' ")
+    return int(digits) if digits.isdigit() else None
+
+
+def _get_link(element) -> Tuple[str, str]:
+    return element.get("href"), element.text_content().strip()
+
+
+def parse_match(page: bytes) -> Dict:
+    """Teams, score, lineups and goals of a match report page."""
+    from lxml import html
+
+    tree = html.fromstring(page)
+    score_home, score_away = tree.xpath(XPATHS["score"]).strip().split(":")
+    match = {
+        "team_home": _get_link(tree.xpath(XPATHS["team_home"])[0]),
+        "team_away": _get_link(tree.xpath(XPATHS["team_away"])[0]),
+        "score_home": int(score_home),
+        "score_away": int(score_away),
+        "lineups": [],
+        "goals": [],
+    }
+    for side in ["home", "away"]:
+        for row in tree.xpath(XPATHS[f"lineup_{side}"]):
+            player_url, player_name = _get_link(row.xpath(".//a")[0])
+            start = _get_minute(row, "in") or 0
+            end = _get_minute(row, "out") or MATCH_END
+            match["lineups"].append(
+                (side, player_url, player_name, start, end)
+            )
+    for row in tree.xpath(XPATHS["goals"]):
+        side = row.xpath(f"string(.//td[{has_class('side')}])").strip()
+        player_url, _ = _get_link(row.xpath(".//a")[0])
+        match["goals"].append((side, _get_minute(row, "minute"), player_url))
+    return match
+
+
+def get_frames(
+    matches: List[Dict], competition: str, season: str, matchday: int
+) -> Dict[str, pd.DataFrame]:
+    """players, matches and goals frames of the parsed matches of a matchday"""
+    keys = {"matchday": matchday, "competition": competition, "year": season}
+    match_rows, player_rows, goal_rows = [], [], []
+    for number, match in enumerate(matches):
+        teams = {"home": match["team_home"], "away": match["team_away"]}
+        match_rows.append(
+            {
+                "team_home_url": teams["home"][0],
+                "team_away_url": teams["away"][0],
+                "score_home": match["score_home"],
+                "score_away": match["score_away"],
+            }
+        )
+        for side, player_url, player_name, start, end in match["lineups"]:
+            player_rows.append(
+                {
+                    "match": number,
+                    "player_url": player_url,
+                    "player_name": player_name,
+                    "side": side,
+                    "team_url": teams[side][0],
+                    "team_name": teams[side][1],
+                    "start": start,
+                    "end": end,
+                }
+            )
+        for side, minute, player_url in match["goals"]:
+            goal_rows.append(
+                {
+                    "match": number,
+                    "team_home_url": teams["home"][0],
+                    "team_away_url": teams["away"][0],
+                    "side": side,
+                    "minute": minute,
+                    "player_url": player_url,
+                }
+            )
+
+    df_players = pd.DataFrame(
+        player_rows,
+        columns=[
+            "match",
+            "player_url",
+            "player_name",
+            "side",
+            "team_url",
+            "team_name",
+            "start",
+            "end",
+        ],
+    )
+    df_goals = pd.DataFrame(
+        goal_rows,
+        columns=[
+            "match",
+            "team_home_url",
+            "team_away_url",
+            "side",
+            "minute",
+            "player_url",
+        ],
+    )
+    df_players["duration"] = df_players["end"] - df_players["start"]
+    df_players["goal_difference"] = get_goal_differences(df_players, df_goals)
+    return {
+        "players": df_players.drop(columns="match").assign(**keys),
+        "matches": pd.DataFrame(
+            match_rows,
+            columns=[
+                "team_home_url",
+                "team_away_url",
+                "score_home",
+                "score_away",
+            ],
+        ).assign(**keys),
+        "goals": df_goals.drop(columns="match").assign(**keys),
+    }
+
+
+def get_goal_differences(
+    df_players: pd.DataFrame, df_goals: pd.DataFrame
+) -> pd.Series:
+    # a goal counts for an appearance if start < minute <= end
+    df_pairs = df_players[["match", "side", "start", "end"]].reset_index()
+    df_pairs = df_pairs.merge(
+        df_goals[["match", "side", "minute"]],
+        on="match",
+        suffixes=("", "_goal"),
+    )
+    on_pitch = (df_pairs["start"] < df_pairs["minute"]) & (
+        df_pairs["minute"] <= df_pairs["end"]
+    )
+    df_pairs = df_pairs[on_pitch]
+    signs = (df_pairs["side"] == df_pairs["side_goal"]) * 2 - 1
+    goal_differences = signs.groupby(df_pairs["index"]).sum()
+    return goal_differences.reindex(df_players.index, fill_value=0).astype(
+        "int64"
+    )
+
+
+def get_manifest_path(path=DATAPATH) -> Path:
+    return Path(path, MANIFEST_FILE)
+
+
+def read_manifest(path=DATAPATH) -> Dict[str, str]:
+    file = get_manifest_path(path)
+    if not file.is_file():
+        return {}
+    return json.loads(file.read_text())
+
+
+def write_manifest(manifest: Dict[str, str], path=DATAPATH):
+    with data.write_atomically(get_manifest_path(path)) as temporary:
+        Path(temporary).write_text(
+            json.dumps(manifest, indent=1, sort_keys=True)
+        )
+
+
+def get_matchday_key(competition: str, season: str, matchday: int) -> str:
+    return f"{competition}/{season}/{matchday:02}"
+
+
+def get_pages_hash(pages: List[bytes]) -> str:
+    digest = hashlib.sha1()
+    for page in sorted(pages):
+        digest.update(hashlib.sha1(page).digest())
+    return digest.hexdigest()
+
+
+def write_matchday(
+    frames: Dict[str, pd.DataFrame],
+    competition: str,
+    season: str,
+    matchday: int,
+    path=DATAPATH,
+):
+    for kind, df in frames.items():
+        directory = Path(
+            data.get_dataset_path(competition, season, kind, path)
+        )
+        directory.mkdir(parents=True, exist_ok=True)
+        file = directory / f"part-md{matchday:02}.parquet"
+        with data.write_atomically(file) as temporary:
+            df.to_parquet(temporary, index=False)
+
+
+def get_executor(executor: str, workers: int) -> Executor:
+    if executor == "process":
+        return ProcessPoolExecutor(workers)
+    return ThreadPoolExecutor(workers)
+
+
+def ingest(
+    fetcher,
+    competition: str,
+    season: str,
+    matchdays: Iterable[int],
+    path=DATAPATH,
+    workers: int = 8,
+    executor: str = "thread",
+    force: bool = False,
+) -> IngestReport:
+    """Fetch, parse and write the matchdays that are new or have changed."""
+    started = time.perf_counter()
+    matchdays = list(matchdays)
+    manifest = read_manifest(path)
+    written = skipped = parsed = 0
+
+    with ThreadPoolExecutor(workers) as fetch_pool, get_executor(
+        executor, workers
+    ) as parse_pool:
+        page_ids = {
+            matchday: fetch_pool.submit(
+                fetcher.list_matches, competition, season, matchday
+            )
+            for matchday in matchdays
+        }
+        # all pages are requested up front, matchdays are handled in order
+        pages = {
+            matchday: [
+                fetch_pool.submit(fetcher.fetch, page_id)
+                for page_id in page_ids[matchday].result()
+            ]
+            for matchday in matchdays
+        }
+        for matchday in matchdays:
+            matchday_pages = [page.result() for page in pages[matchday]]
+            key = get_matchday_key(competition, season, matchday)
+            pages_hash = get_pages_hash(matchday_pages)
+            if not matchday_pages or (
+                not force and manifest.get(key) == pages_hash
+            ):
+                skipped += 1
+                continue
+
+            matches = list(parse_pool.map(parse_match, matchday_pages))
+            frames = get_frames(matches, competition, season, matchday)
+            write_matchday(frames, competition, season, matchday, path)
+            manifest[key] = pages_hash
+            # after every matchday, so an interrupted run keeps its progress
+            write_manifest(manifest, path)
+            written += 1
+            parsed += len(matches)
+
+    report = IngestReport(
+        len(matchdays),
+        written,
+        skipped,
+        parsed,
+        time.perf_counter() - started,
+    )
+    logger.info("ingested %s %s: %s", competition, season, report)
+    return report
+
+
+def get_matchdays(text: str) -> List[int]:
+    # e.g. "1-34" or "1,2,5"
+    matchdays = []
+    for part in text.split(","):
+        first, _, last = part.partition("-")
+        matchdays.extend(range(int(first), int(last or first) + 1))
+    return matchdays
+
+
+if __name__ == "__main__":
+    # python -m gd_analysis.ingest --fixtures pages bundesliga 2019-2020 1-34
+    parser = argparse.ArgumentParser(
+        description="Ingest match report pages into the datasets."
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--fixtures", help="directory of saved pages")
+    source.add_argument("--base-url", help="url of the live site")
+    parser.add_argument("competition")
+    parser.add_argument("season")
+    parser.add_argument("matchdays", help='e.g. "1-34" or "1,2,5"')
+    parser.add_argument("--path", default=DATAPATH)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument(
+        "--executor", choices=["thread", "process"], default="thread"
+    )
+    parser.add_argument("--force", action="store_true")
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if arguments.fixtures:
+        fetcher = FixtureFetcher(arguments.fixtures)
+    else:
+        fetcher = HttpFetcher(arguments.base_url)
+    print(
+        ingest(
+            fetcher,
+            arguments.competition,
+            arguments.season,
+            get_matchdays(arguments.matchdays),
+            arguments.path,
+            arguments.workers,
+            arguments.executor,
+            arguments.force,
+        )
+    )
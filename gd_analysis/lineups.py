@@ -0,0 +1,279 @@
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from . import loader, metrics
+from .aggregates import MATCH_MINUTES
+from .analysis import goal_differences_cache
+from .data import filter_competition, filter_season, filter_team_url
+
+"""
+Goal difference of teammate pairs and trios while they were on the pitch
+together.
+
+Within a match, the appearances of a team are numbered by their start
+minute. A lineup grows by a self-merge of the appearances of each match,
+keeping those later in that order that start before the earliest end of its
+members, so only lineups that actually shared the pitch are kept, with one
+merge per member. A merge builds every pair of appearances of a match, which
+is cheap for the few appearances of a team in a match.
+
+The goal difference of a shared interval comes from the appearances
+themselves. G(minute), the team's goal difference up to a minute, is known at
+every start and end of the match: 0 at kick off, the goal difference of a
+starter at the minute the player went off, the match total minus the goal
+difference of a substitute at the minute the player came on. The shared goal
+difference is G(earliest end) - G(latest start). Lineups whose bounds are not
+known this way (a substitute who was substituted again, with no other
+appearance at either minute) are left out.
+
+lineups data format consists of following columns, indexed by
+(team_url, player_url_1, ..., player_url_{size}) with sorted player urls:
+    'matches': matches the players shared the pitch in
+    'duration': minutes on the pitch together
+    'goal_difference': goal difference while on the pitch together
+    'gd90': goal difference per 90 minutes together
+and for pairs the gd90 of each player without the other, 'without_2_gd90'
+(player 1 on the pitch without player 2) and 'without_1_gd90'.
+"""
+
+MATCH_KEYS = ["competition", "year", "matchday", "team_url"]
+
+
+def _get_appearances(df_players: pd.DataFrame) -> pd.DataFrame:
+    df = df_players[
+        MATCH_KEYS + ["player_url", "start", "end", "goal_difference"]
+    ]
+    df = df.assign(
+        match=df.groupby(MATCH_KEYS, observed=True, sort=False).ngroup(),
+        player_url=df["player_url"].astype(str),
+        start=df["start"].astype("int64"),
+        end=df["end"].astype("int64"),
+        goal_difference=df["goal_difference"].astype("int64"),
+    )
+    df = df.sort_values(["match", "start"], kind="mergesort")
+    df = df.reset_index(drop=True)
+    df["position"] = df.groupby("match").cumcount()
+    return df
+
+
+def _lookup(
+    df_points: pd.DataFrame, match: np.ndarray, minute: np.ndarray
+) -> np.ndarray:
+    index = pd.MultiIndex.from_arrays([match, minute])
+    return df_points["cumulative"].reindex(index).values
+
+
+def get_cumulative_goal_differences(df: pd.DataFrame) -> pd.DataFrame:
+    """G(minute) at the starts and ends of every match, see module docs."""
+    match_end = df.groupby("match")["end"].transform("max").values
+    starters = df["start"].values == 0
+    finishers = df["end"].values == match_end
+
+    kick_off = pd.DataFrame(
+        {"match": np.unique(df["match"].values), "minute": 0, "cumulative": 0}
+    )
+    went_off = pd.DataFrame(
+        {
+            "match": df["match"].values[starters],
+            "minute": df["end"].values[starters],
+            "cumulative": df["goal_difference"].values[starters],
+        }
+    )
+    df_points = pd.concat([kick_off, went_off], ignore_index=True)
+    df_points = df_points.drop_duplicates(["match", "minute"])
+    df_points = df_points.set_index(["match", "minute"])
+
+    def add_points(rows, minutes, cumulative):
+        known = ~np.isnan(cumulative)
+        df_new = pd.DataFrame(
+            {"cumulative": cumulative[known].astype("int64")},
+            index=pd.MultiIndex.from_arrays(
+                [df["match"].values[rows][known], minutes[known]],
+                names=["match", "minute"],
+            ),
+        )
+        df_all = pd.concat([df_points, df_new])
+        return df_all[~df_all.index.duplicated()]
+
+    # substitutes who played to the end: G(start) = G(end) - goal difference
+    came_on = ~starters & finishers
+    total = _lookup(
+        df_points, df["match"].values[came_on], df["end"].values[came_on]
+    )
+    df_points = add_points(
+        came_on,
+        df["start"].values[came_on],
+        total - df["goal_difference"].values[came_on],
+    )
+
+    # substituted substitutes, from whichever of their minutes is known
+    in_and_out = ~starters & ~finishers
+    matches = df["match"].values[in_and_out]
+    starts = df["start"].values[in_and_out]
+    ends = df["end"].values[in_and_out]
+    goal_differences = df["goal_difference"].values[in_and_out]
+    df_points = add_points(
+        in_and_out,
+        ends,
+        _lookup(df_points, matches, starts) + goal_differences,
+    )
+    df_points = add_points(
+        in_and_out,
+        starts,
+        _lookup(df_points, matches, ends) - goal_differences,
+    )
+    return df_points.sort_index()
+
+
+def get_match_lineups(df_players: pd.DataFrame, size: int = 2) -> pd.DataFrame:
+    """Every lineup of `size` teammates that shared the pitch in a match."""
+    df = _get_appearances(df_players)
+    df_points = get_cumulative_goal_differences(df)
+
+    members = df[["match", "position", "player_url", "start", "end"]]
+    df_lineups = members.rename(
+        columns={
+            "player_url": "player_url_1",
+            "start": "latest_start",
+            "end": "earliest_end",
+        }
+    )
+    for number in range(2, size + 1):
+        df_lineups = df_lineups.merge(
+            members, on="match", suffixes=("_lineup", "")
+        )
+        # later in start order and on the pitch before the others went off
+        overlaps = (
+            df_lineups["position"].values
+            > df_lineups["position_lineup"].values
+        ) & (df_lineups["start"].values < df_lineups["earliest_end"].values)
+        df_lineups = df_lineups[overlaps]
+        df_lineups = df_lineups.assign(
+            latest_start=df_lineups["start"],
+            earliest_end=np.minimum(
+                df_lineups["earliest_end"].values, df_lineups["end"].values
+            ),
+        ).rename(columns={"player_url": f"player_url_{number}"})
+        df_lineups = df_lineups.drop(
+            columns=["position_lineup", "start", "end"]
+        )
+
+    matches = df_lineups["match"].values
+    df_lineups["duration"] = (
+        df_lineups["earliest_end"] - df_lineups["latest_start"]
+    )
+    df_lineups["goal_difference"] = _lookup(
+        df_points, matches, df_lineups["earliest_end"].values
+    ) - _lookup(df_points, matches, df_lineups["latest_start"].values)
+    df_lineups = df_lineups.dropna(subset=["goal_difference"])
+
+    # the same players in any order are the same lineup
+    columns = _get_player_columns(size)
+    df_lineups[columns] = np.sort(df_lineups[columns].values, axis=1)
+    team_urls = df.drop_duplicates("match").set_index("match")["team_url"]
+    df_lineups["team_url"] = team_urls.reindex(df_lineups["match"]).values
+    return df_lineups[
+        ["match", "team_url"] + columns + ["duration", "goal_difference"]
+    ].reset_index(drop=True)
+
+
+def _get_player_columns(size: int) -> List[str]:
+    return [f"player_url_{number}" for number in range(1, size + 1)]
+
+
+@metrics.instrument
+def get_lineups(df_players: pd.DataFrame, size: int = 2) -> pd.DataFrame:
+    """Shared minutes and goal difference of lineups over all matches.
+
+    The index holds only the lineups that shared the pitch, a sparse form of
+    the player by player matrix.
+    """
+    keys = ["team_url"] + _get_player_columns(size)
+    df_lineups = (
+        get_match_lineups(df_players, size)
+        .groupby(keys, observed=True)
+        .agg(
+            matches=("match", "size"),
+            duration=("duration", "sum"),
+            goal_difference=("goal_difference", "sum"),
+        )
+    )
+    df_lineups["goal_difference"] = df_lineups["goal_difference"].astype(
+        "int64"
+    )
+    df_lineups["gd90"] = _get_gd90(
+        df_lineups["goal_difference"], df_lineups["duration"]
+    )
+    if size == 2:
+        df_lineups = _add_without(df_players, df_lineups)
+    return df_lineups
+
+
+def _get_gd90(goal_difference: pd.Series, duration: pd.Series) -> pd.Series:
+    return (goal_difference / duration * MATCH_MINUTES).where(duration > 0)
+
+
+def _add_without(
+    df_players: pd.DataFrame, df_pairs: pd.DataFrame
+) -> pd.DataFrame:
+    df_totals = (
+        df_players.assign(player_url=df_players["player_url"].astype(str))
+        .groupby(["team_url", "player_url"], observed=True)[
+            ["duration", "goal_difference"]
+        ]
+        .sum()
+    )
+    team_urls = df_pairs.index.get_level_values("team_url")
+    for number, other in [(1, 2), (2, 1)]:
+        df_player = df_totals.reindex(
+            pd.MultiIndex.from_arrays(
+                [
+                    team_urls,
+                    df_pairs.index.get_level_values(f"player_url_{number}"),
+                ]
+            )
+        )
+        df_pairs[f"without_{other}_gd90"] = _get_gd90(
+            df_player["goal_difference"].values - df_pairs["goal_difference"],
+            df_player["duration"].values - df_pairs["duration"],
+        )
+    return df_pairs
+
+
+@metrics.instrument
+def select_lineups(
+    df_players: pd.DataFrame,
+    competition: str,
+    season: str,
+    team: Optional[str] = None,
+    size: int = 2,
+) -> pd.DataFrame:
+    def compute():
+        df = filter_competition(df_players, competition)
+        df = filter_season(df, season)
+        if team is not None:
+            df = filter_team_url(df, team)
+        return get_lineups(df, size)
+
+    version = loader.get_version(df_players)
+    if version is None:
+        return compute()
+    key = ("lineups", competition, season, team, size)
+    return goal_differences_cache.get(key, compute, version)
+
+
+@metrics.instrument
+def rank_lineups(
+    df_lineups: pd.DataFrame,
+    min_duration: int = 4 * MATCH_MINUTES,
+    n: Optional[int] = 10,
+    ascending: bool = False,
+) -> pd.DataFrame:
+    """Best (or worst, ascending) lineups by gd90 with enough shared minutes."""
+    df = df_lineups[df_lineups["duration"] >= min_duration]
+    df = df.sort_values(["gd90", "duration"], ascending=[ascending, False])
+    if n is not None:
+        df = df.head(n)
+    return df.reset_index()
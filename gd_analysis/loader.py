@@ -0,0 +1,341 @@
+import gc
+import hashlib
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import aggregates, schema
+from .data import read_datasets, write_atomically
+from .store import AppearanceStore
+
+"""
+Lazy loading of the players and matches datasets.
+
+Nothing is read at import. The first access converts the parquet (or pickle)
+datasets into compact, partitioned frames and caches them next to the raw data
+as uncompressed arrow files. Later accesses, also from other processes, memory
+map those files, so their pages are shared through the OS page cache.
+
+preload() loads everything before a server forks its workers (see
+gunicorn.conf.py), the workers then share the loaded frames copy on write.
+"""
+
+logger = logging.getLogger(__name__)
+
+DATAPATH = os.environ.get(
+    "GD_ANALYSIS_DATA", str(Path(__file__).parent / "data")
+)
+KINDS = ("players", "matches")
+# keep the aggregate table next to the raw data, so restarts do not rebuild it
+PERSIST_AGGREGATES = (
+    os.environ.get("GD_ANALYSIS_PERSIST_AGGREGATES", "1") == "1"
+)
+
+timings: Dict[str, float] = {}
+
+
+class Datasets(NamedTuple):
+    df_players: pd.DataFrame
+    df_matches: pd.DataFrame
+    appearance_store: AppearanceStore
+    df_aggregates: pd.DataFrame
+    df_teams: pd.DataFrame
+    memory_report: Optional[Dict[str, Tuple[int, int]]]
+    data_version: str
+
+
+_datasets: Optional[Datasets] = None
+_lock = threading.Lock()
+
+
+def get_arrow_path(kind: str, path=DATAPATH) -> Path:
+    return Path(path, f"df_{kind}.arrow")
+
+
+def read_arrow(kind: str, path=DATAPATH) -> pd.DataFrame:
+    from pyarrow import feather
+
+    table = feather.read_table(
+        str(get_arrow_path(kind, path)), memory_map=True
+    )
+    return table.to_pandas(split_blocks=True)
+
+
+def write_arrow(df: pd.DataFrame, kind: str, path=DATAPATH):
+    from pyarrow import feather
+
+    file = get_arrow_path(kind, path)
+    # written next to the file and renamed over it, so that another process
+    # never maps a partly written file and mapped old files stay valid
+    with write_atomically(file) as temporary:
+        # uncompressed and a single record batch, so that the file can be
+        # memory mapped and every column is a zero copy view of the pages
+        feather.write_feather(
+            df.reset_index(drop=True),
+            temporary,
+            compression="uncompressed",
+            chunksize=max(len(df), 1),
+        )
+
+
+def read_raw(path=DATAPATH) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    if Path(path, "players").is_dir():
+        df_players = read_datasets("players", path)
+        df_matches = read_datasets("matches", path)
+    else:
+        # not yet converted with `python -m gd_analysis.data`
+        df_players = pd.read_pickle(Path(path, "df_players.pkl"))
+        df_matches = pd.read_pickle(Path(path, "df_matches.pkl"))
+    return clean_players(df_players), df_matches
+
+
+def clean_players(df_players: pd.DataFrame) -> pd.DataFrame:
+    return df_players.dropna(subset=["goal_difference"])
+
+
+def get_players_files(path=DATAPATH) -> List[Path]:
+    """Raw files of the players dataset, as read by read_raw."""
+    if Path(path, "players").is_dir():
+        return sorted(Path(path).glob("players/*/*/*.parquet"))
+    return [Path(path, "df_players.pkl")]
+
+
+def get_file_stats(files, path=DATAPATH) -> Dict[str, List]:
+    """[size, mtime] of the existing files, by their path below `path`."""
+    return {
+        file.relative_to(path).as_posix(): [
+            file.stat().st_size,
+            file.stat().st_mtime,
+        ]
+        for file in map(Path, files)
+        if file.is_file()
+    }
+
+
+def get_raw_files(path=DATAPATH):
+    return [
+        file
+        for pattern in [
+            "players/*/*/*.parquet",
+            "matches/*/*/*.parquet",
+            "goals/*/*/*.parquet",
+            "*.pkl",
+        ]
+        for file in Path(path).glob(pattern)
+    ]
+
+
+def arrow_is_current(path=DATAPATH) -> bool:
+    arrow_files = [get_arrow_path(kind, path) for kind in KINDS]
+    if not all(file.is_file() for file in arrow_files):
+        return False
+    raw_mtimes = [file.stat().st_mtime for file in get_raw_files(path)]
+    arrow_mtime = min(file.stat().st_mtime for file in arrow_files)
+    return not raw_mtimes or max(raw_mtimes) <= arrow_mtime
+
+
+def get_data_version(path=DATAPATH) -> str:
+    files = get_raw_files(path) or [
+        get_arrow_path(kind, path) for kind in KINDS
+    ]
+    stats = sorted(
+        (str(file), file.stat().st_size, file.stat().st_mtime)
+        for file in files
+        if file.is_file()
+    )
+    return hashlib.sha1(repr(stats).encode()).hexdigest()[:16]
+
+
+def load_aggregates(
+    df_players: pd.DataFrame,
+    df_teams: pd.DataFrame,
+    data_version: str,
+    path=DATAPATH,
+    persist=None,
+) -> pd.DataFrame:
+    persist = PERSIST_AGGREGATES if persist is None else persist
+    df_aggregates = None
+    if persist:
+        df_aggregates = aggregates.read_aggregates(path, data_version)
+        if df_aggregates is not None:
+            return aggregates.add_team_columns(df_aggregates, df_teams)
+        sources = get_file_stats(get_players_files(path), path)
+        df_aggregates = append_aggregates(df_players, sources, path)
+
+    if df_aggregates is None:
+        df_aggregates = aggregates.get_aggregates(df_players)
+    df_aggregates = aggregates.add_team_columns(df_aggregates, df_teams)
+    if persist:
+        try:
+            aggregates.write_aggregates(
+                df_aggregates, path, data_version, sources
+            )
+        except OSError:
+            logger.warning("could not write aggregates to %s", path)
+    return df_aggregates
+
+
+def append_aggregates(
+    df_players: pd.DataFrame, sources: Dict[str, List], path=DATAPATH
+) -> Optional[pd.DataFrame]:
+    """The persisted aggregates plus the players files added since.
+
+    None if there are none, or if one of the files they sum changed or is
+    gone (e.g. a matchday ingested again), then all appearances are
+    aggregated again.
+    """
+    persisted = aggregates.read_latest_aggregates(path)
+    if persisted is None:
+        return None
+    df_persisted, persisted_sources = persisted
+    if any(
+        sources.get(file) != stats for file, stats in persisted_sources.items()
+    ):
+        return None
+
+    started = time.perf_counter()
+    running = aggregates.RunningAggregates()
+    running.add_aggregates(df_persisted)
+    added = [file for file in sources if file not in persisted_sources]
+    for file in added:
+        running.append(clean_players(pd.read_parquet(Path(path, file))))
+    # names as the loaded dataset spells them, one per player url
+    df_aggregates = aggregates.set_player_names(
+        running.get_players(), get_player_names(df_players)
+    )
+    # categorical keys, as get_aggregates groups the loaded dataset by them
+    keys = df_aggregates.index.to_frame(index=False).astype("category")
+    df_aggregates = df_aggregates.set_axis(
+        pd.MultiIndex.from_frame(keys), axis=0
+    ).sort_index()
+    logger.info(
+        "appended %d players files to the aggregates in %.1f ms",
+        len(added),
+        (time.perf_counter() - started) * 1000,
+    )
+    return df_aggregates
+
+
+def get_player_names(df_players: pd.DataFrame) -> pd.Series:
+    """player_name of every player_url, indexed by the url."""
+    urls, names = df_players["player_url"], df_players["player_name"]
+    if not (hasattr(urls, "cat") and hasattr(names, "cat")):
+        df_names = df_players.dropna(subset=["player_url", "player_name"])
+        df_names = df_names.drop_duplicates("player_url")
+        return pd.Series(
+            df_names["player_name"].astype(str).values,
+            index=df_names["player_url"].astype(str).values,
+        )
+    # the name is a function of the url, one scatter instead of a groupby
+    # code -1 is a missing value, rows without a url or a name are left out
+    url_codes, codes = urls.cat.codes.values, names.cat.codes.values
+    rows = (url_codes >= 0) & (codes >= 0)
+    name_codes = np.full(len(urls.cat.categories), -1)
+    name_codes[url_codes[rows]] = codes[rows]
+    known = name_codes >= 0
+    return pd.Series(
+        np.asarray(names.cat.categories.astype(str))[name_codes[known]],
+        index=np.asarray(urls.cat.categories.astype(str))[known],
+    )
+
+
+def get_datasets_for(
+    df_players: pd.DataFrame,
+    df_matches: pd.DataFrame,
+    appearance_store: AppearanceStore,
+    memory_report: Optional[Dict[str, Tuple[int, int]]],
+    data_version: str,
+    path=DATAPATH,
+) -> Datasets:
+    df_teams = aggregates.get_team_goal_differences(df_matches)
+    return Datasets(
+        df_players,
+        df_matches,
+        appearance_store,
+        load_aggregates(df_players, df_teams, data_version, path),
+        df_teams,
+        memory_report,
+        data_version,
+    )
+
+
+def load(path=DATAPATH) -> Datasets:
+    data_version = get_data_version(path)
+    if arrow_is_current(path):
+        df_players, df_matches = [read_arrow(kind, path) for kind in KINDS]
+        appearance_store = AppearanceStore(df_players, df_matches)
+        return get_datasets_for(
+            df_players, df_matches, appearance_store, None, data_version, path
+        )
+
+    df_players, df_matches = read_raw(path)
+    # integer keys and compact dtypes instead of repeated strings
+    df_players, df_matches, memory_report = schema.load(df_players, df_matches)
+    # partition once, so that filtering is a slice lookup
+    appearance_store = AppearanceStore(df_players, df_matches)
+    try:
+        write_arrow(appearance_store.df_players, "players", path)
+        write_arrow(appearance_store.df_matches, "matches", path)
+    except OSError:
+        logger.warning("could not write arrow files to %s", path)
+    return get_datasets_for(
+        appearance_store.df_players,
+        appearance_store.df_matches,
+        appearance_store,
+        memory_report,
+        data_version,
+        path,
+    )
+
+
+def get_datasets() -> Datasets:
+    global _datasets
+    if _datasets is None:
+        with _lock:
+            if _datasets is None:
+                started = time.perf_counter()
+                _datasets = load()
+                timings["first_query"] = time.perf_counter() - started
+                logger.info(startup_report())
+    return _datasets
+
+
+def preload() -> Datasets:
+    """Load in a server process that is about to fork its workers."""
+    datasets = get_datasets()
+    # keep the collector from writing to (and so copying) the shared pages
+    gc.collect()
+    gc.freeze()
+    return datasets
+
+
+def startup_report() -> str:
+    return ", ".join(
+        f"{stage}: {seconds * 1000:.1f} ms"
+        for stage, seconds in timings.items()
+    )
+
+
+def reload():
+    """Drop the loaded datasets, the next access loads the current files."""
+    global _datasets
+    with _lock:
+        if _datasets is not None:
+            _datasets.appearance_store.detach()
+        _datasets = None
+
+
+def get_version(df: pd.DataFrame) -> Optional[str]:
+    """Data version of a loaded dataset frame, None for any other frame."""
+    datasets = _datasets
+    if datasets is None:
+        return None
+    if df is datasets.df_players or df is datasets.df_matches:
+        return datasets.data_version
+    return None
@@ -0,0 +1,260 @@
+import functools
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+"""
+Opt-in timings of the hot path, exposed in the Prometheus text format.
+
+GD_ANALYSIS_METRICS=1 times every instrumented function and counts the rows
+of the frame it was called with, GD_ANALYSIS_METRICS=memory also traces the
+peak memory of each call with tracemalloc (which slows all allocations down
+while it runs). The traced peak is process wide and every outermost call
+resets it, so the peaks are only meaningful while one thread runs
+instrumented calls, e.g. in the benchmarks. Unset, `instrument` returns the function itself and `timer`
+a shared no-op context, so there is no cost.
+
+register(server) adds a /metrics route to the flask server.
+"""
+
+MODE = os.environ.get("GD_ANALYSIS_METRICS", "")
+ENABLED = MODE in ("1", "memory")
+TRACE_MEMORY = MODE == "memory"
+
+# upper bounds of the duration histogram in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Metric:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.seconds = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        # None until an outermost call was traced
+        self.peak_bytes: Optional[int] = None
+
+    def observe(
+        self,
+        seconds: float,
+        rows: int,
+        peak_bytes: Optional[int],
+        error: bool,
+    ):
+        self.calls += 1
+        self.errors += error
+        self.rows += rows
+        self.seconds += seconds
+        for position, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[position] += 1
+                break
+        if peak_bytes is not None:
+            self.peak_bytes = max(self.peak_bytes or 0, peak_bytes)
+
+
+_metrics: Dict[str, Metric] = {}
+_lock = threading.Lock()
+
+
+def observe(
+    name: str,
+    seconds: float,
+    rows: int = 0,
+    peak_bytes: Optional[int] = None,
+    error=False,
+):
+    with _lock:
+        metric = _metrics.get(name)
+        if metric is None:
+            metric = _metrics[name] = Metric()
+        metric.observe(seconds, rows, peak_bytes, error)
+
+
+def get_rows(args) -> int:
+    for arg in args:
+        if isinstance(arg, (pd.DataFrame, pd.Series)):
+            return len(arg)
+    return 0
+
+
+# instrumented calls of the thread in progress, only the outermost one resets
+# and reads the peak, a nested reset would hide the peak of its caller
+_tracing = threading.local()
+
+
+def _start_tracing() -> Optional[int]:
+    depth = getattr(_tracing, "depth", 0)
+    _tracing.depth = depth + 1
+    if depth:
+        return None
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    # process wide: another thread's call resets it too, and the peak of this
+    # call then misses what was allocated before, see the module docs
+    tracemalloc.reset_peak()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def _get_peak(started_bytes: Optional[int]) -> Optional[int]:
+    _tracing.depth -= 1
+    if started_bytes is None:
+        return None
+    return max(0, tracemalloc.get_traced_memory()[1] - started_bytes)
+
+
+def instrument(function: Optional[Callable] = None, name: str = None):
+    """Record calls, duration, rows and peak memory of the function."""
+    if function is None:
+        return functools.partial(instrument, name=name)
+    if not ENABLED:
+        return function
+
+    name = name or (
+        f"{function.__module__.rsplit('.', 1)[-1]}.{function.__name__}"
+    )
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        started_bytes = _start_tracing() if TRACE_MEMORY else None
+        started = time.perf_counter()
+        error = True
+        try:
+            result = function(*args, **kwargs)
+            error = False
+            return result
+        finally:
+            observe(
+                name,
+                time.perf_counter() - started,
+                get_rows(args),
+                _get_peak(started_bytes) if TRACE_MEMORY else None,
+                error,
+            )
+
+    return wrapper
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_null_timer = _NullTimer()
+
+
+def timer(name: str):
+    """Context manager recording a block like an instrumented call."""
+    if not ENABLED:
+        return _null_timer
+    return _timed(name)
+
+
+@contextmanager
+def _timed(name: str):
+    started = time.perf_counter()
+    error = True
+    try:
+        yield
+        error = False
+    finally:
+        observe(name, time.perf_counter() - started, error=error)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        metrics = {
+            name: (
+                metric.calls,
+                metric.errors,
+                metric.rows,
+                metric.seconds,
+                list(metric.buckets),
+                metric.peak_bytes,
+            )
+            for name, metric in sorted(_metrics.items())
+        }
+
+    lines: List[str] = []
+
+    def family(metric_name: str, metric_type: str, help_text: str):
+        lines.append(f"# HELP {metric_name} {help_text}")
+        lines.append(f"# TYPE {metric_name} {metric_type}")
+
+    family("gd_analysis_calls_total", "counter", "Calls of the function.")
+    for name, (calls, *_) in metrics.items():
+        lines.append(f'gd_analysis_calls_total{{function="{name}"}} {calls}')
+    family("gd_analysis_errors_total", "counter", "Calls that raised.")
+    for name, (_, errors, *_) in metrics.items():
+        lines.append(f'gd_analysis_errors_total{{function="{name}"}} {errors}')
+    family("gd_analysis_rows_total", "counter", "Rows of the input frames.")
+    for name, (_, _, rows, *_) in metrics.items():
+        lines.append(f'gd_analysis_rows_total{{function="{name}"}} {rows}')
+
+    family(
+        "gd_analysis_duration_seconds", "histogram", "Duration of the calls."
+    )
+    for name, (calls, _, _, seconds, buckets, _) in metrics.items():
+        cumulative = 0
+        for bound, count in zip(BUCKETS, buckets):
+            cumulative += count
+            lines.append(
+                "gd_analysis_duration_seconds_bucket"
+                f'{{function="{name}",le="{bound}"}} {cumulative}'
+            )
+        lines.append(
+            "gd_analysis_duration_seconds_bucket"
+            f'{{function="{name}",le="+Inf"}} {calls}'
+        )
+        lines.append(
+            f'gd_analysis_duration_seconds_sum{{function="{name}"}} {seconds}'
+        )
+        lines.append(
+            f'gd_analysis_duration_seconds_count{{function="{name}"}} {calls}'
+        )
+
+    if TRACE_MEMORY:
+        family(
+            "gd_analysis_peak_memory_bytes",
+            "gauge",
+            "Largest peak of traced memory during a call.",
+        )
+        for name, (*_, peak_bytes) in metrics.items():
+            if peak_bytes is None:
+                # only called within other instrumented calls
+                continue
+            lines.append(
+                f'gd_analysis_peak_memory_bytes{{function="{name}"}} '
+                f"{peak_bytes}"
+            )
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        _metrics.clear()
+
+
+def register(server, path: str = "/metrics"):
+    """Serve the metrics from the flask server, only if they are enabled."""
+    if not ENABLED:
+        return
+
+    import flask
+
+    def metrics():
+        return flask.Response(
+            render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+        )
+
+    server.add_url_rule(path, "gd_analysis_metrics", metrics)
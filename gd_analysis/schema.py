@@ -0,0 +1,251 @@
+import logging
+from typing import Dict, NamedTuple, Tuple
+
+import numpy as np
+import pandas as pd
+
+"""
+Normalized representation of the players and matches datasets.
+
+entity tables (index is the integer surrogate key):
+    players: player_url, player_name
+    teams: team_url, team_name
+    competitions: competition
+    seasons: year
+
+fact tables:
+    appearances: player_id, team_id, competition_id, season_id, side, start,
+        end, duration, goal_difference, matchday
+    matches: competition_id, season_id, team_home_id, team_away_id,
+        score_home, score_away, matchday
+
+The denormalized frames returned by to_frames keep the original column names,
+but every string column is a categorical whose codes are the surrogate keys,
+so the filters and the analysis functions work on them unchanged.
+"""
+
+logger = logging.getLogger(__name__)
+
+KEY_DTYPE = "int32"
+NUMERIC_DTYPES = {
+    "start": "int16",
+    "end": "int16",
+    "duration": "int16",
+    "goal_difference": "int8",
+    "matchday": "int8",
+    "score_home": "int8",
+    "score_away": "int8",
+}
+
+MATCH_COLUMNS = ("competition", "year", "team_home_url", "team_away_url")
+MATCH_KEY_COLUMNS = (
+    "competition_id",
+    "season_id",
+    "team_home_id",
+    "team_away_id",
+)
+
+
+class Schema(NamedTuple):
+    players: pd.DataFrame
+    teams: pd.DataFrame
+    competitions: pd.DataFrame
+    seasons: pd.DataFrame
+    appearances: pd.DataFrame
+    matches: pd.DataFrame
+
+
+def memory_usage(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(deep=True).sum())
+
+
+def _get_entity_table(
+    urls: pd.Series, names: pd.Series, column: str
+) -> pd.DataFrame:
+    df_entity = (
+        pd.DataFrame({f"{column}_url": urls, f"{column}_name": names})
+        .drop_duplicates(f"{column}_url")
+        .sort_values(f"{column}_url")
+        .reset_index(drop=True)
+    )
+    df_entity.index.name = f"{column}_id"
+    return df_entity
+
+
+def _get_keys(values: pd.Series, categories: pd.Series) -> np.ndarray:
+    keys = pd.Index(categories).get_indexer(values)
+    return keys.astype(KEY_DTYPE)
+
+
+def _get_numeric_columns(df: pd.DataFrame) -> Dict[str, pd.Series]:
+    return {
+        column: df[column].astype(dtype)
+        for column, dtype in NUMERIC_DTYPES.items()
+        if column in df.columns
+    }
+
+
+def _get_other_columns(
+    df: pd.DataFrame, normalized_columns
+) -> Dict[str, pd.Series]:
+    return {
+        column: (
+            df[column].astype("category")
+            if df[column].dtype == object
+            else df[column]
+        )
+        for column in df.columns
+        if column not in normalized_columns and column not in NUMERIC_DTYPES
+    }
+
+
+def normalize(df_players: pd.DataFrame, df_matches: pd.DataFrame) -> Schema:
+    players = _get_entity_table(
+        df_players["player_url"], df_players["player_name"], "player"
+    )
+
+    team_urls = pd.concat(
+        [
+            df_players["team_url"],
+            df_matches["team_home_url"],
+            df_matches["team_away_url"],
+        ]
+    )
+    team_names = pd.concat(
+        [
+            df_players["team_name"],
+            df_matches.get("team_home_name", df_matches["team_home_url"]),
+            df_matches.get("team_away_name", df_matches["team_away_url"]),
+        ]
+    )
+    teams = _get_entity_table(team_urls, team_names, "team")
+
+    competitions = pd.DataFrame(
+        {"competition": sorted(df_players["competition"].unique())}
+    )
+    competitions.index.name = "competition_id"
+    seasons = pd.DataFrame({"year": sorted(df_players["year"].unique())})
+    seasons.index.name = "season_id"
+
+    appearances = pd.DataFrame(
+        {
+            "player_id": _get_keys(
+                df_players["player_url"], players["player_url"]
+            ),
+            "team_id": _get_keys(df_players["team_url"], teams["team_url"]),
+            "competition_id": _get_keys(
+                df_players["competition"], competitions["competition"]
+            ),
+            "season_id": _get_keys(df_players["year"], seasons["year"]),
+            "side": df_players["side"].astype("category"),
+            **_get_numeric_columns(df_players),
+        },
+        index=df_players.index,
+    )
+
+    matches = pd.DataFrame(
+        {
+            "competition_id": _get_keys(
+                df_matches["competition"], competitions["competition"]
+            ),
+            "season_id": _get_keys(df_matches["year"], seasons["year"]),
+            "team_home_id": _get_keys(
+                df_matches["team_home_url"], teams["team_url"]
+            ),
+            "team_away_id": _get_keys(
+                df_matches["team_away_url"], teams["team_url"]
+            ),
+            **_get_numeric_columns(df_matches),
+            **_get_other_columns(df_matches, MATCH_COLUMNS),
+        },
+        index=df_matches.index,
+    )
+
+    return Schema(players, teams, competitions, seasons, appearances, matches)
+
+
+def _get_categorical(
+    keys: np.ndarray, categories: pd.Series
+) -> pd.Categorical:
+    return pd.Categorical.from_codes(keys, categories=categories.values)
+
+
+def _get_name_categorical(
+    keys: np.ndarray, names: pd.Series
+) -> pd.Categorical:
+    # names are not unique across entities, so they get their own categories
+    name_codes, unique_names = pd.factorize(names, sort=True)
+    return pd.Categorical.from_codes(name_codes[keys], categories=unique_names)
+
+
+def to_frames(schema: Schema) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    appearances = schema.appearances
+    df_players = pd.DataFrame(
+        {
+            "player_url": _get_categorical(
+                appearances["player_id"], schema.players["player_url"]
+            ),
+            "player_name": _get_name_categorical(
+                appearances["player_id"].values, schema.players["player_name"]
+            ),
+            "side": appearances["side"],
+            "team_url": _get_categorical(
+                appearances["team_id"], schema.teams["team_url"]
+            ),
+            "team_name": _get_name_categorical(
+                appearances["team_id"].values, schema.teams["team_name"]
+            ),
+            **_get_numeric_columns(appearances),
+            "competition": _get_categorical(
+                appearances["competition_id"],
+                schema.competitions["competition"],
+            ),
+            "year": _get_categorical(
+                appearances["season_id"], schema.seasons["year"]
+            ),
+        },
+        index=appearances.index,
+    )
+
+    matches = schema.matches
+    df_matches = pd.DataFrame(
+        {
+            "competition": _get_categorical(
+                matches["competition_id"], schema.competitions["competition"]
+            ),
+            "year": _get_categorical(
+                matches["season_id"], schema.seasons["year"]
+            ),
+            "team_home_url": _get_categorical(
+                matches["team_home_id"], schema.teams["team_url"]
+            ),
+            "team_away_url": _get_categorical(
+                matches["team_away_id"], schema.teams["team_url"]
+            ),
+            **_get_numeric_columns(matches),
+            **_get_other_columns(matches, MATCH_KEY_COLUMNS),
+        },
+        index=matches.index,
+    )
+    return df_players, df_matches
+
+
+def load(
+    df_players: pd.DataFrame, df_matches: pd.DataFrame
+) -> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, Tuple[int, int]]]:
+    """Compact both datasets and report their memory before and after."""
+    compact_players, compact_matches = to_frames(
+        normalize(df_players, df_matches)
+    )
+    report = {
+        "players": (memory_usage(df_players), memory_usage(compact_players)),
+        "matches": (memory_usage(df_matches), memory_usage(compact_matches)),
+    }
+    for kind, (before, after) in report.items():
+        logger.info(
+            "df_%s memory: %.1f MB -> %.1f MB",
+            kind,
+            before / 2**20,
+            after / 2**20,
+        )
+    return compact_players, compact_matches, report
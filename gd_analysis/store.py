@@ -0,0 +1,170 @@
+import threading
+import weakref
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+"""
+An AppearanceStore sorts a dataset once by its partition levels, so that every
+(competition, season, team, player) selection is a contiguous block of rows.
+Selections are then positional slices instead of boolean-mask scans.
+
+Frames handed out by a store carry their partition and key in df.attrs, so
+the filter functions in gd_analysis.data can recognise them and continue the
+lookup one level deeper instead of scanning. pandas copies attrs to frames
+derived from them, so a lookup also checks that the frame is the one the
+partition handed out.
+"""
+
+PLAYER_LEVELS = ("competition", "year", "team_url", "player_url")
+MATCH_LEVELS = ("competition", "year")
+CAREER_LEVELS = ("player_url", "year", "matchday")
+
+PARTITION_ATTR = "gd_analysis.partition"
+
+
+class Partition:
+    def __init__(self, df: pd.DataFrame, levels: Sequence[str]):
+        self.levels = tuple(levels)
+        if pd.MultiIndex.from_frame(
+            df[list(self.levels)]
+        ).is_monotonic_increasing:
+            # already partitioned, e.g. memory mapped, avoid the copy
+            self.df = df
+        else:
+            self.df = df.sort_values(list(self.levels), kind="mergesort")
+        self._bounds = self._get_bounds()
+        self._children: Dict[Tuple[str, ...], List[str]] = {}
+        for key in self._bounds:
+            if key:
+                self._children.setdefault(key[:-1], []).append(key[-1])
+        for children in self._children.values():
+            children.sort()
+        self._frames: Dict[Tuple[str, ...], pd.DataFrame] = {}
+        self._register((), self.df)
+
+    def _get_bounds(self) -> Dict[Tuple[str, ...], Tuple[int, int]]:
+        bounds = {(): (0, len(self.df))}
+        values = self.df[list(self.levels)].values
+        for depth in range(1, len(self.levels) + 1):
+            keys = values[:, :depth]
+            changed = (keys[1:] != keys[:-1]).any(axis=1)
+            starts = np.flatnonzero(np.r_[True, changed]) if len(keys) else []
+            stops = np.r_[starts[1:], len(keys)] if len(keys) else []
+            for start, stop in zip(starts, stops):
+                bounds[tuple(keys[start])] = (int(start), int(stop))
+        return bounds
+
+    def _register(self, key: Tuple[str, ...], df: pd.DataFrame):
+        self._frames[key] = df
+        # a weak reference, attrs are deep copied with derived frames
+        df.attrs[PARTITION_ATTR] = (weakref.ref(self), key)
+
+    def detach(self):
+        self._frames = {}
+
+    def keys(self, prefix: Tuple[str, ...] = ()) -> List[str]:
+        return list(self._children.get(prefix, []))
+
+    def get(self, *key: str) -> pd.DataFrame:
+        if key in self._frames:
+            return self._frames[key]
+        if key not in self._bounds:
+            # keys come from the client, only the known ones are kept
+            return self.df.iloc[:0]
+        start, stop = self._bounds[key]
+        df = self.df.iloc[start:stop]
+        self._register(key, df)
+        return df
+
+
+class CareerIndex:
+    """Appearances ordered by (player_url, year, matchday), a block per player."""
+
+    def __init__(self, df_players: pd.DataFrame):
+        self.df = df_players.sort_values(list(CAREER_LEVELS), kind="mergesort")
+        urls = np.asarray(self.df["player_url"])
+        changed = urls[1:] != urls[:-1]
+        starts = np.flatnonzero(np.r_[True, changed]) if len(urls) else []
+        stops = np.r_[starts[1:], len(urls)] if len(urls) else []
+        self._bounds = {
+            urls[start]: (int(start), int(stop))
+            for start, stop in zip(starts, stops)
+        }
+
+    def get(self, player_urls: Iterable[str]) -> pd.DataFrame:
+        bounds = [self._bounds.get(url, (0, 0)) for url in player_urls]
+        positions = (
+            np.concatenate([np.arange(start, stop) for start, stop in bounds])
+            if bounds
+            else np.array([], dtype=int)
+        )
+        return self.df.iloc[positions]
+
+
+class AppearanceStore:
+    def __init__(self, df_players: pd.DataFrame, df_matches: pd.DataFrame):
+        self.players = Partition(df_players, PLAYER_LEVELS)
+        self.matches = Partition(df_matches, MATCH_LEVELS)
+        self._careers: Optional[CareerIndex] = None
+        self._lock = threading.Lock()
+
+    @property
+    def careers(self) -> CareerIndex:
+        # built on first use, most requests never need it
+        if self._careers is None:
+            with self._lock:
+                if self._careers is None:
+                    self._careers = CareerIndex(self.df_players)
+        return self._careers
+
+    @property
+    def df_players(self) -> pd.DataFrame:
+        return self.players.df
+
+    @property
+    def df_matches(self) -> pd.DataFrame:
+        return self.matches.df
+
+    def detach(self):
+        self.players.detach()
+        self.matches.detach()
+
+    # catalog used by the dropdowns
+    def competitions(self) -> List[str]:
+        return self.players.keys()
+
+    def seasons(self, competition: str) -> List[str]:
+        return self.players.keys((competition,))
+
+    def teams(self, competition: str, season: str) -> List[str]:
+        return self.players.keys((competition, season))
+
+    def players_for_team(
+        self, competition: str, season: str, team: str
+    ) -> List[Tuple[str, str]]:
+        df = self.players.get(competition, season, team)
+        df_unique = (
+            df[["player_url", "player_name"]]
+            .drop_duplicates("player_url")
+            .sort_values("player_name")
+        )
+        return list(zip(df_unique["player_url"], df_unique["player_name"]))
+
+
+def lookup(
+    df: pd.DataFrame, column: str, value: str
+) -> Optional[pd.DataFrame]:
+    """Slice a store-backed frame one level deeper, None if not possible."""
+    entry = df.attrs.get(PARTITION_ATTR)
+    if entry is None:
+        return None
+    reference, key = entry
+    partition = reference()
+    if partition is None or partition._frames.get(key) is not df:
+        return None
+    depth = len(key)
+    if depth >= len(partition.levels) or partition.levels[depth] != column:
+        return None
+    return partition.get(*key, value)
@@ -1,15 +1,184 @@
 # gd_analysis module imports
-from typing import Dict
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
 
 import streamlit as st
 
-from gd_analysis import df_players, df_matches
-from gd_analysis import data, helpers, visualization
+from gd_analysis import (
+    analysis,
+    data,
+    helpers,
+    loader,
+    visualization,
+    warmup,
+)
 
+# show the time spent in each stage of a rerun in the sidebar
+DEBUG = os.environ.get("GD_ANALYSIS_DEBUG") == "1"
 
-def main():
+VISIBLE_COLUMNS = [
+    "competition",
+    "year",
+    "matchday",
+    "team_name",
+    "player_name",
+    "goal_difference",
+    "duration",
+]
+RANKING_COLUMNS = [
+    "player_name",
+    "team_url",
+    "appearances",
+    "gd90",
+    "relative_gd90",
+    "off_gd90",
+    "on_minus_off_gd90",
+]
+# ranking column -> what the ranking shows
+RANKING_ORDERS = {
+    "relative_gd90": "gd90 relative to their team",
+    "on_minus_off_gd90": "gd90 on minus off the pitch",
+}
+
+# selections kept by each per-selection stage, the least recently used one is
+# evicted beyond that, so memory does not grow with every selection visited
+SELECTION_CACHE_ENTRIES = 64
+
+# Every widget interaction reruns main top to bottom. The stages below are
+# cached by their inputs (and the data version), so a rerun only recomputes
+# what the changed widget actually affects.
+
+
+@contextmanager
+def timed(timings: Dict[str, float], stage: str):
+    started = time.perf_counter()
+    yield
+    timings[stage] = time.perf_counter() - started
+
+
+@st.cache_resource
+def get_mappings(data_version: str) -> Tuple[Dict[str, str], Dict[str, str]]:
+    df_players = loader.get_datasets().df_players
     player_url_to_name = helpers.get_map_from_url_to_name(df_players, "player")
     team_url_to_name = helpers.get_map_from_url_to_name(df_players, "team")
+    return player_url_to_name, team_url_to_name
+
+
+@st.cache_resource
+def get_catalog(data_version: str) -> Dict[str, Dict[str, List[str]]]:
+    appearance_store = loader.get_datasets().appearance_store
+    return {
+        competition: {
+            season: appearance_store.teams(competition, season)
+            for season in appearance_store.seasons(competition)
+        }
+        for competition in appearance_store.competitions()
+    }
+
+
+@st.cache_resource(max_entries=SELECTION_CACHE_ENTRIES)
+def get_players(
+    data_version: str, competition: str, season: str, team: str
+) -> List[str]:
+    appearance_store = loader.get_datasets().appearance_store
+    return [
+        player_url
+        for player_url, _ in appearance_store.players_for_team(
+            competition, season, team
+        )
+    ]
+
+
+@st.cache_data(max_entries=SELECTION_CACHE_ENTRIES)
+def get_ranking(
+    data_version: str,
+    competition: str,
+    season: str,
+    min_appearances: int,
+    column: str = "relative_gd90",
+):
+    df_ranking = analysis.rank_players(
+        loader.get_datasets().df_aggregates,
+        competition,
+        season,
+        column,
+        min_appearances=min_appearances,
+    )
+    return df_ranking[RANKING_COLUMNS]
+
+
+# the figures are also persisted by visualization.figure_cache, so they
+# survive restarts of the streamlit server
+@st.cache_resource(max_entries=SELECTION_CACHE_ENTRIES)
+def get_season_figure(
+    data_version: str,
+    competition: str,
+    season: str,
+    team: str,
+    min_appearances: int,
+    error_bars: bool = False,
+):
+    return visualization.get_selection_figure(
+        "season",
+        competition,
+        season,
+        team,
+        min_appearances,
+        error_bars=error_bars,
+    )
+
+
+@st.cache_resource(max_entries=SELECTION_CACHE_ENTRIES)
+def get_team_figure(
+    data_version: str,
+    competition: str,
+    season: str,
+    team: str,
+    min_appearances: int,
+    error_bars: bool = False,
+):
+    return visualization.get_selection_figure(
+        "team",
+        competition,
+        season,
+        team,
+        min_appearances,
+        error_bars=error_bars,
+    )
+
+
+@st.cache_resource(max_entries=SELECTION_CACHE_ENTRIES)
+def get_team_bar_figure(
+    data_version: str,
+    competition: str,
+    season: str,
+    team: str,
+    min_appearances: int,
+    error_bars: bool = False,
+):
+    return visualization.get_selection_figure(
+        "team_bars",
+        competition,
+        season,
+        team,
+        min_appearances,
+        error_bars=error_bars,
+    )
+
+
+def main():
+    timings: Dict[str, float] = {}
+    datasets = loader.get_datasets()
+    data_version = datasets.data_version
+    # once per server process, reruns find it running
+    warmup.start()
+
+    with timed(timings, "mappings"):
+        player_url_to_name, team_url_to_name = get_mappings(data_version)
+    with timed(timings, "catalog"):
+        catalog = get_catalog(data_version)
 
     st.title("Goal Difference Project")
     st.write("Explore datasets from big 5 leagues.")
@@ -30,29 +199,16 @@ def main():
     # The `gd90` value in plots below is calculated for each player as 90 * SUM(goal difference while player is on field) / SUM(minutes played)
     st.header("Analysis for selected season, player and team")
 
-    VISIBLE_COLUMNS = [
-        "competition",
-        "year",
-        "matchday",
-        "team_name",
-        "player_name",
-        "goal_difference",
-        "duration",
-    ]
-
-    competitions = sorted(df_players["competition"].unique())
+    competitions = list(catalog)
     competition = st.sidebar.selectbox("Select Competition", competitions)
-    df_competition = data.filter_competition(df_players, competition)
 
-    seasons = sorted(df_competition["year"].unique())
+    seasons = list(catalog[competition])
     season = st.sidebar.selectbox("Select Season", seasons)
-    df_season = data.filter_season(df_competition, season)
 
-    teams = sorted(df_season.sort_values("team_name")["team_url"].unique())
+    teams = catalog[competition][season]
     team = st.sidebar.selectbox(
         "Select Team", teams, format_func=team_url_to_name.get,
     )
-    df_team = data.filter_team_url(df_season, team)
 
     min_appearances = st.sidebar.number_input(
         "Filter players with less than input appearances",
@@ -62,46 +218,48 @@ def main():
         step=1,
     )
 
-    fig_season = visualization.scatter_players_for_season(
-        df_players,
-        df_matches,
+    error_bars = st.sidebar.checkbox("Show 90% bootstrap intervals of gd90")
+    ranking_column = st.sidebar.selectbox(
+        "Rank players by", list(RANKING_ORDERS), format_func=RANKING_ORDERS.get
+    )
+
+    inputs = (
+        data_version,
         competition,
         season,
-        x_column="gd90",
-        y_column="full_games",
-        min_appearances=min_appearances,
-        team=team,
+        team,
+        min_appearances,
+        error_bars,
     )
+    with timed(timings, "season figure"):
+        fig_season = get_season_figure(*inputs)
     st.plotly_chart(fig_season)
 
-    fig_team = visualization.scatter_players_for_team(
-        df_players=df_players,
-        df_matches=df_matches,
-        team=team,
-        competition=competition,
-        season=season,
-        x_column="gd90",
-        y_column="full_games",
-        min_appearances=min_appearances,
-    )
+    st.subheader(f"Players ranked by {RANKING_ORDERS[ranking_column]}")
+    with timed(timings, "ranking"):
+        df_ranking = get_ranking(
+            data_version, competition, season, min_appearances, ranking_column
+        )
+    st.write(df_ranking)
+
+    with timed(timings, "team figure"):
+        fig_team = get_team_figure(*inputs)
     st.plotly_chart(fig_team)
 
-    fig_team_bar = visualization.bar_players_for_team(
-        df_players=df_players,
-        df_matches=df_matches,
-        team=team,
-        competition=competition,
-        season=season,
-        weight_column="full_games",
-        min_appearances=min_appearances,
-    )
+    with timed(timings, "team bar figure"):
+        fig_team_bar = get_team_bar_figure(*inputs)
     st.plotly_chart(fig_team_bar)
 
-    players = df_team.sort_values("player_name")["player_url"].unique()
+    players = get_players(data_version, competition, season, team)
     player = st.selectbox(
         "Select Player", players, format_func=player_url_to_name.get
     )
-    df_player = data.filter_player_url(df_team, player)
+    # the only stage that depends on the selected player
+    with timed(timings, "appearances"):
+        df_player = data.filter_competition(datasets.df_players, competition)
+        df_player = data.filter_season(df_player, season)
+        df_player = data.filter_team_url(df_player, team)
+        df_player = data.filter_player_url(df_player, player)
 
     default_columns = [
         "matchday",
@@ -114,6 +272,22 @@ def main():
     )
     st.write(df_player[selected_columns].reset_index(drop=True))
 
+    progress = warmup.progress()
+    if progress and progress["running"]:
+        st.sidebar.caption(
+            f"Warming up caches: {progress['done']}/{progress['seasons']} "
+            "seasons"
+        )
+
+    if DEBUG:
+        st.sidebar.subheader("Stage timings")
+        st.sidebar.table(
+            {
+                "stage": list(timings),
+                "ms": [f"{seconds * 1000:.1f}" for seconds in timings.values()],
+            }
+        )
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,216 @@
+import logging
+import threading
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from . import loader
+from .data import read_datasets
+
+"""
+Goal timelines of the matches, to count the goal difference of any window of
+minutes instead of only the stored goal difference of each appearance.
+
+The goals of all matches are kept CSR-style in flat arrays: the goals of
+match i are minutes[offsets[i]:offsets[i + 1]], sorted, and the sides at the
+same positions (1 for a home goal, -1 for an away goal). Match i is row i of
+`matches` (competition, year, matchday, team_home_url, team_away_url).
+
+A goal counts for the window (start, end] of a team, as it counts for an
+appearance. All windows are counted at once with searchsorted over the keys
+match << MINUTE_BITS | minute, which sort like (match, minute), and a
+cumulative sum of the sides.
+
+The timeline is built from the goals dataset written by gd_analysis.ingest,
+datasets converted from the pickles have none. Goals whose minute ingest
+could not read are left out, so the appearances around them do not match
+their stored goal difference in check_goal_differences.
+"""
+
+logger = logging.getLogger(__name__)
+
+MATCH_KEYS = [
+    "competition",
+    "year",
+    "matchday",
+    "team_home_url",
+    "team_away_url",
+]
+MINUTE_BITS = 16
+
+
+class GoalTimeline:
+    def __init__(
+        self,
+        matches: pd.DataFrame,
+        offsets: np.ndarray,
+        minutes: np.ndarray,
+        sides: np.ndarray,
+    ):
+        self.matches = matches
+        self.offsets = offsets
+        self.minutes = minutes
+        self.sides = sides
+        match = np.repeat(
+            np.arange(len(matches), dtype="int64"), np.diff(offsets)
+        )
+        self._keys = match << MINUTE_BITS | minutes
+        self._cumulative = np.r_[0, np.cumsum(sides, dtype="int64")]
+        # (competition, year, matchday, team_url) -> match and sign of a side
+        teams = pd.concat(
+            [
+                matches[MATCH_KEYS[:3]].assign(
+                    team_url=matches["team_home_url"], sign=1
+                ),
+                matches[MATCH_KEYS[:3]].assign(
+                    team_url=matches["team_away_url"], sign=-1
+                ),
+            ]
+        )
+        self._teams = pd.MultiIndex.from_frame(
+            teams[["competition", "year", "matchday", "team_url"]]
+        )
+        self._signs = teams["sign"].values
+        self._team_matches = np.tile(np.arange(len(matches)), 2)
+
+    def __len__(self):
+        return len(self.matches)
+
+    def get_match(self, competition, season, matchday, team_url):
+        """Match and sign (1 home, -1 away) of a team, (-1, 0) if unknown."""
+        matches, signs = self.get_matches(
+            pd.DataFrame(
+                {
+                    "competition": [competition],
+                    "year": [season],
+                    "matchday": [matchday],
+                    "team_url": [team_url],
+                }
+            )
+        )
+        return int(matches[0]), int(signs[0])
+
+    def get_matches(self, df: pd.DataFrame):
+        """Match and sign of the team of every row, -1 and 0 if unknown."""
+        positions = self._teams.get_indexer(
+            pd.MultiIndex.from_frame(
+                df[["competition", "year", "matchday", "team_url"]]
+            )
+        )
+        known = positions >= 0
+        matches = np.where(known, self._team_matches[positions], -1)
+        signs = np.where(known, self._signs[positions], 0)
+        return matches, signs
+
+    def goals(self, match: int) -> pd.DataFrame:
+        bounds = slice(self.offsets[match], self.offsets[match + 1])
+        return pd.DataFrame(
+            {"minute": self.minutes[bounds], "side": self.sides[bounds]}
+        )
+
+    def goal_difference(
+        self, match: int, sign: int, start: int, end: int
+    ) -> int:
+        """Goal difference of a side in the window (start, end] of a match."""
+        minutes = self.minutes[self.offsets[match] : self.offsets[match + 1]]
+        sides = self.sides[self.offsets[match] : self.offsets[match + 1]]
+        first, last = np.searchsorted(minutes, [start, end], side="right")
+        return sign * int(sides[first:last].sum())
+
+    def goal_differences(
+        self,
+        matches: np.ndarray,
+        signs: np.ndarray,
+        starts: np.ndarray,
+        ends: np.ndarray,
+    ) -> np.ndarray:
+        """Goal differences of many windows, 0 for unknown matches."""
+        matches = np.asarray(matches, dtype="int64")
+        bounds = [
+            np.searchsorted(
+                self._keys,
+                matches << MINUTE_BITS | np.asarray(minutes, dtype="int64"),
+                side="right",
+            )
+            for minutes in [starts, ends]
+        ]
+        window = self._cumulative[bounds[1]] - self._cumulative[bounds[0]]
+        return np.where(matches >= 0, signs * window, 0)
+
+
+def get_goal_timeline(
+    df_matches: pd.DataFrame, df_goals: pd.DataFrame
+) -> GoalTimeline:
+    minute = pd.to_numeric(df_goals["minute"], errors="coerce")
+    if minute.isna().any():
+        logger.warning(
+            "%d goals without a minute left out", minute.isna().sum()
+        )
+        df_goals, minute = df_goals[minute.notna()], minute.dropna()
+    if ((minute < 0) | (minute >= 2 ** (MINUTE_BITS - 1))).any():
+        raise ValueError("goal minutes out of range")
+    matches = df_matches[MATCH_KEYS].drop_duplicates().reset_index(drop=True)
+    match_index = pd.MultiIndex.from_frame(matches)
+    match = match_index.get_indexer(
+        pd.MultiIndex.from_frame(df_goals[MATCH_KEYS])
+    )
+    if (match < 0).any():
+        raise ValueError(
+            f"{(match < 0).sum()} goals of matches not in the matches dataset"
+        )
+    minute = minute.values.astype("int16")
+    side = np.where(df_goals["side"].values == "home", 1, -1).astype("int16")
+    order = np.lexsort((minute, match))
+    counts = np.bincount(match, minlength=len(matches))
+    offsets = np.r_[0, np.cumsum(counts)].astype("int64")
+    return GoalTimeline(matches, offsets, minute[order], side[order])
+
+
+def get_goal_differences(
+    timeline: GoalTimeline, df_players: pd.DataFrame, start=None, end=None
+) -> np.ndarray:
+    """Goal difference of every appearance, within (start, end] if given.
+
+    start and end are columns or arrays of minutes, by default the start and
+    end of the appearance. Appearances of unknown matches count 0.
+    """
+    matches, signs = timeline.get_matches(df_players)
+    starts = df_players["start"].values if start is None else start
+    ends = df_players["end"].values if end is None else end
+    # a window that does not reach into the appearance is empty
+    starts = np.maximum(starts, df_players["start"].values)
+    ends = np.maximum(np.minimum(ends, df_players["end"].values), starts)
+    return timeline.goal_differences(matches, signs, starts, ends)
+
+
+def check_goal_differences(
+    timeline: GoalTimeline, df_players: pd.DataFrame
+) -> pd.DataFrame:
+    """Appearances whose goal_difference the timeline does not reproduce."""
+    goal_differences = get_goal_differences(timeline, df_players)
+    different = goal_differences != df_players["goal_difference"].values
+    return df_players[different].assign(
+        timeline_goal_difference=goal_differences[different]
+    )
+
+
+_timeline: Optional[GoalTimeline] = None
+_timeline_version: Optional[str] = None
+_lock = threading.Lock()
+
+
+def get_timeline() -> Optional[GoalTimeline]:
+    """Timeline of the loaded datasets, None if there is no goals dataset."""
+    global _timeline, _timeline_version
+    datasets = loader.get_datasets()
+    with _lock:
+        if _timeline_version != datasets.data_version:
+            try:
+                df_goals = read_datasets("goals", loader.DATAPATH)
+            except FileNotFoundError:
+                _timeline = None
+            else:
+                _timeline = get_goal_timeline(datasets.df_matches, df_goals)
+            _timeline_version = datasets.data_version
+    return _timeline
@@ -1,17 +1,29 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+from functools import cached_property
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
 import plotly.graph_objects as go
 
-from gd_analysis import helpers
+from gd_analysis import helpers, loader, metrics
 
 from gd_analysis.analysis import (
-    get_players_goal_differences,
-    goal_difference_for_team,
+    select_gd90_intervals,
+    select_players_goal_differences,
+    select_team_goal_difference,
 )
 from gd_analysis.data import (
     filter_competition,
     filter_season,
     filter_team_url,
     filter_player_url,
-    filter_appearances,
+    write_atomically,
 )
 
 TITLE_FONT = {"size": 34, "color": "white"}
@@ -23,6 +35,14 @@ ANNOTATION_TEXT_FONT = {"size": 18, "color": "white"}
 DEFAULT_HEIGHT = 500
 DEFAULT_WIDTH = 800
 PLOT_BACKGROUND_COLOR = "rgba(35, 35, 35, 1)"
+# point count above which scatter traces switch to webgl (Scattergl)
+WEBGL_THRESHOLD = int(os.environ.get("GD_ANALYSIS_WEBGL_THRESHOLD", 1000))
+FIGURE_CACHE_PATH = os.environ.get(
+    "GD_ANALYSIS_FIGURE_CACHE", str(Path(loader.DATAPATH) / "figures")
+)
+# bump when the figure builders change what they draw, so that figures
+# persisted by an older version are not served
+FIGURE_FORMAT_VERSION = 1
 
 
 EMPTY_LAYOUT = go.Layout(
@@ -81,6 +101,21 @@ def get_default_layout(
     return layout
 
 
+def get_error_bars(df, column, df_intervals=None):
+    """Asymmetric error bars of the gd90 intervals, None for other columns."""
+    if df_intervals is None or column != "gd90":
+        return None
+    df_intervals = df_intervals.reindex(df.index)
+    return {
+        "type": "data",
+        "symmetric": False,
+        "array": (df_intervals["gd90_high"] - df[column]).values,
+        "arrayminus": (df[column] - df_intervals["gd90_low"]).values,
+        "thickness": 1,
+        "width": 0,
+    }
+
+
 def get_scatter_for_df(
     df,
     x_column,
@@ -90,15 +125,16 @@ def get_scatter_for_df(
     line_color="white",
     marker_size=10,
     marker_symbol="circle",
+    df_intervals=None,
 ):
-    x_values = df[x_column].values
-    y_values = df[y_column].values
     teams = df.index.get_level_values(0)
     players = df.index.get_level_values(2)
 
-    return go.Scatter(
-        x=x_values,
-        y=y_values,
+    # large traces are rendered with webgl instead of svg
+    scatter = go.Scattergl if len(df) > WEBGL_THRESHOLD else go.Scatter
+    return scatter(
+        x=df[x_column].values,
+        y=df[y_column].values,
         name=name,
         mode="markers",
         marker={
@@ -107,37 +143,32 @@ def get_scatter_for_df(
             "line": {"width": 0, "color": line_color},
             "symbol": marker_symbol,
         },
-        hovertext=[
-            f"{team}<br>{player}<br>{x_column}={x:.1f}<br>{y_column}={y:.1f}"
-            for team, player, x, y in zip(teams, players, x_values, y_values)
-        ],
-        hoverinfo="text",
+        # one template for all points instead of a label per point
+        customdata=np.stack([teams.astype(str), players.astype(str)], axis=-1),
+        hovertemplate=(
+            "%{customdata[0]}<br>%{customdata[1]}<br>"
+            f"{x_column}=%{{x:.1f}}<br>{y_column}=%{{y:.1f}}<extra></extra>"
+        ),
+        error_x=get_error_bars(df, x_column, df_intervals),
+        error_y=get_error_bars(df, y_column, df_intervals),
     )
 
 
-def scatter_players_for_season(
-    df_players,
-    df_matches,
+def get_season_figure(
+    df_grouped,
     competition: str,
     season: str,
     x_column: str,
     y_column: str,
-    min_appearances: int = 5,
-    team: "str" = None,
+    team: str = None,
+    team_name: str = None,
+    team_goal_difference: float = None,
+    df_intervals=None,
 ):
-    df_players = filter_competition(df_players, competition)
-    df_players = filter_season(df_players, season)
-
-    df_grouped = get_players_goal_differences(df_players)
-    df_grouped = filter_appearances(df_grouped, min_appearances)
-
-    teams = df_grouped.index.get_level_values(0)
-    players = df_grouped.index.get_level_values(2)
-
+    """Scatter of the aggregated players of a season, a team highlighted."""
     data = []
 
     if team is not None:
-        team_name = helpers.get_map_from_url_to_name(df_players, "team")[team]
         trace_team = get_scatter_for_df(
             df_grouped.loc[[team]],
             x_column,
@@ -145,12 +176,17 @@ def scatter_players_for_season(
             name=team_name,
             marker_color="mediumvioletred",
             marker_symbol="diamond",
+            df_intervals=df_intervals,
         )
         data.append(trace_team)
         df_grouped = df_grouped.drop(index=team)
 
     trace_all = get_scatter_for_df(
-        df_grouped, x_column, y_column, name="All / other teams"
+        df_grouped,
+        x_column,
+        y_column,
+        name="All / other teams",
+        df_intervals=df_intervals,
     )
     data.append(trace_all)
 
@@ -158,11 +194,6 @@ def scatter_players_for_season(
     layout.yaxis.update(rangemode="tozero")
 
     if team is not None:
-        # get mean value for team
-        df_matches = filter_competition(df_matches, competition)
-        df_matches = filter_season(df_matches, season)
-        team_goal_difference = goal_difference_for_team(df_matches, team)
-
         # for goal difference of team
         shapes = [
             go.layout.Shape(
@@ -185,34 +216,58 @@ def scatter_players_for_season(
     return fig
 
 
-def scatter_players_for_team(
+@metrics.instrument
+def scatter_players_for_season(
     df_players,
     df_matches,
-    competition,
-    season,
-    team,
-    x_column="gd90",
-    y_column="full_games",
+    competition: str,
+    season: str,
+    x_column: str,
+    y_column: str,
     min_appearances: int = 5,
+    team: "str" = None,
+    error_bars: bool = False,
 ):
-    column = "gd90"
-    df_players = filter_competition(df_players, competition)
-    df_players = filter_season(df_players, season)
-    df_players = filter_team_url(df_players, team)
-    team_name = helpers.get_map_from_url_to_name(df_players, "team")[team]
-
-    df_players = get_players_goal_differences(df_players)
-    df_players = filter_appearances(df_players, min_appearances)
-
-    # display(df.head())
-
-    # get mean value for team
-    df_matches = filter_competition(df_matches, competition)
-    df_matches = filter_season(df_matches, season)
-    team_goal_difference = goal_difference_for_team(df_matches, team)
+    df_grouped = select_players_goal_differences(
+        df_players, competition, season, min_appearances=min_appearances
+    )
+    df_intervals = (
+        select_gd90_intervals(df_players, competition, season)
+        if error_bars
+        else None
+    )
+    team_name = team_goal_difference = None
+    if team is not None:
+        df_season = filter_competition(df_players, competition)
+        df_season = filter_season(df_season, season)
+        team_name = helpers.get_map_from_url_to_name(df_season, "team")[team]
+        # get mean value for team
+        team_goal_difference = select_team_goal_difference(
+            df_matches, competition, season, team
+        )
+    return get_season_figure(
+        df_grouped,
+        competition,
+        season,
+        x_column,
+        y_column,
+        team,
+        team_name,
+        team_goal_difference,
+        df_intervals,
+    )
 
-    # df_team = df_grouped[df_grouped.index.get_level_values(0) == team]
 
+def get_team_figure(
+    df_players,
+    season: str,
+    team_name: str,
+    team_goal_difference: float,
+    x_column="gd90",
+    y_column="full_games",
+    df_intervals=None,
+):
+    """Scatter of the aggregated players of a team, with their names."""
     player_names = df_players.index.get_level_values(2)
 
     trace = go.Scatter(
@@ -224,13 +279,10 @@ def scatter_players_for_team(
         textposition="top center",
         marker={"color": "mediumvioletred", "size": 12, "symbol": "diamond",},
         textfont=PLAYER_TEXT_FONT,
+        error_x=get_error_bars(df_players, x_column, df_intervals),
+        error_y=get_error_bars(df_players, y_column, df_intervals),
     )
 
-    # get mean value for team
-    df_matches = filter_competition(df_matches, competition)
-    df_matches = filter_season(df_matches, season)
-    team_goal_difference = goal_difference_for_team(df_matches, team)
-
     # for goal difference of team
     shapes = [
         go.layout.Shape(
@@ -252,46 +304,83 @@ def scatter_players_for_team(
     return fig
 
 
-def bar_players_for_team(
+def get_team_players(df_grouped, team: str):
+    """Rows of a team in the aggregated players of a season."""
+    return df_grouped[df_grouped.index.get_level_values(0) == team]
+
+
+@metrics.instrument
+def scatter_players_for_team(
     df_players,
     df_matches,
     competition,
     season,
     team,
-    column="gd90",
-    weight_column="full_games",
+    x_column="gd90",
+    y_column="full_games",
     min_appearances: int = 5,
+    error_bars: bool = False,
 ):
-    df_players = filter_competition(df_players, competition)
-    df_players = filter_season(df_players, season)
-    df_players = filter_team_url(df_players, team)
-    team_name = helpers.get_map_from_url_to_name(df_players, "team")[team]
+    df_team = filter_competition(df_players, competition)
+    df_team = filter_season(df_team, season)
+    df_team = filter_team_url(df_team, team)
+    team_name = helpers.get_map_from_url_to_name(df_team, "team")[team]
+
+    # the season intervals, the same as in the season figure
+    df_intervals = (
+        select_gd90_intervals(df_players, competition, season)
+        if error_bars
+        else None
+    )
+    df_grouped = get_team_players(
+        select_players_goal_differences(
+            df_players, competition, season, min_appearances=min_appearances
+        ),
+        team,
+    )
+
+    # get mean value for team
+    team_goal_difference = select_team_goal_difference(
+        df_matches, competition, season, team
+    )
+    return get_team_figure(
+        df_grouped,
+        season,
+        team_name,
+        team_goal_difference,
+        x_column,
+        y_column,
+        df_intervals,
+    )
 
-    df_players = get_players_goal_differences(df_players)
-    df_players = filter_appearances(df_players, min_appearances)
 
+def get_team_bars_figure(
+    df_players,
+    season: str,
+    team_name: str,
+    team_goal_difference: float,
+    column="gd90",
+    weight_column="full_games",
+    df_intervals=None,
+):
+    """Bars of the aggregated players of a team, as wide as their minutes."""
     df_players = df_players.sort_values(column)
 
-    values = df_players[column]
     players = df_players.index.get_level_values(2)
     width_weights = df_players[weight_column]
 
-    # get mean value for team
-    df_matches = filter_competition(df_matches, competition)
-    df_matches = filter_season(df_matches, season)
-    team_goal_difference = goal_difference_for_team(df_matches, team)
-
     trace = go.Bar(
         x=players,
         y=df_players[column],
         width=0.05 + 0.7 * ((width_weights / width_weights.max())),
         orientation="v",
-        hoverinfo="text",
-        hovertext=[
-            f"<b>{player}</b><br>{column}={value:.1f}<br>{weight_column}={weight:.1f}"
-            for player, value, weight in zip(players, values, width_weights)
-        ],
+        customdata=width_weights.values,
+        hovertemplate=(
+            f"<b>%{{x}}</b><br>{column}=%{{y:.1f}}<br>"
+            f"{weight_column}=%{{customdata:.1f}}<extra></extra>"
+        ),
         marker={"color": "mediumvioletred", "line": {"width": 0}},
+        error_y=get_error_bars(df_players, column, df_intervals),
     )
 
     layout = get_default_layout(f"{team_name} {season}", "Player", column)
@@ -329,3 +418,417 @@ def bar_players_for_team(
     fig = go.Figure(data=data, layout=layout)
 
     return fig
+
+
+@metrics.instrument
+def bar_players_for_team(
+    df_players,
+    df_matches,
+    competition,
+    season,
+    team,
+    column="gd90",
+    weight_column="full_games",
+    min_appearances: int = 5,
+    error_bars: bool = False,
+):
+    df_team = filter_competition(df_players, competition)
+    df_team = filter_season(df_team, season)
+    df_team = filter_team_url(df_team, team)
+    team_name = helpers.get_map_from_url_to_name(df_team, "team")[team]
+
+    # the season intervals, the same as in the season figure
+    df_intervals = (
+        select_gd90_intervals(df_players, competition, season)
+        if error_bars
+        else None
+    )
+    df_grouped = get_team_players(
+        select_players_goal_differences(
+            df_players, competition, season, min_appearances=min_appearances
+        ),
+        team,
+    )
+
+    # get mean value for team
+    team_goal_difference = select_team_goal_difference(
+        df_matches, competition, season, team
+    )
+    return get_team_bars_figure(
+        df_grouped,
+        season,
+        team_name,
+        team_goal_difference,
+        column,
+        weight_column,
+        df_intervals,
+    )
+
+
+# y axis of the season figure in the dash and the streamlit app
+SEASON_Y_COLUMNS = ("appearances", "full_games")
+FIGURE_BUILDERS = {
+    "season": scatter_players_for_season,
+    "team": scatter_players_for_team,
+    "team_bars": bar_players_for_team,
+}
+
+
+class FigureCache:
+    """Serialized figures on local disk, keyed by inputs and data version.
+
+    Files live in {directory}/{data_version}-f{FIGURE_FORMAT_VERSION}/
+    {figure}-{hash of inputs}.json, a new data version or figure format
+    starts with an empty directory.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get_version_directory(self, data_version: str) -> Path:
+        return self.directory / f"{data_version}-f{FIGURE_FORMAT_VERSION}"
+
+    def get_path(
+        self, figure: str, data_version: str, inputs: Dict[str, Any]
+    ) -> Path:
+        key = json.dumps([figure, inputs], sort_keys=True, default=str)
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        directory = self.get_version_directory(data_version)
+        return directory / f"{figure}-{digest}.json"
+
+    def get(self, figure: str, build=None, **inputs) -> Dict[str, Any]:
+        """The cached figure, else built by `build()` or the figure builder."""
+        datasets = loader.get_datasets()
+        path = self.get_path(figure, datasets.data_version, inputs)
+        try:
+            fig = json.loads(path.read_text())
+            with self._lock:
+                self.hits += 1
+            return fig
+        except (FileNotFoundError, json.JSONDecodeError):
+            # a missing or unreadable file is built and written again
+            with self._lock:
+                self.misses += 1
+
+        if build is not None:
+            fig = build()
+        else:
+            fig = FIGURE_BUILDERS[figure](
+                datasets.df_players, datasets.df_matches, **inputs
+            )
+        with metrics.timer("visualization.to_json"):
+            text = fig.to_json()
+        try:
+            self.write(path, text)
+        except OSError:
+            pass
+        return json.loads(text)
+
+    def write(self, path: Path, text: str):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write and rename, so that readers never see a partial file
+        with write_atomically(path) as temporary:
+            Path(temporary).write_text(text)
+
+    def prune(self):
+        """Remove the figures of other data versions."""
+        current = self.get_version_directory(
+            loader.get_datasets().data_version
+        )
+        if not self.directory.is_dir():
+            return
+        for directory in self.directory.iterdir():
+            if directory.is_dir() and directory != current:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    def warm(
+        self,
+        min_appearances: int = 5,
+        y_columns=SEASON_Y_COLUMNS,
+    ) -> int:
+        """Build the figures of every (competition, season, team)."""
+        self.prune()
+        appearance_store = loader.get_datasets().appearance_store
+        count = 0
+        for competition in appearance_store.competitions():
+            for season in appearance_store.seasons(competition):
+                count += self.warm_season(
+                    competition, season, min_appearances, y_columns
+                )
+        return count
+
+    def warm_season(
+        self,
+        competition: str,
+        season: str,
+        min_appearances: int = 5,
+        y_columns=SEASON_Y_COLUMNS,
+    ) -> int:
+        """Build the figures of a season and of each of its teams."""
+        appearance_store = loader.get_datasets().appearance_store
+        count = 0
+        for team in [None] + appearance_store.teams(competition, season):
+            context = SelectionContext(
+                competition,
+                season,
+                team,
+                min_appearances=min_appearances,
+                cache=self,
+            )
+            for y_column in y_columns:
+                context.y_column = y_column
+                context.get_figure("season")
+                count += 1
+            if team is not None:
+                for figure in ["team", "team_bars"]:
+                    context.get_figure(figure)
+                    count += 1
+        return count
+
+
+@metrics.instrument
+def get_selection_figure(
+    figure: str,
+    competition: str,
+    season: str,
+    team: str = None,
+    min_appearances: int = 5,
+    y_column: str = None,
+    cache: FigureCache = None,
+    error_bars: bool = False,
+) -> Dict[str, Any]:
+    """Cached figure of a selection, with the inputs used by the apps."""
+    inputs = get_figure_inputs(
+        figure,
+        competition,
+        season,
+        team,
+        min_appearances,
+        y_column,
+        error_bars,
+    )
+    return (cache or figure_cache).get(figure, **inputs)
+
+
+def get_figure_inputs(
+    figure: str,
+    competition: str,
+    season: str,
+    team: str = None,
+    min_appearances: int = 5,
+    y_column: str = None,
+    error_bars: bool = False,
+) -> Dict[str, Any]:
+    """Builder arguments of a figure, also the key of the figure cache."""
+    if figure == "season":
+        inputs = dict(
+            competition=competition,
+            season=season,
+            x_column="gd90",
+            y_column=y_column or "full_games",
+            min_appearances=min_appearances,
+            team=team,
+        )
+    else:
+        inputs = dict(
+            competition=competition,
+            season=season,
+            team=team,
+            min_appearances=min_appearances,
+        )
+    if error_bars:
+        # only then, so the keys of the figures without them stay the same
+        inputs["error_bars"] = True
+    return inputs
+
+
+class SelectionContext:
+    """Figures, dropdown options and table rows of a page selection.
+
+    Every frame is filtered or aggregated at most once, when something needs
+    it first, and then shared by everything built from it. A team that is not
+    in the selected season is ignored, as after a change of the season.
+    """
+
+    def __init__(
+        self,
+        competition: str = None,
+        season: str = None,
+        team: str = None,
+        player_url: str = None,
+        min_appearances: int = 5,
+        y_column: str = "appearances",
+        error_bars: bool = False,
+        cache: FigureCache = None,
+    ):
+        self.datasets = loader.get_datasets()
+        self.competition = competition
+        self.season = season
+        self.team = team if team in self.teams else None
+        self.player_url = player_url
+        self.min_appearances = min_appearances
+        self.y_column = y_column
+        self.error_bars = error_bars
+        self.cache = cache or figure_cache
+
+    @cached_property
+    def teams(self) -> List[str]:
+        if not (self.competition and self.season):
+            return []
+        appearance_store = self.datasets.appearance_store
+        return appearance_store.teams(self.competition, self.season)
+
+    @cached_property
+    def team_options(self) -> List[Dict[str, str]]:
+        return helpers.get_dash_dropdown_options(self.teams, self.teams)
+
+    @cached_property
+    def player_options(self) -> List[Dict[str, str]]:
+        if self.team is None:
+            return []
+        players = self.datasets.appearance_store.players_for_team(
+            self.competition, self.season, self.team
+        )
+        return helpers.get_dash_dropdown_options(
+            [player_url for player_url, _ in players],
+            [player_name for _, player_name in players],
+        )
+
+    @cached_property
+    def df_season(self):
+        df = self.datasets.df_players
+        if self.competition:
+            df = filter_competition(df, self.competition)
+        if self.season:
+            df = filter_season(df, self.season)
+        return df
+
+    @cached_property
+    def df_appearances(self):
+        """Appearances of the selection, the rows of the table."""
+        df = self.df_season
+        if self.team:
+            df = filter_team_url(df, self.team)
+        if self.player_url:
+            df = filter_player_url(df, self.player_url)
+        return df
+
+    @cached_property
+    def df_grouped(self):
+        return select_players_goal_differences(
+            self.datasets.df_players,
+            self.competition,
+            self.season,
+            min_appearances=self.min_appearances,
+        )
+
+    @cached_property
+    def df_team_grouped(self):
+        return get_team_players(self.df_grouped, self.team)
+
+    @cached_property
+    def df_intervals(self):
+        if not self.error_bars:
+            return None
+        return select_gd90_intervals(
+            self.datasets.df_players, self.competition, self.season
+        )
+
+    @cached_property
+    def team_name(self) -> str:
+        df_team = filter_team_url(self.df_season, self.team)
+        return helpers.get_map_from_url_to_name(df_team, "team")[self.team]
+
+    @cached_property
+    def team_goal_difference(self) -> float:
+        return select_team_goal_difference(
+            self.datasets.df_matches, self.competition, self.season, self.team
+        )
+
+    def build(self, figure: str):
+        inputs = get_figure_inputs(
+            figure,
+            self.competition,
+            self.season,
+            self.team,
+            self.min_appearances,
+            self.y_column,
+        )
+        if figure == "season":
+            return get_season_figure(
+                self.df_grouped,
+                self.competition,
+                self.season,
+                inputs["x_column"],
+                inputs["y_column"],
+                self.team,
+                self.team_name if self.team else None,
+                self.team_goal_difference if self.team else None,
+                self.df_intervals,
+            )
+        figure_function = (
+            get_team_figure if figure == "team" else get_team_bars_figure
+        )
+        return figure_function(
+            self.df_team_grouped,
+            self.season,
+            self.team_name,
+            self.team_goal_difference,
+            df_intervals=self.df_intervals,
+        )
+
+    def get_figure(self, figure: str):
+        if not self.teams or (figure != "season" and self.team is None):
+            return go.Figure([], layout=EMPTY_LAYOUT)
+        inputs = get_figure_inputs(
+            figure,
+            self.competition,
+            self.season,
+            self.team,
+            self.min_appearances,
+            self.y_column,
+            self.error_bars,
+        )
+        return self.cache.get(
+            figure, build=lambda: self.build(figure), **inputs
+        )
+
+    @cached_property
+    def figures(self) -> Dict[str, Any]:
+        return {figure: self.get_figure(figure) for figure in FIGURE_BUILDERS}
+
+
+@metrics.instrument
+def build_selection_context(
+    competition: str,
+    season: str,
+    team: str = None,
+    player_url: str = None,
+    min_appearances: int = 5,
+    y_column: str = "appearances",
+    error_bars: bool = False,
+    cache: FigureCache = None,
+) -> SelectionContext:
+    """Everything the page needs for a selection, see SelectionContext."""
+    return SelectionContext(
+        competition,
+        season,
+        team,
+        player_url,
+        min_appearances,
+        y_column,
+        error_bars,
+        cache,
+    )
+
+
+figure_cache = FigureCache(FIGURE_CACHE_PATH)
+
+
+if __name__ == "__main__":
+    # python -m gd_analysis.visualization [min_appearances]
+    count = figure_cache.warm(*[int(arg) for arg in sys.argv[1:2]])
+    print(f"warmed {count} figures in {figure_cache.directory}")
@@ -0,0 +1,202 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from . import loader
+from .analysis import select_players_goal_differences
+from .visualization import SEASON_Y_COLUMNS, FigureCache, figure_cache
+
+"""
+Background warm-up of the season aggregates and figures after a start.
+
+A WarmupScheduler walks the seasons in priority order and, for each, selects
+the aggregated players (into the results cache of gd_analysis.analysis) and
+builds the season and team figures of both apps (into the figure cache on
+disk, shared by all processes). It runs in a daemon thread and only fills
+caches, so requests are served as usual meanwhile, and the ones that reach a
+figure first build it themselves.
+
+GD_ANALYSIS_WARMUP=0 disables it. GD_ANALYSIS_WARMUP_PRIORITY is a comma
+separated list of competitions or competition/season, warmed first in that
+order, e.g. "Bundesliga/2019-20,Premier League". The other seasons follow,
+the latest season of every competition first.
+
+gunicorn.conf.py runs `python -m gd_analysis.warmup` as a separate process
+instead, a thread in the master would not survive the fork of the workers.
+That process warms only the figures: its results cache is its own, the
+aggregates of a worker are selected by the first request that needs them.
+"""
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("GD_ANALYSIS_WARMUP", "1") == "1"
+PRIORITY = os.environ.get("GD_ANALYSIS_WARMUP_PRIORITY", "")
+
+
+def parse_priority(text: str) -> List[Tuple[str, Optional[str]]]:
+    """(competition, season or None) of the entries of a priority list."""
+    entries = []
+    for entry in text.split(","):
+        competition, _, season = entry.strip().partition("/")
+        if competition:
+            entries.append((competition, season or None))
+    return entries
+
+
+def get_seasons(
+    priority: Sequence[Tuple[str, Optional[str]]] = (),
+) -> List[Tuple[str, str]]:
+    """All (competition, season) of the datasets in warm-up order."""
+    appearance_store = loader.get_datasets().appearance_store
+    catalog = {
+        competition: appearance_store.seasons(competition)
+        for competition in appearance_store.competitions()
+    }
+    # newest first, the latest season of every competition before the rest
+    seasons = []
+    for age in range(max(map(len, catalog.values()), default=0)):
+        for competition, competition_seasons in catalog.items():
+            if age < len(competition_seasons):
+                seasons.append((competition, competition_seasons[-1 - age]))
+
+    ordered = []
+    for competition, season in priority:
+        for selected in seasons:
+            if (
+                selected[0] == competition
+                and season in (None, selected[1])
+                and selected not in ordered
+            ):
+                ordered.append(selected)
+    return ordered + [
+        selected for selected in seasons if selected not in ordered
+    ]
+
+
+class WarmupScheduler:
+    def __init__(
+        self,
+        priority: Optional[Sequence[Tuple[str, Optional[str]]]] = None,
+        cache: FigureCache = None,
+        min_appearances: int = 5,
+        y_columns=SEASON_Y_COLUMNS,
+        aggregates: bool = True,
+    ):
+        self.priority = (
+            parse_priority(PRIORITY) if priority is None else priority
+        )
+        self.cache = cache or figure_cache
+        self.min_appearances = min_appearances
+        self.y_columns = y_columns
+        self.aggregates = aggregates
+        self.seasons: List[Tuple[str, str]] = []
+        self.done = 0
+        self.figures = 0
+        self.errors = 0
+        self.current: Optional[Tuple[str, str]] = None
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "WarmupScheduler":
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self.run, name="gd-analysis-warmup", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop after the current season."""
+        self._stop.set()
+
+    def join(self, timeout: Optional[float] = None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def running(self) -> bool:
+        return self.started is not None and self.finished is None
+
+    def run(self):
+        self.started = time.perf_counter()
+        self.seasons = get_seasons(self.priority)
+        self.cache.prune()
+        logger.info("warm-up of %d seasons started", len(self.seasons))
+        for competition, season in self.seasons:
+            if self._stop.is_set():
+                break
+            self.current = (competition, season)
+            try:
+                self.warm_season(competition, season)
+            except Exception:
+                self.errors += 1
+                logger.exception(
+                    "warm-up of %s %s failed", competition, season
+                )
+            self.done += 1
+            logger.info(
+                "warm-up %d/%d seasons, %d figures, %.1f s: %s %s",
+                self.done,
+                len(self.seasons),
+                self.figures,
+                time.perf_counter() - self.started,
+                competition,
+                season,
+            )
+        self.current = None
+        self.finished = time.perf_counter()
+
+    def warm_season(self, competition: str, season: str):
+        if self.aggregates:
+            select_players_goal_differences(
+                loader.get_datasets().df_players,
+                competition,
+                season,
+                min_appearances=self.min_appearances,
+            )
+        self.figures += self.cache.warm_season(
+            competition, season, self.min_appearances, self.y_columns
+        )
+
+    def progress(self) -> Dict[str, Any]:
+        end = self.finished or time.perf_counter()
+        return {
+            "running": self.running,
+            "seasons": len(self.seasons),
+            "done": self.done,
+            "figures": self.figures,
+            "errors": self.errors,
+            "current": "/".join(self.current) if self.current else None,
+            "seconds": end - self.started if self.started else 0.0,
+        }
+
+
+_scheduler: Optional[WarmupScheduler] = None
+_lock = threading.Lock()
+
+
+def start() -> Optional[WarmupScheduler]:
+    """Start the warm-up of this process once, None if it is disabled."""
+    global _scheduler
+    if not ENABLED:
+        return None
+    with _lock:
+        if _scheduler is None:
+            _scheduler = WarmupScheduler().start()
+    return _scheduler
+
+
+def progress() -> Optional[Dict[str, Any]]:
+    scheduler = _scheduler
+    return scheduler.progress() if scheduler is not None else None
+
+
+if __name__ == "__main__":
+    # python -m gd_analysis.warmup, in the foreground, only the figures on
+    # disk outlive this process
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    WarmupScheduler(aggregates=False).run()
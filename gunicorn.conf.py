@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+
+"""
+gunicorn -c gunicorn.conf.py gd_analysis.app:server
+
+The app and the datasets are loaded once in the master process before the
+workers are forked. The frames are views of the memory mapped arrow files and
+the rest is shared copy on write, so the memory of a worker does not grow
+with a private copy of the datasets.
+
+The warm-up of the figure cache runs as its own process, started when the
+server is ready. A warm-up thread of the master would not survive the fork of
+the workers, and the locks it holds could stay locked in them.
+"""
+
+bind = os.environ.get("GD_ANALYSIS_BIND", "127.0.0.1:8050")
+workers = int(os.environ.get("GD_ANALYSIS_WORKERS", 4))
+# GD_ANALYSIS_PRELOAD=0 loads the datasets in every worker instead
+preload_app = os.environ.get("GD_ANALYSIS_PRELOAD", "1") == "1"
+warmup = os.environ.get("GD_ANALYSIS_WARMUP", "1") == "1"
+# no warm-up thread in the master or the workers
+os.environ["GD_ANALYSIS_WARMUP"] = "0"
+
+
+def when_ready(server):
+    if preload_app:
+        from gd_analysis import loader
+
+        loader.preload()
+        server.log.info("datasets loaded: %s", loader.startup_report())
+    if warmup:
+        server.warmup_process = subprocess.Popen(
+            [sys.executable, "-m", "gd_analysis.warmup"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+
+
+def on_exit(server):
+    warmup_process = getattr(server, "warmup_process", None)
+    if warmup_process is not None:
+        warmup_process.terminate()
@@ -18,6 +18,9 @@ setuptools.setup(
             'data/df_datasets.pkl',
             'data/df_players.pkl',
             'data/df_matches.pkl',
+            'data/players/*/*/*.parquet',
+            'data/matches/*/*/*.parquet',
+            'data/goals/*/*/*.parquet',
         ]
     },
 )
@@ -0,0 +1,57 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from benchmarks import generate
+
+# the app reads its configuration at import, before any test module imports it
+DATAPATH = tempfile.mkdtemp(prefix="gd_analysis_tests_")
+os.environ["GD_ANALYSIS_DATA"] = DATAPATH
+os.environ["GD_ANALYSIS_WARMUP"] = "0"
+
+LEAGUES = 2
+SEASONS = 2
+TEAMS = 6
+SQUAD = 16
+
+
+def write_datasets(path):
+    from gd_analysis import data
+
+    for df_players, df_matches, df_goals in generate.iter_seasons(
+        LEAGUES, SEASONS, TEAMS, SQUAD
+    ):
+        data.write_dataset(df_players, "players", path)
+        data.write_dataset(df_matches, "matches", path)
+        data.write_dataset(df_goals, "goals", path)
+
+
+write_datasets(DATAPATH)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(DATAPATH, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def generated():
+    """players, matches and goals of 2 leagues x 2 seasons of 6 teams"""
+    return generate.generate(LEAGUES, SEASONS, TEAMS, SQUAD)
+
+
+@pytest.fixture(scope="session")
+def datasets():
+    """The datasets of DATAPATH as the app loads them."""
+    from gd_analysis import loader
+
+    return loader.get_datasets()
+
+
+@pytest.fixture(scope="session")
+def client(datasets):
+    """Test client of the flask server of the Dash app."""
+    from gd_analysis.app import app
+
+    return app.server.test_client()
@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from gd_analysis import aggregates, ingest, loader
+
+
+def get_full(df_players, df_matches):
+    return aggregates.add_team_columns(
+        aggregates.get_aggregates(df_players),
+        aggregates.get_team_goal_differences(df_matches),
+    )
+
+
+def split(df, last_matchday):
+    # the first season of league-00 up to a matchday, and the rest
+    first = (
+        (df["competition"] == "league-00")
+        & (df["year"] == df["year"].min())
+        & (df["matchday"] <= last_matchday)
+    )
+    return df[first], df[~first]
+
+
+def test_running_aggregates_equal_a_full_recompute(generated):
+    df_players, df_matches, _ = generated
+    running = aggregates.RunningAggregates()
+    # the second batch continues a season and adds new players and teams
+    for batch_players, batch_matches in zip(
+        split(df_players, 3), split(df_matches, 3)
+    ):
+        running.append(batch_players, batch_matches)
+
+    df_running = running.get_aggregates()
+    df_full = get_full(df_players, df_matches)
+    assert df_running.index.equals(df_full.index)
+    for column in ["gd90", "full_games", "relative_gd90", "off_gd90"]:
+        pd.testing.assert_series_equal(df_running[column], df_full[column])
+    pd.testing.assert_frame_equal(
+        running.get_teams(),
+        aggregates.get_team_goal_differences(df_matches),
+        check_dtype=False,
+    )
+
+
+def test_off_pitch_columns_match_per_match_sums(generated):
+    df_players, df_matches, _ = generated
+    df_full = get_full(df_players, df_matches)
+    for key in df_full.index[::17]:
+        competition, year, team_url, player_url, _ = key
+        df_season = df_matches[
+            (df_matches["competition"] == competition)
+            & (df_matches["year"] == year)
+        ]
+        df_player = df_players[
+            (df_players["competition"] == competition)
+            & (df_players["year"] == year)
+            & (df_players["team_url"] == team_url)
+            & (df_players["player_url"] == player_url)
+        ]
+        # the minutes and goals of every match of the team without the player
+        off_duration = off_goal_difference = 0
+        for match in df_season.itertuples():
+            if team_url not in (match.team_home_url, match.team_away_url):
+                continue
+            sign = 1 if team_url == match.team_home_url else -1
+            on_pitch = df_player[df_player["matchday"] == match.matchday]
+            off_duration += 90 - on_pitch["duration"].sum()
+            off_goal_difference += (
+                sign * (match.score_home - match.score_away)
+                - on_pitch["goal_difference"].sum()
+            )
+        gd90 = (
+            df_player["goal_difference"].sum()
+            / df_player["duration"].sum()
+            * 90
+        )
+        off_gd90 = off_goal_difference / off_duration * 90
+
+        row = df_full.loc[key]
+        assert row["off_duration"] == off_duration
+        assert row["off_goal_difference"] == off_goal_difference
+        assert np.isclose(row["off_gd90"], off_gd90)
+        assert np.isclose(row["on_minus_off_gd90"], gd90 - off_gd90)
+
+
+def test_running_aggregates_from_a_persisted_table(generated, tmp_path):
+    df_players, df_matches, _ = generated
+    first, rest = split(df_players, 3)
+    aggregates.write_aggregates(
+        aggregates.get_aggregates(first), tmp_path, "v1", {"a": [1, 2.5]}
+    )
+    df_persisted, sources = aggregates.read_latest_aggregates(tmp_path)
+    assert sources == {"a": [1, 2.5]}
+
+    running = aggregates.RunningAggregates()
+    running.add_aggregates(df_persisted)
+    running.append(rest)
+    df_full = aggregates.get_aggregates(df_players)
+    pd.testing.assert_frame_equal(
+        running.get_players(), df_full, check_dtype=False
+    )
+
+
+def test_write_aggregates_replaces_other_versions(generated, tmp_path):
+    df_aggregates = aggregates.get_aggregates(generated[0])
+    aggregates.write_aggregates(df_aggregates, tmp_path, "v1", {"a": [1]})
+    aggregates.write_aggregates(df_aggregates, tmp_path, "v2", {"a": [2]})
+    assert sorted(file.name for file in tmp_path.iterdir()) == [
+        "df_aggregates_v2.json",
+        "df_aggregates_v2.parquet",
+    ]
+    assert aggregates.read_aggregates(tmp_path, "v1") is None
+    assert aggregates.read_latest_aggregates(tmp_path)[1] == {"a": [2]}
+
+
+def write_matchdays(df_players, df_matches, path):
+    for (competition, season, matchday), df in df_players.groupby(
+        ["competition", "year", "matchday"]
+    ):
+        frames = {
+            "players": df,
+            "matches": df_matches[
+                (df_matches["competition"] == competition)
+                & (df_matches["year"] == season)
+                & (df_matches["matchday"] == matchday)
+            ],
+        }
+        ingest.write_matchday(frames, competition, season, matchday, path)
+
+
+@pytest.fixture
+def aggregated_rows(monkeypatch):
+    rows = []
+    get_aggregates = aggregates.get_aggregates
+
+    def counted(df_players):
+        rows.append(len(df_players))
+        return get_aggregates(df_players)
+
+    monkeypatch.setattr(aggregates, "get_aggregates", counted)
+    return rows
+
+
+def test_reload_appends_new_players_files(
+    generated, tmp_path, aggregated_rows
+):
+    df_players, df_matches, _ = generated
+    first_players, rest_players = split(df_players, 3)
+    first_matches, rest_matches = split(df_matches, 3)
+    # the loaded dataset keeps the first spelling of a player's name
+    renamed = rest_players["player_url"] == first_players["player_url"].iloc[0]
+    rest_players = rest_players.assign(
+        player_name=rest_players["player_name"].where(~renamed, "Renamed")
+    )
+    write_matchdays(first_players, first_matches, tmp_path)
+    loader.load(tmp_path)
+    assert aggregated_rows == [len(first_players)]
+
+    write_matchdays(rest_players, rest_matches, tmp_path)
+    datasets = loader.load(tmp_path)
+    # only the appearances of the new files were aggregated
+    assert sum(aggregated_rows[1:]) == len(rest_players)
+    df_full = get_full(datasets.df_players, datasets.df_matches)
+    df_loaded = datasets.df_aggregates
+    assert renamed.any()
+    assert df_loaded.index.equals(df_full.index)
+    for column in ["gd90", "full_games", "on_minus_off_gd90"]:
+        pd.testing.assert_series_equal(df_loaded[column], df_full[column])
+
+
+def test_reload_of_changed_files_aggregates_everything(
+    generated, tmp_path, aggregated_rows
+):
+    df_players, df_matches, _ = generated
+    write_matchdays(df_players, df_matches, tmp_path)
+    loader.load(tmp_path)
+
+    # a matchday ingested again replaces its file
+    changed = df_players["matchday"] == 1
+    write_matchdays(
+        df_players[changed].assign(goal_difference=0),
+        df_matches[df_matches["matchday"] == 1],
+        tmp_path,
+    )
+    datasets = loader.load(tmp_path)
+    assert aggregated_rows == [len(df_players), len(df_players)]
+    df_full = get_full(datasets.df_players, datasets.df_matches)
+    pd.testing.assert_series_equal(
+        datasets.df_aggregates["gd90"], df_full["gd90"]
+    )
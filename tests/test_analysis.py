@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from gd_analysis import analysis
+
+
+def test_players_goal_differences(generated):
+    df_players = generated[0]
+    df_grouped = analysis.get_players_goal_differences(df_players)
+
+    player = df_players["player_url"].iloc[0]
+    df_player = df_players[df_players["player_url"] == player]
+    row = df_grouped.xs(player, level="player_url").iloc[0]
+    assert row["appearances"] == len(df_player)
+    assert row["duration"] == df_player["duration"].sum()
+    assert row["goal_difference"] == df_player["goal_difference"].sum()
+    assert np.isclose(
+        row["gd90"],
+        df_player["goal_difference"].sum() / df_player["duration"].sum() * 90,
+    )
+    assert df_grouped["appearances"].sum() == len(df_players)
+
+
+def test_players_goal_differences_of_loaded_datasets(datasets):
+    # compact dtypes and categorical keys, as the app has them
+    df_grouped = analysis.get_players_goal_differences(datasets.df_players)
+    assert df_grouped["appearances"].sum() == len(datasets.df_players)
+    assert (
+        df_grouped["goal_difference"].sum()
+        == datasets.df_players["goal_difference"].astype("int64").sum()
+    )
+
+
+def test_gd90_intervals(generated):
+    df_players = generated[0]
+    df_players = df_players[df_players["competition"] == "league-00"]
+    df_intervals = analysis.get_gd90_intervals(df_players, 2000)
+    df_grouped = analysis.get_players_goal_differences(df_players)
+    assert df_intervals.index.equals(df_grouped.index)
+    assert (df_intervals["gd90_low"] <= df_grouped["gd90"] + 1e-6).all()
+    assert (df_intervals["gd90_high"] >= df_grouped["gd90"] - 1e-6).all()
+    pd.testing.assert_frame_equal(
+        df_intervals, analysis.get_gd90_intervals(df_players, 2000)
+    )
+
+
+def test_gd90_intervals_of_a_single_appearance(generated):
+    df_player = generated[0].iloc[:1]
+    df_intervals = analysis.get_gd90_intervals(df_player, 100)
+    gd90 = analysis.get_players_goal_differences(df_player)["gd90"]
+    assert np.allclose(df_intervals["gd90_low"], gd90)
+    assert np.allclose(df_intervals["gd90_high"], gd90)
+
+
+def get_brute_force_timeline(df_player, window, window_minutes):
+    """expanding, rolling and rolling minutes gd90 of one player's rows"""
+    rows = []
+    duration = df_player["duration"].astype("int64").tolist()
+    goal_difference = df_player["goal_difference"].astype("int64").tolist()
+
+    def gd90(start, stop):
+        minutes = sum(duration[start:stop])
+        if minutes == 0:
+            return np.nan
+        return sum(goal_difference[start:stop]) / minutes * 90
+
+    for position in range(len(duration)):
+        stop = position + 1
+        rolling = gd90(stop - window, stop) if stop >= window else np.nan
+        starts = [
+            start
+            for start in range(stop)
+            if sum(duration[start:stop]) >= window_minutes
+        ]
+        rolling_minutes = gd90(max(starts), stop) if starts else np.nan
+        rows.append((gd90(0, stop), rolling, rolling_minutes))
+    return rows
+
+
+@pytest.mark.parametrize("window, window_minutes", [(3, 200), (15, 1200)])
+@pytest.mark.parametrize("loaded", [False, True])
+def test_player_timelines(generated, datasets, loaded, window, window_minutes):
+    df_players = datasets.df_players if loaded else generated[0]
+    player_urls = sorted(set(df_players["player_url"].astype(str)))[::7]
+    df_timeline = analysis.get_player_timelines(
+        df_players,
+        player_urls + ["/player_summary/unknown/"],
+        window,
+        window_minutes,
+    )
+    assert set(df_timeline["player_url"].astype(str)) == set(player_urls)
+
+    columns = ["expanding_gd90", "rolling_gd90", "rolling_minutes_gd90"]
+    for player_url in player_urls:
+        df_player = df_timeline[df_timeline["player_url"] == player_url]
+        df_expected = df_players[df_players["player_url"] == player_url]
+        assert len(df_player) == len(df_expected)
+        keys = list(zip(df_player["year"], df_player["matchday"]))
+        assert keys == sorted(keys)
+        assert df_player["cum_duration"].iloc[-1] == (
+            df_expected["duration"].astype("int64").sum()
+        )
+        # per player, so a window reaching into the rows of the previous
+        # player differs
+        np.testing.assert_allclose(
+            df_player[columns].values,
+            get_brute_force_timeline(df_player, window, window_minutes),
+        )
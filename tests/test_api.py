@@ -0,0 +1,58 @@
+import gzip
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def season(datasets):
+    competition = datasets.appearance_store.competitions()[0]
+    return competition, datasets.appearance_store.seasons(competition)[0]
+
+
+def get_url(season, **args):
+    competition, year = season
+    query = "&".join(f"{name}={value}" for name, value in args.items())
+    return f"/api/seasons/{competition}/{year}/players?{query}"
+
+
+def test_players(client, season):
+    response = client.get(get_url(season, columns="gd90,team_url"))
+    assert response.status_code == 200
+    rows = response.get_json()
+    assert rows
+    assert set(rows[0]) == {"team_url", "player_url", "player_name", "gd90"}
+
+
+def test_not_modified(client, season):
+    url = get_url(season, min_appearances=5)
+    etag = client.get(url).headers["ETag"]
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert response.headers["ETag"] == etag
+
+    other = client.get(get_url(season, min_appearances=6))
+    assert other.headers["ETag"] != etag
+
+
+def test_gzip(client, season):
+    url = get_url(season)
+    plain = client.get(url)
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in plain.headers
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.data) == plain.data
+    assert response.headers["ETag"] == plain.headers["ETag"]
+
+
+def test_errors(client, season):
+    competition, year = season
+    response = client.get(get_url(season, columns="nothing"))
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "unknown columns: nothing"}
+    response = client.get(get_url(season, min_appearances="many"))
+    assert response.status_code == 400
+
+    assert client.get(get_url((competition, "1900-1901"))).status_code == 404
+    response = client.get(f"/api/teams/{competition}/{year}/teams/no/players")
+    assert response.status_code == 404
@@ -0,0 +1,83 @@
+import pytest
+
+from benchmarks.load import get_payload
+
+
+@pytest.fixture(scope="module")
+def dependency(client):
+    dependencies = client.get("/_dash-dependencies").get_json()
+    return next(
+        dependency
+        for dependency in dependencies
+        if "datatable-raw.page_current" in dependency["output"]
+    )
+
+
+def get_values(datasets, **values):
+    appearance_store = datasets.appearance_store
+    competition = appearance_store.competitions()[0]
+    season = appearance_store.seasons(competition)[0]
+    return {
+        "dropdown-competition.value": competition,
+        "dropdown-season.value": season,
+        "dropdown-team.value": appearance_store.teams(competition, season)[0],
+        "dropdown-player.value": None,
+        "checklist-error-bars.value": [],
+        "datatable-raw.page_current": 0,
+        "datatable-raw.page_size": 10,
+        "datatable-raw.filter_query": "",
+        "datatable-raw.sort_by": [],
+        **values,
+    }
+
+
+def update(client, dependency, values, changed):
+    response = client.post(
+        "/_dash-update-component",
+        json=get_payload(dependency, values, [changed]),
+    )
+    assert response.status_code == 200
+    return response.get_json()["response"]
+
+
+def test_paging_keeps_the_page(client, dependency, datasets):
+    values = get_values(datasets, **{"datatable-raw.page_current": 2})
+    response = update(client, dependency, values, "datatable-raw.page_current")
+    assert response["datatable-raw"]["page_current"] == 2
+    # the figures did not change
+    assert "graph-season-overview" not in response
+
+
+@pytest.mark.parametrize(
+    "changed, value",
+    [
+        ("datatable-raw.filter_query", "{matchday} > 1"),
+        (
+            "datatable-raw.sort_by",
+            [{"column_id": "duration", "direction": "asc"}],
+        ),
+        ("dropdown-player.value", None),
+    ],
+)
+def test_selection_filter_and_sort_reset_the_page(
+    client, dependency, datasets, changed, value
+):
+    values = get_values(
+        datasets, **{"datatable-raw.page_current": 2, changed: value}
+    )
+    response = update(client, dependency, values, changed)
+    assert response["datatable-raw"]["page_current"] == 0
+
+
+def test_page_beyond_the_filtered_rows(client, dependency, datasets):
+    values = get_values(
+        datasets,
+        **{
+            "datatable-raw.page_current": 50,
+            "datatable-raw.page_size": 10,
+        },
+    )
+    response = update(client, dependency, values, "datatable-raw.page_size")
+    table = response["datatable-raw"]
+    assert table["page_current"] == table["page_count"] - 1
+    assert table["data"]
@@ -0,0 +1,101 @@
+import random
+import sys
+import threading
+
+from gd_analysis.cache import LRUCache, get_size
+
+VALUE = b"x" * 1000
+VALUE_SIZE = get_size(VALUE)
+
+
+def compute(key):
+    return lambda: VALUE + key.encode()
+
+
+def test_evicts_the_least_recently_used_entries():
+    cache = LRUCache(3 * (VALUE_SIZE + 1))
+    for key in ["a", "b", "c"]:
+        cache.get(key, compute(key))
+    # a was used last, so b goes first
+    assert cache.get("a", compute("other")) == VALUE + b"a"
+    cache.get("d", compute("d"))
+    assert list(cache._entries) == ["c", "a", "d"]
+    assert cache.current_bytes == 3 * (VALUE_SIZE + 1)
+    assert cache.stats()["evictions"] == 1
+
+    assert cache.get("b", compute("b")) == VALUE + b"b"
+    assert cache.stats()["misses"] == 5
+    assert cache.stats()["hits"] == 1
+
+
+def test_values_beyond_the_budget_are_not_kept():
+    cache = LRUCache(VALUE_SIZE)
+    cache.get("a", compute("a"))
+    assert len(cache) == 0
+    assert cache.current_bytes == 0
+
+
+def test_a_new_version_drops_all_entries():
+    cache = LRUCache(10 * VALUE_SIZE)
+    cache.get("a", compute("a"), version="v1")
+    cache.get("b", compute("b"), version="v1")
+    computed = []
+
+    def compute_v2():
+        computed.append(1)
+        return VALUE
+
+    assert cache.get("a", compute_v2, version="v2") == VALUE
+    assert computed == [1]
+    assert list(cache._entries) == ["a"]
+    assert cache.current_bytes == get_size(VALUE)
+
+
+def test_values_of_an_old_version_are_not_kept():
+    cache = LRUCache(10 * VALUE_SIZE)
+
+    def compute_while_the_data_changes():
+        cache.invalidate("v2")
+        return VALUE
+
+    cache.get("a", compute_while_the_data_changes, version="v1")
+    assert len(cache) == 0
+    assert cache.version == "v2"
+
+
+def test_concurrent_gets():
+    cache = LRUCache(20 * (VALUE_SIZE + 2))
+    keys = [f"{number:02}" for number in range(40)]
+    barrier = threading.Barrier(8)
+    errors = []
+
+    def work(seed):
+        rng = random.Random(seed)
+        barrier.wait()
+        for _ in range(2000):
+            key = rng.choice(keys)
+            if cache.get(key, compute(key)) != VALUE + key.encode():
+                errors.append(key)
+
+    threads = [
+        threading.Thread(target=work, args=(seed,)) for seed in range(8)
+    ]
+    # switch threads as often as possible, also within get
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+
+    stats = cache.stats()
+    assert errors == []
+    assert stats["hits"] + stats["misses"] == 8 * 2000
+    assert stats["bytes"] <= stats["max_bytes"]
+    assert stats["bytes"] == sum(
+        get_size(value) for value in cache._entries.values()
+    )
+    assert sorted(cache._sizes) == sorted(cache._entries)
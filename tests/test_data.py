@@ -0,0 +1,45 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from gd_analysis import data
+
+
+def test_write_atomically(tmp_path):
+    file = tmp_path / "manifest.json"
+    file.write_text("old")
+    with data.write_atomically(file) as temporary:
+        assert file.read_text() == "old"
+        with open(temporary, "w") as output:
+            output.write("new")
+    assert file.read_text() == "new"
+    assert os.listdir(tmp_path) == ["manifest.json"]
+
+
+def test_write_atomically_keeps_the_file_on_errors(tmp_path):
+    file = tmp_path / "manifest.json"
+    file.write_text("old")
+    with pytest.raises(ValueError):
+        with data.write_atomically(file) as temporary:
+            with open(temporary, "w") as output:
+                output.write("partial")
+            raise ValueError
+    assert file.read_text() == "old"
+    assert os.listdir(tmp_path) == ["manifest.json"]
+
+
+def test_missing_partitions(tmp_path, generated):
+    with pytest.raises(FileNotFoundError):
+        data.read_dataset("league-00", "2000-2001", "players", tmp_path)
+
+    data.write_dataset(generated[1], "matches", tmp_path)
+    Path(
+        data.get_dataset_path("league-02", "2000-2001", "matches", tmp_path)
+    ).mkdir(parents=True)
+    df_matches = data.read_datasets("matches", tmp_path)
+    assert len(df_matches) == len(generated[1])
+    with pytest.raises(FileNotFoundError):
+        data.read_dataset("league-02", "2000-2001", "matches", tmp_path)
+    with pytest.raises(FileNotFoundError):
+        data.read_datasets("players", tmp_path)
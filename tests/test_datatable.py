@@ -0,0 +1,101 @@
+import pandas as pd
+import pytest
+
+from gd_analysis.datatable import (
+    filter_table,
+    get_page,
+    sort_table,
+    split_filter_part,
+)
+
+
+@pytest.fixture(params=["object", "category"])
+def df_table(request):
+    return pd.DataFrame(
+        {
+            "team_name": ["Lille OSC", "Bayern", "Getafe", "Lille OSC"],
+            "player_name": ["Serge Gnabry", "Jorge Meré", "Ange", "Anne"],
+            "matchday": [1, 18, 20, 34],
+        }
+    ).astype({"team_name": request.param, "player_name": request.param})
+
+
+@pytest.mark.parametrize(
+    "filter_part, expected",
+    [
+        (
+            '{team_name} contains "Lille OSC"',
+            ("team_name", "contains", "Lille OSC"),
+        ),
+        (
+            '{player_name} = "Serge Gnabry"',
+            ("player_name", "eq", "Serge Gnabry"),
+        ),
+        ('{player_name} eq "Jorge Meré"', ("player_name", "eq", "Jorge Meré")),
+        ("{player_name} ne Anne", ("player_name", "ne", "Anne")),
+        ("{matchday} >= 18", ("matchday", "ge", 18.0)),
+        ("{matchday} < 18", ("matchday", "lt", 18.0)),
+        ("team_name contains Lille", (None, None, None)),
+        ("{matchday} between 1", (None, None, None)),
+    ],
+)
+def test_split_filter_part(filter_part, expected):
+    assert split_filter_part(filter_part) == expected
+
+
+@pytest.mark.parametrize(
+    "filter_query, rows",
+    [
+        ("", [0, 1, 2, 3]),
+        ('{team_name} contains "Lille OSC"', [0, 3]),
+        ("{team_name} contains lille", [0, 3]),
+        ('{player_name} = "Serge Gnabry"', [0]),
+        ('{player_name} = "Jorge Meré"', [1]),
+        ('{player_name} ne "Anne"', [0, 1, 2]),
+        ("{player_name} datestartswith An", [2, 3]),
+        ("{matchday} > 18", [2, 3]),
+        ("{matchday} le 20 && {team_name} contains OSC", [0]),
+        ("{matchday} = 20", [2]),
+        ("{unknown} = 1", [0, 1, 2, 3]),
+    ],
+)
+def test_filter_table(df_table, filter_query, rows):
+    assert filter_table(df_table, filter_query).index.tolist() == rows
+
+
+def test_sort_table(df_table):
+    sort_by = [
+        {"column_id": "team_name", "direction": "desc"},
+        {"column_id": "matchday", "direction": "asc"},
+    ]
+    assert sort_table(df_table, sort_by).index.tolist() == [0, 3, 2, 1]
+    # stable, and unknown columns are ignored
+    sort_by = [{"column_id": "unknown", "direction": "asc"}]
+    assert sort_table(df_table, sort_by).index.tolist() == [0, 1, 2, 3]
+    sort_by = [{"column_id": "team_name", "direction": "asc"}]
+    assert sort_table(df_table, sort_by).index.tolist() == [1, 2, 0, 3]
+
+
+def test_get_page():
+    df = pd.DataFrame({"row": range(25)})
+    df_page, page_current, page_count = get_page(df, 1, 10)
+    assert df_page["row"].tolist() == list(range(10, 20))
+    assert (page_current, page_count) == (1, 3)
+
+
+def test_get_page_beyond_the_last_page():
+    df = pd.DataFrame({"row": range(25)})
+    df_page, page_current, page_count = get_page(df, 7, 10)
+    assert df_page["row"].tolist() == list(range(20, 25))
+    assert (page_current, page_count) == (2, 3)
+
+    df_page, page_current, page_count = get_page(df.iloc[:0], 7, 10)
+    assert df_page.empty
+    assert (page_current, page_count) == (0, 1)
+
+
+def test_get_page_of_size_zero():
+    df = pd.DataFrame({"row": range(25)})
+    df_page, page_current, page_count = get_page(df, 3, 0)
+    assert df_page["row"].tolist() == [3]
+    assert (page_current, page_count) == (3, 25)
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+from gd_analysis import helpers, loader
+
+
+def get_players(dtype):
+    return pd.DataFrame(
+        {
+            "player_url": ["/a/", "/b/", None, "/c/", "/c/", "/d/"],
+            "player_name": ["A", None, "X", None, "C", "D"],
+        },
+        dtype=dtype,
+    )
+
+
+def test_url_to_name_with_missing_values():
+    url_to_name = helpers.get_map_from_url_to_name(
+        get_players("category"), "player"
+    )
+    assert set(url_to_name) == {"/a/", "/b/", "/c/", "/d/"}
+    assert url_to_name["/a/"] == "A"
+    assert url_to_name["/c/"] == "C"
+    assert url_to_name["/d/"] == "D"
+    assert np.isnan(url_to_name["/b/"])
+
+
+def test_player_names_with_missing_values():
+    for dtype in ["object", "category"]:
+        player_names = loader.get_player_names(get_players(dtype))
+        assert player_names.sort_index().to_dict() == {
+            "/a/": "A",
+            "/c/": "C",
+            "/d/": "D",
+        }
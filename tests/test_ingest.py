@@ -0,0 +1,74 @@
+import shutil
+from pathlib import Path
+
+from gd_analysis import data, ingest
+
+FIXTURES = Path(__file__).parent / "fixtures" / "pages"
+PAGE = FIXTURES / "league" / "2019-2020" / "01" / "match-1.html"
+
+
+def test_parse_match():
+    match = ingest.parse_match(PAGE.read_bytes())
+    assert match["team_home"] == ("/teams/home/", "Home FC")
+    assert (match["score_home"], match["score_away"]) == (2, 1)
+    # the td.inline and td.injury cells are not the minutes of td.in
+    assert match["lineups"] == [
+        ("home", "/players/h1/", "Home One", 0, 60),
+        ("home", "/players/h2/", "Home Two", 0, 90),
+        ("home", "/players/h3/", "Home Three", 60, 90),
+        ("away", "/players/a1/", "Away One", 0, 90),
+        ("away", "/players/a2/", "Away Two", 0, 45),
+    ]
+    assert [minute for _, minute, _ in match["goals"]] == [12, 50, 88]
+
+
+def test_ingest_fixture(tmp_path):
+    report = ingest.ingest(
+        ingest.FixtureFetcher(FIXTURES), "league", "2019-2020", [1], tmp_path
+    )
+    assert (report.written, report.skipped, report.matches) == (1, 0, 1)
+
+    df_players = data.read_datasets("players", tmp_path)
+    goal_differences = dict(
+        zip(df_players["player_url"], df_players["goal_difference"])
+    )
+    assert goal_differences == {
+        "/players/h1/": 0,
+        "/players/h2/": 1,
+        "/players/h3/": 1,
+        "/players/a1/": -1,
+        "/players/a2/": -1,
+    }
+    df_matches = data.read_datasets("matches", tmp_path)
+    assert df_matches[["score_home", "score_away"]].values.tolist() == [[2, 1]]
+    assert len(data.read_datasets("goals", tmp_path)) == 3
+
+
+def test_manifest_round_trip(tmp_path):
+    pages = tmp_path / "pages"
+    shutil.copytree(FIXTURES, pages)
+    path = tmp_path / "data"
+    fetcher = ingest.FixtureFetcher(pages)
+    ingest.ingest(fetcher, "league", "2019-2020", [1], path)
+
+    manifest = ingest.read_manifest(path)
+    assert manifest == {
+        ingest.get_matchday_key(
+            "league", "2019-2020", 1
+        ): ingest.get_pages_hash([PAGE.read_bytes()])
+    }
+    ingest.write_manifest(manifest, path)
+    assert ingest.read_manifest(path) == manifest
+
+    # unchanged pages are skipped
+    report = ingest.ingest(fetcher, "league", "2019-2020", [1], path)
+    assert (report.written, report.skipped) == (0, 1)
+
+    # a changed page writes its matchday again
+    page = pages / PAGE.relative_to(FIXTURES)
+    page.write_bytes(page.read_bytes().replace(b"2:1", b"3:1"))
+    report = ingest.ingest(fetcher, "league", "2019-2020", [1], path)
+    assert (report.written, report.skipped) == (1, 0)
+    assert ingest.read_manifest(path) != manifest
+    df_matches = data.read_datasets("matches", path)
+    assert df_matches["score_home"].tolist() == [3]
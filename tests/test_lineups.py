@@ -0,0 +1,162 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from gd_analysis import lineups, timeline
+
+MATCH = {"competition": "league", "year": "2000-2001", "matchday": 1}
+HOME = "/teams/home/"
+AWAY = "/teams/away/"
+# (team, player, start, end): a starter who played through, starters who
+# went off, late substitutes and two substitutes who were substituted again,
+# f came on at a minute known only from the minute f went off
+APPEARANCES = [
+    (HOME, "a", 0, 90),
+    (HOME, "b", 0, 60),
+    (HOME, "c", 60, 80),
+    (HOME, "d", 80, 90),
+    (HOME, "e", 0, 75),
+    (HOME, "f", 50, 75),
+    (HOME, "g", 75, 90),
+    (AWAY, "x", 0, 90),
+    (AWAY, "y", 0, 45),
+    (AWAY, "z", 45, 90),
+]
+# (side, minute)
+GOALS = [
+    ("home", 10),
+    ("home", 45),
+    ("away", 55),
+    ("home", 70),
+    ("home", 78),
+    ("home", 85),
+    ("away", 88),
+]
+
+
+@pytest.fixture(scope="module")
+def match():
+    df_matches = pd.DataFrame(
+        [
+            {
+                **MATCH,
+                "team_home_url": HOME,
+                "team_away_url": AWAY,
+                "score_home": 5,
+                "score_away": 2,
+            }
+        ]
+    )
+    df_goals = pd.DataFrame(
+        [
+            {
+                **MATCH,
+                "team_home_url": HOME,
+                "team_away_url": AWAY,
+                "side": side,
+                "minute": minute,
+                "player_url": "scorer",
+            }
+            for side, minute in GOALS
+        ]
+    )
+    goal_timeline = timeline.get_goal_timeline(df_matches, df_goals)
+    df_players = pd.DataFrame(
+        [
+            {
+                **MATCH,
+                "team_url": team_url,
+                "player_url": player_url,
+                "player_name": player_url.upper(),
+                "start": start,
+                "end": end,
+                "duration": end - start,
+            }
+            for team_url, player_url, start, end in APPEARANCES
+        ]
+    )
+    df_players["goal_difference"] = timeline.get_goal_differences(
+        goal_timeline, df_players
+    )
+    return df_players, goal_timeline
+
+
+def get_brute_force_lineups(df_players, goal_timeline, size):
+    """(team_url, *players) -> (matches, duration, goal_difference)"""
+    lineups = {}
+    for keys, df_match in df_players.groupby(
+        ["competition", "year", "matchday", "team_url"]
+    ):
+        match, sign = goal_timeline.get_match(*keys)
+        appearances = df_match[["player_url", "start", "end"]].values
+        for lineup in itertools.combinations(appearances, size):
+            start = max(int(member[1]) for member in lineup)
+            end = min(int(member[2]) for member in lineup)
+            if start >= end:
+                continue
+            key = (keys[3], *sorted(member[0] for member in lineup))
+            matches, duration, goal_difference = lineups.get(key, (0, 0, 0))
+            lineups[key] = (
+                matches + 1,
+                duration + end - start,
+                goal_difference
+                + goal_timeline.goal_difference(match, sign, start, end),
+            )
+    return lineups
+
+
+def get_lineup_sums(df_lineups):
+    columns = ["matches", "duration", "goal_difference"]
+    return {
+        key: tuple(int(value) for value in values)
+        for key, values in zip(
+            df_lineups.index, df_lineups[columns].values.tolist()
+        )
+    }
+
+
+def test_cumulative_goal_differences(match):
+    df_players, _ = match
+    df = lineups._get_appearances(df_players)
+    df_points = lineups.get_cumulative_goal_differences(df)
+    home = df.loc[df["team_url"] == HOME, "match"].iloc[0]
+    # 50 is known only from the substitute who was substituted again
+    expected = {0: 0, 50: 2, 60: 1, 75: 2, 80: 3, 90: 3}
+    assert df_points.loc[home, "cumulative"].to_dict() == expected
+
+
+@pytest.mark.parametrize("size", [2, 3])
+def test_lineups_of_a_match(match, size):
+    df_players, goal_timeline = match
+    df_lineups = lineups.get_lineups(df_players, size)
+    assert get_lineup_sums(df_lineups) == get_brute_force_lineups(
+        df_players, goal_timeline, size
+    )
+
+
+def test_pairs_without_each_other(match):
+    df_players, _ = match
+    df_pairs = lineups.get_lineups(df_players, 2)
+    df_totals = df_players.groupby("player_url")[
+        ["duration", "goal_difference"]
+    ].sum()
+    pair = df_pairs.loc[(HOME, "a", "e")]
+    # a without e: (75, 90], e is never on the pitch without a
+    assert np.isclose(
+        pair["without_2_gd90"],
+        (df_totals.loc["a", "goal_difference"] - pair["goal_difference"])
+        / (df_totals.loc["a", "duration"] - pair["duration"])
+        * 90,
+    )
+    assert np.isnan(pair["without_1_gd90"])
+
+
+def test_pairs_of_generated_matches(generated):
+    df_players, df_matches, df_goals = generated
+    goal_timeline = timeline.get_goal_timeline(df_matches, df_goals)
+    df_pairs = lineups.get_lineups(df_players, 2)
+    assert get_lineup_sums(df_pairs) == get_brute_force_lineups(
+        df_players, goal_timeline, 2
+    )
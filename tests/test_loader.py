@@ -0,0 +1,26 @@
+import os
+
+import pandas as pd
+import pytest
+
+from gd_analysis import loader
+
+
+def test_write_arrow_replaces_the_file(tmp_path):
+    df = pd.DataFrame({"goal_difference": [1, -2, 3]})
+    loader.write_arrow(df, "players", tmp_path)
+    df_mapped = loader.read_arrow("players", tmp_path)
+
+    loader.write_arrow(df * 2, "players", tmp_path)
+    assert os.listdir(tmp_path) == ["df_players.arrow"]
+    assert loader.read_arrow("players", tmp_path).equals(df * 2)
+    # frames mapped from the replaced file keep their data
+    assert df_mapped.equals(df)
+
+
+def test_write_arrow_leaves_no_partial_file(tmp_path):
+    with pytest.raises(Exception):
+        loader.write_arrow(
+            pd.DataFrame({"a": [object()]}), "players", tmp_path
+        )
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,43 @@
+import tracemalloc
+
+import pytest
+
+from gd_analysis import metrics
+
+MB = 2**20
+
+
+@pytest.fixture
+def memory_metrics(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    monkeypatch.setattr(metrics, "TRACE_MEMORY", True)
+    metrics.reset()
+    yield
+    metrics.reset()
+    tracemalloc.stop()
+
+
+def test_nested_calls_keep_the_peak_of_the_outer_call(memory_metrics):
+    @metrics.instrument(name="inner")
+    def inner():
+        return bytearray(MB)
+
+    @metrics.instrument(name="outer")
+    def outer():
+        temporary = bytearray(8 * MB)
+        del temporary
+        # a reset of the peak in here would hide the 8 MB above
+        return inner()
+
+    outer()
+    assert metrics._metrics["outer"].peak_bytes >= 8 * MB
+    assert metrics._metrics["inner"].calls == 1
+    assert metrics._metrics["inner"].peak_bytes is None
+
+    rendered = metrics.render()
+    assert 'gd_analysis_peak_memory_bytes{function="outer"}' in rendered
+    assert 'gd_analysis_peak_memory_bytes{function="inner"}' not in rendered
+
+    # outside of outer, inner is the outermost call
+    inner()
+    assert metrics._metrics["inner"].peak_bytes >= MB
@@ -0,0 +1,52 @@
+import pandas as pd
+
+from gd_analysis import data, store
+
+
+def get_store():
+    df_players = pd.DataFrame(
+        {
+            "competition": ["League0", "League0", "League1"],
+            "year": ["2010-11", "2011-12", "2010-11"],
+            "team_url": ["/teams/1/", "/teams/1/", "/teams/2/"],
+            "player_url": ["/players/1/", "/players/2/", "/players/3/"],
+        }
+    )
+    return store.AppearanceStore(
+        df_players, df_players[["competition", "year"]]
+    )
+
+
+def test_filters_continue_the_lookup():
+    appearance_store = get_store()
+    df = data.filter_competition(appearance_store.df_players, "League0")
+    assert df is appearance_store.players.get("League0")
+    df = data.filter_season(df, "2011-12")
+    assert df is appearance_store.players.get("League0", "2011-12")
+    assert df["player_url"].tolist() == ["/players/2/"]
+
+
+def test_derived_frames_are_not_partitions():
+    appearance_store = get_store()
+    df = data.filter_competition(appearance_store.df_players, "League0")
+    df_derived = df[df["year"] == "2010-11"]
+    assert store.lookup(df_derived, "year", "2011-12") is None
+    assert data.filter_season(df_derived, "2011-12").empty
+
+
+def test_detached_frames_are_not_partitions():
+    appearance_store = get_store()
+    df = appearance_store.players.get("League0")
+    appearance_store.detach()
+    assert store.lookup(df, "year", "2010-11") is None
+
+
+def test_unknown_keys_are_not_kept():
+    appearance_store = get_store()
+    for number in range(10):
+        df = data.filter_competition(
+            appearance_store.df_players, f"League{number + 2}"
+        )
+        assert df.empty
+        assert data.filter_season(df, "2010-11").empty
+    assert list(appearance_store.players._frames) == [()]
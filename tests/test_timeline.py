@@ -0,0 +1,40 @@
+import numpy as np
+
+from gd_analysis import analysis, timeline
+
+
+def test_goal_differences_of_generated_appearances(generated):
+    df_players, df_matches, df_goals = generated
+    goal_timeline = timeline.get_goal_timeline(df_matches, df_goals)
+    assert timeline.check_goal_differences(goal_timeline, df_players).empty
+
+    df_timeline = analysis.get_players_goal_differences(
+        df_players.assign(
+            goal_difference=timeline.get_goal_differences(
+                goal_timeline, df_players
+            )
+        )
+    )
+    df_grouped = analysis.get_players_goal_differences(df_players)
+    assert np.array_equal(
+        df_timeline["goal_difference"].values,
+        df_grouped["goal_difference"].values,
+    )
+
+
+def test_goals_without_a_minute_are_left_out(generated):
+    df_players, df_matches, df_goals = generated
+    df_goals = df_goals.astype({"minute": "object"})
+    df_goals.iloc[0, df_goals.columns.get_loc("minute")] = None
+    goal_timeline = timeline.get_goal_timeline(df_matches, df_goals)
+
+    df_different = timeline.check_goal_differences(goal_timeline, df_players)
+    # only the appearances of both teams of that match
+    goal = df_goals.iloc[0]
+    assert (df_different["competition"] == goal["competition"]).all()
+    assert (df_different["year"] == goal["year"]).all()
+    assert (df_different["matchday"] == goal["matchday"]).all()
+    assert set(df_different["team_url"]) == {
+        goal["team_home_url"],
+        goal["team_away_url"],
+    }
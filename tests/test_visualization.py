@@ -0,0 +1,74 @@
+import json
+
+import plotly.graph_objects as go
+
+from gd_analysis import visualization
+from gd_analysis.visualization import FigureCache
+
+
+def get_builder(builds):
+    def build():
+        builds.append(1)
+        return go.Figure(layout=dict(title=f"build {len(builds)}"))
+
+    return build
+
+
+def test_figure_cache_hit(tmp_path, datasets):
+    cache = FigureCache(tmp_path)
+    builds = []
+    fig = cache.get("season", get_builder(builds), competition="a")
+    assert cache.get("season", get_builder(builds), competition="a") == fig
+    assert len(builds) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    path = cache.get_path(
+        "season", datasets.data_version, {"competition": "a"}
+    )
+    assert path.parent.name.endswith(
+        f"-f{visualization.FIGURE_FORMAT_VERSION}"
+    )
+    assert [file.name for file in path.parent.iterdir()] == [path.name]
+
+
+def test_figure_cache_rewrites_unreadable_files(tmp_path, datasets):
+    cache = FigureCache(tmp_path)
+    builds = []
+    cache.get("season", get_builder(builds), competition="a")
+    path = cache.get_path(
+        "season", datasets.data_version, {"competition": "a"}
+    )
+    path.write_text('{"data": [')
+
+    fig = cache.get("season", get_builder(builds), competition="a")
+    assert len(builds) == 2
+    assert json.loads(path.read_text()) == fig
+
+
+def test_figure_cache_prune(tmp_path, datasets):
+    cache = FigureCache(tmp_path)
+    cache.get("season", get_builder([]), competition="a")
+    (tmp_path / f"{datasets.data_version}-f0").mkdir()
+    (tmp_path / "other").mkdir()
+    cache.prune()
+    assert [directory.name for directory in tmp_path.iterdir()] == [
+        cache.get_version_directory(datasets.data_version).name
+    ]
+
+
+def test_team_figures_are_the_same_in_both_apps(datasets):
+    # dash builds through the selection context, streamlit from the inputs
+    competition = datasets.appearance_store.competitions()[0]
+    season = datasets.appearance_store.seasons(competition)[0]
+    team = datasets.appearance_store.teams(competition, season)[0]
+    context = visualization.SelectionContext(
+        competition, season, team, min_appearances=1, error_bars=True
+    )
+    for figure in ["team", "team_bars"]:
+        inputs = visualization.get_figure_inputs(
+            figure, competition, season, team, 1, error_bars=True
+        )
+        fig = visualization.FIGURE_BUILDERS[figure](
+            datasets.df_players, datasets.df_matches, **inputs
+        )
+        assert fig.to_json() == context.build(figure).to_json()
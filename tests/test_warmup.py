@@ -0,0 +1,31 @@
+from gd_analysis import warmup
+
+
+def test_parse_priority():
+    assert warmup.parse_priority(
+        " league-01/2000-2001, league-00 ,,league-01"
+    ) == [
+        ("league-01", "2000-2001"),
+        ("league-00", None),
+        ("league-01", None),
+    ]
+    assert warmup.parse_priority("") == []
+
+
+def test_seasons_latest_first(datasets):
+    assert warmup.get_seasons() == [
+        ("league-00", "2001-2002"),
+        ("league-01", "2001-2002"),
+        ("league-00", "2000-2001"),
+        ("league-01", "2000-2001"),
+    ]
+
+
+def test_seasons_of_the_priority_first(datasets):
+    priority = warmup.parse_priority("league-01/2000-2001,league-01,nothing")
+    assert warmup.get_seasons(priority) == [
+        ("league-01", "2000-2001"),
+        ("league-01", "2001-2002"),
+        ("league-00", "2001-2002"),
+        ("league-00", "2000-2001"),
+    ]